@@ -0,0 +1,179 @@
+"""
+Shared connection layer for every Azure call.
+
+Provides one process-wide keep-alive `requests.Session` with a sized
+connection pool and retry policy, a cache of Azure SDK clients, and
+per-request timing that separates connection setup, server time and the
+time spent waiting between polls.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Connections kept alive per host, and number of hosts kept in the pool
+POOL_SIZE = 32
+POOL_CONNECTIONS = 4
+
+# Retry policy: connection errors are retried for every method, error
+# statuses only for idempotent GETs so a submit is never sent twice
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# (connect, read) timeouts in seconds applied to every request
+REQUEST_TIMEOUT = (5, 60)
+
+_local = threading.local()
+_session = None
+_session_lock = threading.Lock()
+_sdk_clients = {}
+_sdk_lock = threading.Lock()
+
+
+class _TimedConnectMixin:
+    """Record how long TCP/TLS connection setup takes on the current thread"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _local.connect_time = getattr(_local, 'connect_time', 0.0) + time.perf_counter() - start
+
+
+class TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that attaches a `timing` dict to every response.
+
+    `timing['connect']` is the time spent opening new connections (zero when
+    a pooled keep-alive connection was reused) and `timing['server']` is the
+    rest of the round trip up to the response headers.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        _local.connect_time = 0.0
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        total = time.perf_counter() - start
+        connect = _local.connect_time
+        response.timing = {'connect': connect, 'server': max(total - connect, 0.0)}
+        return response
+
+
+def create_session(pool_size=POOL_SIZE, pool_connections=POOL_CONNECTIONS,
+                   retry_total=RETRY_TOTAL, retry_backoff=RETRY_BACKOFF):
+    """Build a keep-alive session with a sized pool and retry policy"""
+    retry = Retry(
+        total=retry_total,
+        backoff_factor=retry_backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size,
+                               max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide shared session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure_session(**kwargs):
+    """Replace the shared session, e.g. to change the pool size or retry policy"""
+    global _session
+    with _session_lock:
+        old, _session = _session, create_session(**kwargs)
+    if old is not None:
+        old.close()
+    return _session
+
+
+def request(method, url, **kwargs):
+    """Send a request on the shared session with the default timeouts"""
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    return get_session().request(method, url, **kwargs)
+
+
+def get_sdk_client(key, factory):
+    """
+    Return the cached SDK client for `key`, building it with `factory` once.
+
+    Azure SDK clients are thread-safe, so one instance per endpoint/credential
+    is shared by every request in the process.
+    """
+    client = _sdk_clients.get(key)
+    if client is None:
+        with _sdk_lock:
+            client = _sdk_clients.get(key)
+            if client is None:
+                client = _sdk_clients[key] = factory()
+    return client
+
+
+class RequestTiming:
+    """Accumulated timing of every HTTP call and poll wait behind one operation"""
+
+    def __init__(self):
+        self.connect = 0.0
+        self.server = 0.0
+        self.poll_wait = 0.0
+        self.requests = 0
+
+    def add_response(self, response):
+        timing = getattr(response, 'timing', None)
+        if timing:
+            self.connect += timing['connect']
+            self.server += timing['server']
+        self.requests += 1
+
+    def to_dict(self):
+        return {
+            'connect_ms': round(self.connect * 1000, 1),
+            'server_ms': round(self.server * 1000, 1),
+            'poll_wait_ms': round(self.poll_wait * 1000, 1),
+            'requests': self.requests
+        }
+
+    def server_timing_header(self):
+        """Format the timing as a Server-Timing response header value"""
+        return (f"connect;dur={self.connect * 1000:.1f}, "
+                f"server;dur={self.server * 1000:.1f}, "
+                f"poll-wait;dur={self.poll_wait * 1000:.1f}")
@@ -0,0 +1,139 @@
+"""
+Content-addressed storage for uploaded documents, and helpers for handling
+uploads as streams.
+
+An upload is copied in fixed-size chunks into a temporary file inside the
+store while it is hashed, then renamed to its SHA-256. The same document
+uploaded twice is stored once, and nothing is held in memory beyond one
+chunk. Blobs not used for `max_age` seconds are deleted, and the least
+recently used go first while the store is over `max_bytes` (see
+DiskRetention); collection runs at most every `gc_interval` seconds after a
+put, or on demand with
+
+    python BlobStore.py --root uploads/blobs
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from DiskRetention import DirectoryRetention, gc_main
+
+DEFAULT_ROOT = os.path.join('uploads', 'blobs')
+
+# Bytes read and written per step while storing or hashing an upload
+CHUNK_SIZE = 1024 * 1024
+
+# Retention: blobs idle for a week go, and the store is kept under 2 GB
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_GC_INTERVAL = 600
+
+
+class BlobTooLarge(ValueError):
+    """Raised when an upload exceeds the size limit it is stored with"""
+
+
+def peek(stream, size):
+    """First `size` bytes of a seekable stream, leaving its position unchanged"""
+    position = stream.tell()
+    head = stream.read(size)
+    stream.seek(position)
+    return head
+
+
+def stream_size(stream):
+    """Bytes from the current position to the end of a seekable stream"""
+    position = stream.tell()
+    size = stream.seek(0, os.SEEK_END) - position
+    stream.seek(position)
+    return size
+
+
+class BlobStore:
+    """Directory of blobs named by the SHA-256 of their content"""
+
+    def __init__(self, root=DEFAULT_ROOT, max_age=DEFAULT_MAX_AGE, max_bytes=DEFAULT_MAX_BYTES,
+                 gc_interval=DEFAULT_GC_INTERVAL):
+        self.root = root
+        # Uploads in progress are '.part' files in tmp/, which retention treats as temporary
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.retention = DirectoryRetention(root, max_age, max_bytes, gc_interval)
+        self._lock = threading.Lock()
+        self._counters = {'puts': 0, 'deduplicated': 0, 'bytes_written': 0}
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, stream, max_size=None):
+        """
+        Store a binary stream from its current position; returns the blob's digest.
+
+        Raises BlobTooLarge (and stores nothing) if the stream has more than
+        `max_size` bytes.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge(f"Upload is larger than {max_size} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            key = digest.hexdigest()
+            path = self.path(key)
+            with self._lock:
+                self._counters['puts'] += 1
+                if os.path.exists(path):
+                    self._counters['deduplicated'] += 1
+                else:
+                    self._counters['bytes_written'] += size
+            # Renaming over an existing copy keeps one file and refreshes its
+            # last use, and cannot race with gc() removing the old one
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.retention.maybe_gc()
+        return key
+
+    def open(self, digest):
+        """Open a blob for reading and mark it as used; raises FileNotFoundError if it is gone"""
+        path = self.path(digest)
+        f = open(path, 'rb')
+        os.utime(path)
+        return f
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def gc(self, now=None):
+        """Delete idle and least recently used blobs; returns (blobs removed, bytes freed)"""
+        return self.retention.gc(now)
+
+    def stats(self):
+        blobs, size = self.retention.usage()
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters, **self.retention.stats(), blobs=blobs, bytes=size)
+
+
+def copy_stream(source, destination):
+    """Copy one stream to another in CHUNK_SIZE pieces"""
+    shutil.copyfileobj(source, destination, CHUNK_SIZE)
+
+
+def main():
+    gc_main('Garbage-collect a blob store', BlobStore, DEFAULT_ROOT, DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Age and size limits for the on-disk stores (BlobStore, OcrCache).
+
+Both keep their files in two-character prefix directories under a root and
+mark a file as used by touching its mtime. A DirectoryRetention deletes the
+files not used for `max_age` seconds, then the least recently used while the
+directory is over `max_bytes`, and temporary files left by crashed writers.
+Collection runs at most every `gc_interval` seconds through maybe_gc(), or
+on demand from each store's command line (see gc_main).
+"""
+import argparse
+import os
+import threading
+import time
+
+# Files used this recently are never evicted for size, so nothing is deleted
+# while a request is still working with it
+MIN_IDLE = 300
+
+# Temporary files older than this were left by a crashed writer
+STALE_TMP_AGE = 3600
+
+# Files still being written: BlobStore's '.part' uploads, OcrCache's '.tmp' entries
+TMP_SUFFIXES = ('.part', '.tmp')
+
+
+class DirectoryRetention:
+    """Garbage collection of one store's root directory"""
+
+    def __init__(self, root, max_age, max_bytes, gc_interval, min_idle=MIN_IDLE):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self.min_idle = min_idle
+        self._lock = threading.Lock()
+        self._last_gc = time.monotonic()
+        self._counters = {'gc_runs': 0, 'gc_removed': 0, 'gc_bytes_freed': 0}
+
+    def files(self):
+        """(mtime, size, path) of every stored file, and the paths of temporary files"""
+        files, tmp_paths = [], []
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.endswith(TMP_SUFFIXES):
+                    tmp_paths.append(path)
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files, tmp_paths
+
+    def maybe_gc(self):
+        """Run gc() if gc_interval has passed since the last run"""
+        with self._lock:
+            if time.monotonic() - self._last_gc < self.gc_interval:
+                return None
+            self._last_gc = time.monotonic()
+        return self.gc()
+
+    def gc(self, now=None):
+        """
+        Delete files idle for longer than max_age, then the least recently used
+        until the directory fits in max_bytes. Returns (files removed, bytes freed).
+        """
+        now = now if now is not None else time.time()
+        removed = freed = 0
+        files, tmp_paths = self.files()
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            idle = now - mtime
+            if idle <= self.max_age and (total <= self.max_bytes or idle < self.min_idle):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+            freed += size
+            total -= size
+
+        for path in tmp_paths:
+            try:
+                if now - os.stat(path).st_mtime > STALE_TMP_AGE:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._counters['gc_runs'] += 1
+            self._counters['gc_removed'] += removed
+            self._counters['gc_bytes_freed'] += freed
+        return removed, freed
+
+    def usage(self):
+        """(files, bytes) stored; walks the directory, so not for every request"""
+        files, _ = self.files()
+        return len(files), sum(size for _, size, _ in files)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+def gc_main(description, open_store, default_root, default_max_age, default_max_bytes):
+    """
+    Command line for garbage-collecting a store: `open_store(root, max_age,
+    max_bytes)` returns a store whose `retention` is a DirectoryRetention.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--root', default=default_root)
+    parser.add_argument('--max-age', type=float, default=default_max_age, help='Seconds a file may stay unused')
+    parser.add_argument('--max-bytes', type=int, default=default_max_bytes, help='Size the store is kept under')
+    args = parser.parse_args()
+
+    retention = open_store(args.root, args.max_age, args.max_bytes).retention
+    removed, freed = retention.gc()
+    files, size = retention.usage()
+    print(f"Removed {removed} files ({freed} bytes); {files} files ({size} bytes) remain")
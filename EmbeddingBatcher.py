@@ -0,0 +1,129 @@
+"""
+Dynamic micro-batching for embedding requests.
+
+Texts from concurrent requests are gathered for up to `max_wait_ms` or until
+`max_batch_size` texts are waiting, encoded with a single call, and the rows
+are routed back to each caller's Future. One encode over 64 texts costs far
+less than 64 encodes over one text each, so throughput rises with load while
+a lone request waits at most a few milliseconds.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatcherOverloaded(Exception):
+    """Raised when the queue of waiting requests is full"""
+
+
+class MicroBatcher:
+    """
+    Run `encode_fn(list_of_texts) -> array` on batches gathered from many callers.
+
+    `max_queue_depth` bounds the number of requests waiting to be batched;
+    beyond it, submit() raises BatcherOverloaded instead of queueing forever.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=64, max_wait_ms=5, max_queue_depth=1024):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_depth = max_queue_depth
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # Threads do not survive fork: a pre-forked worker gets a fresh
+            # queue and starts its own batching thread on first use
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.max_queue_depth)
+        self._carry = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'texts': 0, 'batches': 0, 'rejected': 0}
+
+    def start(self):
+        """Start the batching thread if it is not already running"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, texts):
+        """Queue texts for encoding; returns a Future resolving to their embeddings, in order"""
+        self.start()
+        future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        try:
+            self._queue.put_nowait((list(texts), future))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise BatcherOverloaded('Embedding queue is full')
+        return future
+
+    def encode(self, texts, timeout=None):
+        """Encode texts through the batcher and wait for the result"""
+        return self.submit(texts).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['mean_batch_size'] = stats['texts'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _next_request(self, timeout=None):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return self._queue.get(timeout=timeout)
+
+    def _gather(self):
+        """Block for one request, then collect more until the batch is full or the wait runs out"""
+        batch = [self._next_request()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._next_request(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                # Would overflow this batch; it opens the next one instead
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._gather()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._stats['requests'] += len(batch)
+                self._stats['texts'] += len(texts)
+                self._stats['batches'] += 1
+
+            start = 0
+            for request_texts, future in batch:
+                future.set_result(embeddings[start:start + len(request_texts)])
+                start += len(request_texts)
@@ -0,0 +1,223 @@
+"""
+Cache of sentence embeddings for rubric text.
+
+The same definitions, causes and effects are sent for every student and every
+exam run, so each distinct text only needs encoding once. Texts are keyed by
+their normalized form plus the model name. There are two tiers: an in-memory
+LRU per process and an append-only float32 file on disk, memory-mapped so a
+restarted worker gets its warm entries back without re-encoding or loading
+them all into RAM.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within a process
+    fcntl = None
+
+DEFAULT_CACHE_DIR = 'embedding_cache'
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """NFKC-normalize and collapse whitespace, so trivially different copies share an entry"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+
+def make_embedding_key(text, model_name):
+    """Cache key for an already normalized text"""
+    return hashlib.sha256(model_name.encode() + b'\0' + text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU + memory-mapped disk store) cache of float32 vectors.
+
+    The disk store is a directory per model holding `vectors.f32` (rows of
+    float32) and `keys.log` ("<key> <row>" per line). Rows are only ever
+    appended, under an exclusive file lock, so several worker processes can
+    share one directory; entries written by other processes are picked up
+    from the log on a miss.
+    """
+
+    def __init__(self, model_name, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=10000):
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'texts': 0, 'duplicates': 0, 'memory_hits': 0, 'disk_hits': 0,
+                          'misses': 0, 'stores': 0}
+
+        self.directory = None
+        self._rows = {}
+        self._log_offset = 0
+        self._dim = None
+        self._mmap = None
+        if cache_dir:
+            self.directory = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9._-]', '_', model_name))
+            os.makedirs(self.directory, exist_ok=True)
+            self._read_meta()
+            self._read_log()
+
+    # Disk tier
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json')) as f:
+                self._dim = json.load(f)['dim']
+        except (OSError, ValueError, KeyError):
+            self._dim = None
+
+    def _read_log(self):
+        """Index the key log lines written since the last read (caller holds the lock or is __init__)"""
+        try:
+            with open(self._path('keys.log'), 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except OSError:
+            return
+        # Only whole lines: another process may be half way through an append
+        data = data[:data.rfind(b'\n') + 1]
+        for line in data.splitlines():
+            key, _, row = line.decode().partition(' ')
+            if row.isdigit():
+                self._rows[key] = int(row)
+        self._log_offset += len(data)
+
+    def _vectors(self, row):
+        """Memory map of the vector file, remapped if `row` lies past its end"""
+        if self._mmap is None or row >= len(self._mmap):
+            self._read_meta()
+            if self._dim is None:
+                return None
+            rows = os.path.getsize(self._path('vectors.f32')) // (4 * self._dim)
+            if row >= rows:
+                return None
+            self._mmap = np.memmap(self._path('vectors.f32'), dtype=np.float32, mode='r',
+                                   shape=(rows, self._dim))
+        return self._mmap
+
+    def _disk_get(self, key):
+        # Caller holds the lock
+        if self.directory is None:
+            return None
+        if key not in self._rows:
+            self._read_log()
+            if key not in self._rows:
+                return None
+        vectors = self._vectors(self._rows[key])
+        return None if vectors is None else np.array(vectors[self._rows[key]])
+
+    def _disk_append(self, keys, vectors):
+        # Caller holds the lock
+        with open(self._path('keys.log'), 'ab') as log:
+            if fcntl is not None:
+                fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                self._read_log()
+                self._read_meta()
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    with open(self._path('meta.json'), 'w') as f:
+                        json.dump({'model': self.model_name, 'dim': self._dim}, f)
+                elif vectors.shape[1] != self._dim:
+                    raise ValueError(f"Embedding size {vectors.shape[1]} does not match the store's {self._dim}")
+
+                new = [(key, vector) for key, vector in zip(keys, vectors) if key not in self._rows]
+                if not new:
+                    return
+                with open(self._path('vectors.f32'), 'ab') as f:
+                    first_row = f.tell() // (4 * self._dim)
+                    f.write(np.asarray([vector for _, vector in new], dtype=np.float32).tobytes())
+                lines = ''.join(f"{key} {first_row + i}\n" for i, (key, _) in enumerate(new))
+                log.write(lines.encode())
+                log.flush()
+                self._rows.update((key, first_row + i) for i, (key, _) in enumerate(new))
+                self._log_offset += len(lines)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(log, fcntl.LOCK_UN)
+
+    # Memory tier
+
+    def _remember(self, key, vector):
+        # Caller holds the lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached vector for a key, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+            vector = self._disk_get(key)
+            if vector is None:
+                self._counters['misses'] += 1
+            else:
+                self._counters['disk_hits'] += 1
+                self._remember(key, vector)
+            return vector
+
+    def set_many(self, keys, vectors):
+        """Store vectors (one row per key) in both tiers"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            self._counters['stores'] += len(keys)
+            if self.directory is not None and len(keys):
+                self._disk_append(keys, vectors)
+
+    def encode(self, texts, encode_fn):
+        """
+        Embeddings for `texts`, in order, encoding only the texts not cached.
+
+        Texts are normalized and deduplicated first, so a string repeated
+        within one request is encoded (and counted as a miss) once.
+        `encode_fn(list_of_texts)` must return one row per text.
+        """
+        normalized = [normalize_text(text) for text in texts]
+        keys = [make_embedding_key(text, self.model_name) for text in normalized]
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            self._counters['texts'] += len(keys)
+            self._counters['duplicates'] += len(keys) - len(unique)
+
+        found = {key: self.get(key) for key in unique}
+        missing = [key for key in unique if found[key] is None]
+        if missing:
+            text_of = dict(zip(keys, normalized))
+            encoded = np.asarray(encode_fn([text_of[key] for key in missing]), dtype=np.float32)
+            self.set_many(missing, encoded)
+            found.update(zip(missing, encoded))
+
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def stats(self):
+        """Hit/miss and dedup counters and tier sizes, for sizing the cache"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_items'] = len(self._memory)
+            stats['disk_items'] = len(self._rows)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['max_memory_items'] = self.max_memory_items
+        return stats
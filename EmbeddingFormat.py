@@ -0,0 +1,62 @@
+"""
+Binary response formats for /generate-embeddings.
+
+JSON spends about 8x the raw size on decimal floats, and both ends pay to
+format and parse them. Clients that ask for it get the embedding matrix as
+one buffer instead: raw little-endian float32/float16 (`application/octet-stream`)
+or a NumPy `.npy` file (`application/x-npy`). The `X-Embedding-Layout` header
+carries a small JSON object mapping `definition`, `causes` and `effects` to
+row ranges of the matrix.
+"""
+import io
+import json
+
+import numpy as np
+
+JSON_MIMETYPE = 'application/json'
+RAW_MIMETYPE = 'application/octet-stream'
+NPY_MIMETYPE = 'application/x-npy'
+
+# JSON first: it is what a client sending no Accept header (or */*) gets
+MIMETYPES = [JSON_MIMETYPE, RAW_MIMETYPE, NPY_MIMETYPE]
+
+DTYPES = {'float32': np.dtype('<f4'), 'float16': np.dtype('<f2')}
+
+LAYOUT_HEADER = 'X-Embedding-Layout'
+
+
+def embedding_layout(cause_count, effect_count, dtype, dim):
+    """Row ranges ([start, end)) of each rubric field in the embedding matrix"""
+    return {
+        'dtype': dtype,
+        'shape': [1 + cause_count + effect_count, dim],
+        'definition': [0, 1],
+        'causes': [1, 1 + cause_count],
+        'effects': [1 + cause_count, 1 + cause_count + effect_count]
+    }
+
+
+def encode_embeddings(embeddings, mimetype, dtype='float32'):
+    """Serialize an embedding matrix as raw little-endian bytes or as a .npy file"""
+    array = np.ascontiguousarray(embeddings, dtype=DTYPES[dtype])
+    if mimetype == NPY_MIMETYPE:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        return buffer.getvalue()
+    return array.tobytes()
+
+
+def decode_embeddings(body, mimetype, layout):
+    """
+    Client side: rebuild {'definition', 'causes', 'effects'} arrays from a
+    binary response body and its parsed X-Embedding-Layout header.
+    """
+    if mimetype == NPY_MIMETYPE:
+        matrix = np.load(io.BytesIO(body), allow_pickle=False)
+    else:
+        matrix = np.frombuffer(body, dtype=DTYPES[layout['dtype']]).reshape(layout['shape'])
+    return {field: matrix[layout[field][0]:layout[field][1]] for field in ('definition', 'causes', 'effects')}
+
+
+def layout_header(layout):
+    return json.dumps(layout, separators=(',', ':'))
@@ -1,8 +1,79 @@
-from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify
+
+from EmbeddingBatcher import BatcherOverloaded, MicroBatcher
+from EmbeddingCache import EmbeddingCache
+from EmbeddingFormat import (DTYPES, JSON_MIMETYPE, LAYOUT_HEADER, MIMETYPES, embedding_layout,
+                             encode_embeddings, layout_header)
+from EncoderBackends import create_encoder
+from Scoring import MATCH_THRESHOLD, best_matches, rubric_items, score_answers, split_answer
+from VectorIndex import SharedVectorIndex
 
 app = Flask(__name__)
-model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Encoder backend: 'torch' (SentenceTransformer), 'int8' (dynamically
+# quantized torch) or 'onnx' (ONNX Runtime). ENCODER_THREADS caps the
+# intra-op threads of each worker; 0 leaves the library default.
+ENCODER_BACKEND = os.environ.get('EMBEDDINGS_BACKEND', 'torch')
+ENCODER_THREADS = int(os.environ.get('EMBEDDINGS_THREADS_PER_WORKER', '0'))
+
+# Other backends drift slightly from torch, so their embeddings are cached apart
+CACHE_MODEL_NAME = MODEL_NAME if ENCODER_BACKEND == 'torch' else f'{MODEL_NAME}+{ENCODER_BACKEND}'
+
+# The model is loaded on first use (or by warm_up), not at import, so health
+# checks answer straight away. Under a pre-forking server, load it in the
+# master before forking and workers share the weights copy-on-write.
+model = None
+model_lock = threading.Lock()
+model_load_seconds = None
+
+def get_model():
+    """Return the encoder, loading it once, thread-safely"""
+    global model, model_load_seconds
+    if model is None:
+        with model_lock:
+            if model is None:
+                start = time.perf_counter()
+                loaded = create_encoder(ENCODER_BACKEND, MODEL_NAME, ENCODER_THREADS or None)
+                model_load_seconds = time.perf_counter() - start
+                model = loaded
+    return model
+
+def warm_up():
+    """Load the model and run one encode, so the first request does not pay for either"""
+    get_model().encode(["warm up"])
+
+def encode_batch(texts):
+    return get_model().encode(texts)
+
+# Micro-batching: texts from concurrent requests are encoded together once
+# BATCH_MAX_SIZE texts are waiting or the oldest has waited BATCH_MAX_WAIT_MS.
+# At most BATCH_QUEUE_DEPTH requests may wait; beyond that requests get a 503.
+BATCH_MAX_SIZE = 64
+BATCH_MAX_WAIT_MS = 5
+BATCH_QUEUE_DEPTH = 1024
+ENCODE_TIMEOUT = 60
+
+batcher = MicroBatcher(encode_batch, max_batch_size=BATCH_MAX_SIZE,
+                       max_wait_ms=BATCH_MAX_WAIT_MS, max_queue_depth=BATCH_QUEUE_DEPTH)
+
+# Rubric text repeats for every student, so embeddings are cached by text
+EMBEDDING_CACHE_ITEMS = 10000
+embedding_cache = EmbeddingCache(CACHE_MODEL_NAME, max_memory_items=EMBEDDING_CACHE_ITEMS)
+
+# Persistent ANN index over stored rubric points and answers, shared by all
+# gunicorn workers through its journal (see SharedVectorIndex)
+VECTOR_INDEX_PATH = 'vector_index.npz'
+vector_index = SharedVectorIndex(VECTOR_INDEX_PATH)
+MAX_TOP_K = 100
+
+def encode_texts(texts):
+    """Embeddings for texts, from the cache where possible and the batcher otherwise"""
+    return embedding_cache.encode(texts, lambda missing: batcher.encode(missing, timeout=ENCODE_TIMEOUT))
 
 @app.route('/generate-embeddings', methods=['POST'])
 def generate_embeddings():
@@ -11,9 +82,23 @@ def generate_embeddings():
     if not data or not all(k in data for k in ["definition", "causes", "effects"]):
         return jsonify({"error": "Missing required keys: 'definition', 'causes', 'effects'"}), 400
 
+    # Binary formats are opt-in through the Accept header; JSON stays the default
+    mimetype = request.accept_mimetypes.best_match(MIMETYPES, default=JSON_MIMETYPE)
+    dtype = request.args.get('dtype', 'float32')
+    if dtype not in DTYPES:
+        return jsonify({"error": f"Unsupported dtype {dtype!r}; use one of {sorted(DTYPES)}"}), 400
+
     # Flatten all text
     all_texts = [data["definition"]] + data["causes"] + data["effects"]
-    embeddings = model.encode(all_texts)
+    try:
+        embeddings = encode_texts(all_texts)
+    except BatcherOverloaded as e:
+        return jsonify({"error": str(e)}), 503
+
+    if mimetype != JSON_MIMETYPE:
+        layout = embedding_layout(len(data["causes"]), len(data["effects"]), dtype, embeddings.shape[1])
+        return Response(encode_embeddings(embeddings, mimetype, dtype), mimetype=mimetype,
+                        headers={LAYOUT_HEADER: layout_header(layout)})
 
     # Reconstruct with embeddings
     context_with_embeddings = {
@@ -37,5 +122,155 @@ def generate_embeddings():
 
     return jsonify(context_with_embeddings)
 
+@app.route('/score', methods=['POST'])
+def score():
+    """
+    Score student answers against a rubric.
+
+    Body: the rubric's 'definition', 'causes' and 'effects', plus 'answers':
+    a list with one entry per student, each a string, a list of paragraphs
+    (as /process_json returns) or {"id": ..., "answer": ... | "paragraphs": [...]}.
+    A single student may be sent as 'answer' instead. The rubric and every
+    answer segment are encoded together and scored with one matrix multiply.
+    """
+    data = request.json
+
+    if not data or not all(k in data for k in ["definition", "causes", "effects"]):
+        return jsonify({"error": "Missing required keys: 'definition', 'causes', 'effects'"}), 400
+    answers = data.get("answers", [data["answer"]] if "answer" in data else None)
+    if not isinstance(answers, list):
+        return jsonify({"error": "Provide 'answers' (a list) or 'answer'"}), 400
+
+    ids = []
+    segments = []
+    owners = []
+    for student, entry in enumerate(answers):
+        if isinstance(entry, dict):
+            ids.append(entry.get("id", student))
+            entry = entry.get("paragraphs", entry.get("answer", ""))
+        else:
+            ids.append(student)
+        if not isinstance(entry, (str, list)):
+            return jsonify({"error": f"Answer {student} must be a string or a list of paragraphs"}), 400
+        student_segments = split_answer(entry)
+        segments.extend(student_segments)
+        owners.extend([student] * len(student_segments))
+
+    try:
+        threshold = float(data.get("threshold", MATCH_THRESHOLD))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'threshold' must be a number"}), 400
+
+    items = rubric_items(data)
+    try:
+        embeddings = encode_texts([text for _, text in items] + segments)
+    except BatcherOverloaded as e:
+        return jsonify({"error": str(e)}), 503
+
+    similarity, segment = best_matches(embeddings[len(items):], owners, len(answers), embeddings[:len(items)])
+    reports = score_answers(items, segments, similarity, segment, threshold)
+    for student_id, report in zip(ids, reports):
+        report["id"] = student_id
+
+    return jsonify({
+        "threshold": threshold,
+        "class_score": round(sum(r["score"] for r in reports) / len(reports), 4) if reports else None,
+        "results": reports
+    })
+
+@app.route('/index/add', methods=['POST'])
+def index_add():
+    """
+    Add (or replace) texts in the vector index.
+
+    Body: {"items": [{"id": "geo-1-cause-2", "text": "...", "metadata": {...}}, ...]}
+    """
+    data = request.json
+    items = data.get("items") if data else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) and "id" in item and "text" in item
+                                              for item in items):
+        return jsonify({"error": "Provide 'items', each with an 'id' and a 'text'"}), 400
+
+    try:
+        embeddings = encode_texts([item["text"] for item in items])
+    except BatcherOverloaded as e:
+        return jsonify({"error": str(e)}), 503
+    try:
+        vector_index.add([str(item["id"]) for item in items], embeddings,
+                         [dict(item.get("metadata") or {}, text=item["text"]) for item in items])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(vector_index.stats())
+
+@app.route('/index/remove', methods=['POST'])
+def index_remove():
+    """Remove ids from the vector index. Body: {"ids": [...]}"""
+    data = request.json
+    if not data or not isinstance(data.get("ids"), list):
+        return jsonify({"error": "Provide 'ids' (a list)"}), 400
+    removed = vector_index.remove([str(i) for i in data["ids"]])
+    return jsonify(dict(vector_index.stats(), removed=removed))
+
+@app.route('/index/search', methods=['POST'])
+def index_search():
+    """
+    Nearest stored items for each query text.
+
+    Body: {"texts": [...] | "text": "...", "k": 10, "nprobe": 8, "exact": false}
+    """
+    data = request.json or {}
+    texts = data.get("texts", [data["text"]] if "text" in data else None)
+    if not isinstance(texts, list) or not texts:
+        return jsonify({"error": "Provide 'texts' (a list) or 'text'"}), 400
+    k = data.get("k", 10)
+    if not isinstance(k, int) or not 0 < k <= MAX_TOP_K:
+        return jsonify({"error": f"'k' must be an integer from 1 to {MAX_TOP_K}"}), 400
+    nprobe = data.get("nprobe")
+    if nprobe is not None and (not isinstance(nprobe, int) or isinstance(nprobe, bool) or nprobe < 1):
+        return jsonify({"error": "'nprobe' must be a positive integer"}), 400
+
+    try:
+        embeddings = encode_texts(texts)
+    except BatcherOverloaded as e:
+        return jsonify({"error": str(e)}), 503
+    results = vector_index.search(embeddings, k, nprobe=nprobe, exact=bool(data.get("exact")))
+    return jsonify({
+        "results": [
+            {
+                "text": text,
+                "matches": [{"id": vector_id, "score": round(score, 4), "metadata": metadata}
+                            for vector_id, score, metadata in matches]
+            } for text, matches in zip(texts, results)
+        ]
+    })
+
+@app.route('/index/stats', methods=['GET'])
+def index_stats():
+    return jsonify(vector_index.stats())
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: answers whether or not the model has been loaded yet"""
+    return jsonify({"status": "ok", "model_loaded": model is not None})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the model is loaded, 503 before"""
+    if model is None:
+        return jsonify({"status": "loading"}), 503
+    return jsonify({"status": "ready", "model": MODEL_NAME, "backend": ENCODER_BACKEND,
+                    "load_seconds": model_load_seconds})
+
+@app.route('/batch/stats', methods=['GET'])
+def batch_stats():
+    """Micro-batching counters: requests, texts, batches and queue depth"""
+    return jsonify(batcher.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Embedding cache hit/miss and dedup counters"""
+    return jsonify(embedding_cache.stats())
+
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=False)
@@ -0,0 +1,143 @@
+"""
+CPU encoder backends for the MiniLM sentence-embedding model.
+
+Every backend has `encode(list_of_texts) -> float32 array (N, 384)` and
+returns the same embeddings as SentenceTransformer('all-MiniLM-L6-v2')
+(mean-pooled and L2-normalized), so any of them can sit behind
+/generate-embeddings:
+
+  torch  SentenceTransformer as before
+  int8   the same model with its Linear layers dynamically quantized to int8
+  onnx   the transformer exported to ONNX and run with ONNX Runtime
+
+`threads` bounds intra-op parallelism, so several workers on one node do not
+oversubscribe its cores. torch, transformers and onnxruntime are imported
+only by the backend that needs them.
+"""
+import os
+
+import numpy as np
+
+BACKENDS = ('torch', 'int8', 'onnx')
+
+# Longest input in tokens; MiniLM was trained with 256
+MAX_SEQ_LENGTH = 256
+
+# Where the ONNX export is cached between runs
+ONNX_DIR = 'onnx_models'
+
+# Largest 1 - cosine allowed against torch. ONNX runs the same float32 graph;
+# int8 weights move embeddings a little but must not reorder rubric matches.
+MAX_DRIFT = {'torch': 1e-6, 'onnx': 1e-4, 'int8': 0.05}
+
+
+def mean_pool(token_embeddings, attention_mask):
+    """Average of the token embeddings, ignoring padding, then L2-normalized"""
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+class TorchEncoder:
+    """SentenceTransformer on PyTorch, optionally with int8 dynamic quantization"""
+
+    def __init__(self, model_name, threads=None, quantize=False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.model.max_seq_length = MAX_SEQ_LENGTH
+        if quantize:
+            # Weights of every Linear layer stored as int8; activations are
+            # quantized on the fly, which needs no calibration data
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode(self, texts, batch_size=64):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True,
+                                            convert_to_numpy=True), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """The MiniLM transformer under ONNX Runtime, with pooling done in NumPy"""
+
+    def __init__(self, model_name, threads=None, onnx_dir=ONNX_DIR):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        path = os.path.join(onnx_dir, model_name.replace('/', '_') + '.onnx')
+        if not os.path.exists(path):
+            export_onnx(model_name, path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(_hub_name(model_name))
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Sort by length so each batch pads to a similar length
+        order = np.argsort([len(text) for text in texts], kind='stable')
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            tokens = self.tokenizer(batch, padding=True, truncation=True, max_length=MAX_SEQ_LENGTH,
+                                    return_tensors='np')
+            feed = {name: tokens[name].astype(np.int64) for name in tokens if name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            rows.append(mean_pool(token_embeddings, tokens['attention_mask']))
+        embeddings = np.concatenate(rows).astype(np.float32)
+        result = np.empty_like(embeddings)
+        result[order] = embeddings
+        return result
+
+
+def _hub_name(model_name):
+    return model_name if '/' in model_name else f'sentence-transformers/{model_name}'
+
+
+def export_onnx(model_name, path):
+    """Export the transformer (token embeddings out, no pooling) to an ONNX file"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(_hub_name(model_name))
+    model = AutoModel.from_pretrained(_hub_name(model_name)).eval()
+    sample = tokenizer(['export sample'], return_tensors='pt')
+    names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic = {name: {0: 'batch', 1: 'tokens'} for name in names}
+    dynamic['token_embeddings'] = {0: 'batch', 1: 'tokens'}
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[name] for name in names), tmp_path, input_names=names,
+                          output_names=['token_embeddings'], dynamic_axes=dynamic, opset_version=14)
+    os.replace(tmp_path, path)
+
+
+def create_encoder(backend, model_name, threads=None):
+    """Build the encoder for a backend name from BACKENDS"""
+    if backend == 'torch':
+        return TorchEncoder(model_name, threads)
+    if backend == 'int8':
+        return TorchEncoder(model_name, threads, quantize=True)
+    if backend == 'onnx':
+        return OnnxEncoder(model_name, threads)
+    raise ValueError(f"Unknown encoder backend {backend!r}; use one of {BACKENDS}")
+
+
+def cosine_drift(reference, candidate):
+    """Per-row 1 - cosine similarity between two embedding matrices"""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    dots = (reference * candidate).sum(axis=1)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return 1 - dots / np.clip(norms, 1e-12, None)
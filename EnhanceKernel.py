@@ -0,0 +1,203 @@
+"""
+Fused NumPy version of the page enhancement chain.
+
+`PdfPipeline.enhance_image` used to run GaussianBlur, then Brightness,
+Contrast and Sharpness from ImageEnhance, each a full pass that allocates a
+new image. Here the same arithmetic is done in two passes through one
+intermediate 8-bit page: blur + brightness (collecting the mean the contrast step
+needs), then contrast + sharpen. Both passes walk the page in strips of rows
+with three float32 buffers of STRIP_BYTES each, kept per page size, so
+scratch space stays well under the size of the page and a worker converting
+a long PDF allocates it once.
+
+PIL's semantics are followed: the blur is Pillow's three-pass extended box
+blur, brightness blends with black, contrast with the mean grey level, and
+sharpness with the SMOOTH filter, whose one-pixel border is left unfiltered.
+Every step is rounded to 8 bits the way PIL rounds it (the blends truncate).
+The blur is one composed kernel rather than six rounded box passes, so
+outputs still differ by about a quarter level on average and by a few
+levels at worst.
+"""
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Weights of the RGB -> L conversion Pillow uses for the contrast mean
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Passes of Pillow's box-blur approximation of a Gaussian
+BLUR_PASSES = 3
+
+# Outer blur taps lighter than this are dropped (for radius 0.5 they move a
+# pixel by well under a level) and the rest renormalized
+MIN_TAP = 1e-3
+
+# Bytes of float32 per strip buffer; strips are as many rows as fit, but at
+# least MIN_STRIP_ROWS, so scratch space does not grow with the page width
+STRIP_BYTES = 1 << 18
+MIN_STRIP_ROWS = 16
+
+# Largest mean and 99th-percentile absolute difference from enhance_image_pil
+# allowed, in 8-bit levels
+MAX_MEAN_DIFF = 0.5
+MAX_P99_DIFF = 4
+
+
+def gaussian_taps(radius, passes=BLUR_PASSES):
+    """
+    1-D kernel equal to Pillow's GaussianBlur(radius): `passes` box blurs of
+    fractional radius, composed into one set of taps, less negligible outer taps.
+    """
+    sigma2 = radius * radius / passes
+    whole = int((np.sqrt(12 * sigma2 + 1) - 1) / 2)
+    fraction = ((2 * whole + 1) * (whole * (whole + 1) - 3 * sigma2) /
+                (6 * (sigma2 - (whole + 1) ** 2)))
+    box = np.concatenate([[fraction], np.ones(2 * whole + 1), [fraction]])
+    box /= box.sum()
+    taps = np.array([1.0])
+    for _ in range(passes):
+        taps = np.convolve(taps, box)
+    while len(taps) > 1 and taps[0] < MIN_TAP:
+        taps = taps[1:-1]
+    return (taps / taps.sum()).astype(np.float32)
+
+
+class FusedEnhancer:
+    """
+    Blur + brightness + contrast + sharpness on 'L' or 'RGB' images.
+
+    The page is read and processed in strips of about `strip_bytes` of
+    float32 per buffer, so scratch space is three such buffers whatever the
+    page width; they are kept and reused while the page size stays the same.
+    The only page-sized array is the 8-bit result, which also holds the
+    output of pass 1.
+    """
+
+    def __init__(self, blur_radius=0.5, strip_bytes=STRIP_BYTES):
+        self.taps = gaussian_taps(blur_radius)
+        self.reach = len(self.taps) // 2
+        self.strip_bytes = strip_bytes
+        self._shape = None
+
+    def _buffers(self, shape):
+        if shape != self._shape:
+            height, width = shape[:2]
+            channels = shape[2:]
+            row_bytes = width * (shape[2] if channels else 1) * 4
+            self.strip_rows = min(max(self.strip_bytes // row_bytes, MIN_STRIP_ROWS), height)
+            rows = self.strip_rows
+            pad = self.reach
+            # Each buffer doubles as another pass's temporary: `work` holds the
+            # horizontal blur's products, `padded` the vertical blur's, and
+            # `rows` the SMOOTH filter of pass 2
+            self.padded = np.empty((rows + 2 * pad, width + 2 * pad) + channels, dtype=np.float32)
+            self.rows = np.empty((rows + 2 * pad, width) + channels, dtype=np.float32)
+            self.work = np.empty((rows + 2 * max(pad, 1), width) + channels, dtype=np.float32)
+            self._shape = shape
+
+    def _blur_brighten(self, image, page, start, stop, brightness_factor):
+        """Pass 1 over rows [start, stop): blur with edges extended, then brighten into page"""
+        pad = self.reach
+        height, width = page.shape[:2]
+        count = stop - start
+        padded = self.padded[:count + 2 * pad]
+        top = max(start - pad, 0)
+        source = np.asarray(image.crop((0, top, width, min(stop + pad, height))))
+        padded[:, pad:pad + width] = source[np.clip(np.arange(start - pad, stop + pad), 0, height - 1) - top]
+        padded[:, :pad] = padded[:, pad:pad + 1]
+        padded[:, pad + width:] = padded[:, pad + width - 1:pad + width]
+
+        # Horizontal pass over the strip and its halo rows, then the vertical pass
+        rows = self.rows[:count + 2 * pad]
+        product = self.work[:count + 2 * pad]
+        np.multiply(padded[:, 0:width], self.taps[0], out=rows)
+        for k in range(1, len(self.taps)):
+            rows += np.multiply(padded[:, k:k + width], self.taps[k], out=product)
+        work = self.work[:count]
+        product = self.padded[:count, :width]
+        np.multiply(rows[0:count], self.taps[0], out=work)
+        for k in range(1, len(self.taps)):
+            work += np.multiply(rows[k:k + count], self.taps[k], out=product)
+        np.rint(work, out=work)
+
+        # Brightness is a blend with black; PIL's blends truncate to 8 bits
+        work *= brightness_factor
+        np.clip(work, 0, 255, out=work)
+        np.floor(work, out=work)
+        page[start:stop] = work
+        return work.sum(axis=(0, 1), dtype=np.float64)
+
+    def _contrast_sharpen(self, page, start, stop, mean, contrast_factor, sharpness_factor):
+        """Pass 2 over rows [start, stop) of page, in place: contrast, then sharpness"""
+        height, width = page.shape[:2]
+        # One halo row each side for the 3x3 SMOOTH filter; the row above has
+        # already been overwritten, so its pass 1 value comes from self.above
+        top, bottom = max(start - 1, 0), min(stop + 1, height)
+        work = self.work[:bottom - top]
+        if start > 0:
+            work[0] = self.above
+            work[1:] = page[start:bottom]
+        else:
+            work[...] = page[top:bottom]
+
+        # Contrast is a blend with the mean grey level
+        work -= mean
+        work *= contrast_factor
+        work += mean
+        np.clip(work, 0, 255, out=work)
+        np.floor(work, out=work)
+
+        # Sharpness is a blend with SMOOTH, [[1, 1, 1], [1, 5, 1], [1, 1, 1]] / 13,
+        # which leaves the one-pixel border of the page unfiltered
+        first, last = max(start, 1), min(stop, height - 1)
+        if last > first and width > 2:
+            count = last - first
+            offset = first - top
+            smooth = self.rows[:count, :width - 2]
+            np.multiply(work[offset:offset + count, 1:-1], 4, out=smooth)
+            for dy in (-1, 0, 1):
+                for dx in range(3):
+                    smooth += work[offset + dy:offset + dy + count, dx:dx + width - 2]
+            smooth /= 13
+            np.rint(smooth, out=smooth)
+            # out = smooth + f * (work - smooth), computed in place; SMOOTH
+            # already has every row of work it needs
+            inner = work[offset:offset + count, 1:-1]
+            inner -= smooth
+            inner *= sharpness_factor
+            inner += smooth
+            np.clip(inner, 0, 255, out=inner)
+            np.floor(inner, out=inner)
+
+        self.above = page[stop - 1].copy()
+        page[start:stop] = work[start - top:stop - top]
+
+    def __call__(self, image, contrast_factor=1.5, sharpness_factor=1.5, brightness_factor=1.2):
+        if image.mode not in ('L', 'RGB'):
+            raise ValueError(f"Unsupported image mode {image.mode!r}; use 'L' or 'RGB'")
+        width, height = image.size
+        shape = (height, width) if image.mode == 'L' else (height, width, 3)
+        self._buffers(shape)
+        page = np.empty(shape, dtype=np.uint8)
+        strips = [(start, min(start + self.strip_rows, height)) for start in range(0, height, self.strip_rows)]
+
+        # Pass 1 also sums the brightened page for the contrast step's mean
+        sums = sum(self._blur_brighten(image, page, start, stop, brightness_factor) for start, stop in strips)
+        channel_means = np.atleast_1d(sums / (height * width))
+        mean = np.floor((channel_means[0] if image.mode == 'L' else channel_means @ LUMA) + 0.5)
+
+        for start, stop in strips:
+            self._contrast_sharpen(page, start, stop, mean, contrast_factor, sharpness_factor)
+        return Image.fromarray(page, image.mode)
+
+
+_local = threading.local()
+
+
+def enhance_image_fused(image, contrast_factor=1.5, sharpness_factor=1.5, brightness_factor=1.2):
+    """FusedEnhancer with a per-thread instance, so buffers are reused page after page"""
+    enhancer = getattr(_local, 'enhancer', None)
+    if enhancer is None:
+        enhancer = _local.enhancer = FusedEnhancer()
+    return enhancer(image, contrast_factor, sharpness_factor, brightness_factor)
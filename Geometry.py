@@ -0,0 +1,92 @@
+"""
+Batched geometry for OCR bounding boxes.
+
+Every function takes a whole page of boxes as one NumPy array, so handlers do
+one array operation per page instead of one Python call per word. Polygons
+are Azure's 8-point format `[x0, y0, x1, y1, x2, y2, x3, y3]` (clockwise from
+the top-left corner); boxes are `[x_min, y_min, x_max, y_max]`.
+"""
+import numpy as np
+
+
+def as_polygons(polygons):
+    """Return an (N, 4, 2) array of corner points from N 8-point polygons"""
+    points = np.asarray(polygons)
+    if points.size == 0:
+        return points.reshape(0, 4, 2)
+    return points.reshape(-1, 4, 2)
+
+
+def polygons_to_boxes(polygons):
+    """Axis-aligned [x_min, y_min, x_max, y_max] boxes, shape (N, 4)"""
+    points = as_polygons(polygons)
+    return np.concatenate([points.min(axis=1), points.max(axis=1)], axis=1)
+
+
+def centroids(polygons):
+    """Centre point of each polygon, shape (N, 2)"""
+    return as_polygons(polygons).mean(axis=1)
+
+
+def box_centroids(boxes):
+    """Centre point of each [x_min, y_min, x_max, y_max] box, shape (N, 2)"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:]) / 2
+
+
+def skew_angles(polygons):
+    """
+    Rotation of each polygon in degrees, from the direction of its top edge.
+
+    Angles are clockwise in image coordinates (y grows downwards), the same
+    convention as the page `angle` Azure returns.
+    """
+    points = as_polygons(polygons).astype(float)
+    top_edge = points[:, 1] - points[:, 0]
+    return np.degrees(np.arctan2(top_edge[:, 1], top_edge[:, 0]))
+
+
+def page_skew(polygons, weights=None):
+    """
+    Skew estimate for a whole page in degrees.
+
+    The weighted median of the per-polygon angles, so a few odd words (or
+    rotated stamps) do not drag the estimate. Longer words are more reliable,
+    so top-edge length is the default weight.
+    """
+    points = as_polygons(polygons).astype(float)
+    if len(points) == 0:
+        return 0.0
+    angles = skew_angles(points)
+    if weights is None:
+        weights = np.linalg.norm(points[:, 1] - points[:, 0], axis=1)
+    weights = np.asarray(weights, dtype=float)
+    if weights.sum() <= 0:
+        return float(np.median(angles))
+    order = np.argsort(angles)
+    cumulative = np.cumsum(weights[order])
+    return float(angles[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+def box_areas(boxes):
+    """Area of each box, shape (N,)"""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def pairwise_intersections(boxes_a, boxes_b=None):
+    """Intersection area of every pair of boxes, shape (N, M)"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = a if boxes_b is None else np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    return np.clip(width, 0, None) * np.clip(height, 0, None)
+
+
+def pairwise_iou(boxes_a, boxes_b=None):
+    """Intersection over union of every pair of boxes, shape (N, M)"""
+    a = np.asarray(boxes_a, dtype=float).reshape(-1, 4)
+    b = a if boxes_b is None else np.asarray(boxes_b, dtype=float).reshape(-1, 4)
+    intersections = pairwise_intersections(a, b)
+    unions = box_areas(a)[:, None] + box_areas(b)[None, :] - intersections
+    return np.divide(intersections, unions, out=np.zeros_like(intersections), where=unions > 0)
@@ -0,0 +1,513 @@
+"""
+Headless bulk grading: scanned booklets -> page images -> OCR -> layout ->
+embeddings -> rubric scores.
+
+    python GradePipeline.py scans/ --rubric rubric.json --output runs/exam1
+
+Every PDF in the input directory is one student's booklet; so is every
+sub-directory of page images, and every loose image. Pages stream through
+stages connected by bounded queues, and each stage has its own worker pool:
+
+  raster    PDF page -> enhanced PNG (PdfPipeline.process_page, in processes)
+  ocr       page image -> word_data (Azure Read, or the local MockAzure stand-in)
+  layout    word_data -> paragraphs (PageLayout, as /process_json does)
+  assemble  pages -> booklet, once every page of the booklet has arrived
+  score     booklets -> embeddings -> rubric scores (Scoring), a batch at a time
+
+A full queue blocks the stage feeding it, so memory stays bounded however
+many booklets there are. Page images, word data, layouts and scores are
+checkpointed under the output directory as they are produced; running the
+same command again resumes, skipping every booklet already scored and every
+page already rendered or read.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from EmbeddingCache import EmbeddingCache
+from EncoderBackends import BACKENDS, create_encoder
+from LayoutDocument import PageLayout
+from OcrCache import OcrCache, make_cache_key
+from PdfPipeline import DEFAULT_DPI, pdf_page_count, process_page
+from Preprocess import prepare_image
+from ReadPoller import ReadPoller
+from Scoring import best_matches, rubric_items, score_answers, split_answer
+import ReadApi
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Same model as the Embeddings service, so the embedding cache is shared
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Items each queue holds before the stage feeding it blocks
+QUEUE_SIZE = 32
+
+# Booklets encoded and scored together by one score worker
+SCORE_BATCH = 8
+
+# OCR backends: 'read' calls Azure Read; 'mock' runs the local MockAzure stand-in
+OCR_BACKENDS = ('read', 'mock')
+DEFAULT_OCR_BACKEND = 'read'
+
+# Dimensions of the hashing stand-in encoder (MiniLM's, so caches line up)
+HASHING_DIM = 384
+
+
+def write_json(path, data):
+    """Write JSON atomically, so an interrupted run never leaves a half-written checkpoint"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class HashingEncoder:
+    """
+    Local stand-in for the sentence encoder: hashed word unigrams and bigrams,
+    L2-normalized. Needs no model download, and texts that share words score
+    as similar, so whole runs can be exercised offline. Not a semantic model.
+    """
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        words = re.findall(r'\w+', unicodedata.normalize('NFKC', text).lower())
+        return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+    def encode(self, texts, batch_size=64):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+                embeddings[row, digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+class Failure:
+    """Stands in for an item that failed; passed through later stages to the booklet it belongs to"""
+
+    def __init__(self, item, stage, error):
+        self.booklet = item['booklet']
+        self.page = item.get('page')
+        self.stage = stage
+        self.error = f"{type(error).__name__}: {error}"
+
+
+_DONE = object()
+
+
+class Stage:
+    """
+    A pool of worker threads reading from a bounded input queue.
+
+    `fn` maps one item to its output, or with `batch_size` > 1 a list of up to
+    that many items to a list of outputs. Outputs go to the next stage's
+    input (blocking while it is full), or to `sink` from the last stage;
+    None outputs are dropped. An item whose `fn` raises is replaced by a
+    Failure, and Failures skip `fn` unless `handles_failures` is set.
+    """
+
+    def __init__(self, name, fn, workers=1, batch_size=1, queue_size=QUEUE_SIZE, handles_failures=False,
+                 sink=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.handles_failures = handles_failures
+        self.sink = sink
+        self.input = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.items = 0
+        self.failures = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self, next_stage=None):
+        self.next = next_stage
+        self._threads = [threading.Thread(target=self._run, name=f'{self.name}-{n}', daemon=True)
+                         for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        """Let the workers finish the queued items, then stop"""
+        for _ in self._threads:
+            self.input.put(_DONE)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _take(self):
+        """The next batch of items, and whether this worker should stop after it"""
+        item = self.input.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self.input.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _emit(self, output):
+        if output is None:
+            return
+        if self.next is not None:
+            self.next.input.put(output)
+        elif self.sink is not None:
+            self.sink(output)
+
+    def _run(self):
+        while True:
+            batch, last = self._take()
+            if self.handles_failures:
+                work = batch
+            else:
+                work = [item for item in batch if not isinstance(item, Failure)]
+                for item in batch:
+                    if isinstance(item, Failure):
+                        self._emit(item)
+
+            if work:
+                start = time.perf_counter()
+                try:
+                    outputs = self.fn(work) if self.batch_size > 1 else [self.fn(work[0])]
+                    failures = 0
+                except Exception as e:
+                    print(f"[{self.name}] {', '.join(sorted({item['booklet'] for item in work}))} failed: {e}")
+                    outputs = [Failure(item, self.name, e) for item in work]
+                    failures = len(work)
+                with self._lock:
+                    self.items += len(work)
+                    self.failures += failures
+                    self.busy += time.perf_counter() - start
+                for output in outputs:
+                    self._emit(output)
+
+            if last:
+                return
+
+
+class GradePipeline:
+    """One grading run over an input directory, checkpointed under `output_dir`"""
+
+    def __init__(self, input_dir, rubric, output_dir, ocr_backend=DEFAULT_OCR_BACKEND, encoder='torch',
+                 dpi=DEFAULT_DPI, raster_workers=None, ocr_workers=16, layout_workers=2, score_workers=1,
+                 preprocess=False, endpoint=None, key=None, mock_latency=1.0):
+        self.input_dir = input_dir
+        self.rubric = rubric
+        self.output_dir = output_dir
+        self.dpi = dpi
+        self.preprocess = preprocess
+        self.workers = {
+            'raster': raster_workers or os.cpu_count() or 1,
+            'ocr': ocr_workers,
+            'layout': layout_workers,
+            'score': score_workers,
+        }
+        self.ocr_backend = ocr_backend
+        self.encoder_backend = encoder
+        self.endpoint = endpoint or ReadApi.endpoint
+        self.key = key or ReadApi.subscription_key
+        self.mock_latency = mock_latency
+        self.booklets = {}
+        self.results = {}
+        self.failures = {}
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._pages = {}
+
+    # Checkpoint paths
+
+    def _path(self, kind, booklet, name=None):
+        return os.path.join(self.output_dir, kind, booklet, name) if name else \
+            os.path.join(self.output_dir, kind, f'{booklet}.json')
+
+    # Discovery
+
+    def discover(self):
+        """
+        {booklet id: [(page number, source, kind)]}, kind 'pdf' or 'image'.
+        A PDF that cannot be read (or has no pages) is recorded as a failed
+        booklet with no pages, and the rest of the run goes on.
+        """
+        booklets = {}
+        for path in sorted(glob.glob(os.path.join(self.input_dir, '*'))):
+            name, extension = os.path.splitext(os.path.basename(path))
+            if extension.lower() == '.pdf':
+                try:
+                    page_count = pdf_page_count(path)
+                    if not page_count:
+                        raise ValueError('PDF has no pages')
+                except Exception as e:
+                    self.record_failure(Failure({'booklet': name}, 'discover', e))
+                    booklets[name] = []
+                    continue
+                booklets[name] = [(page, path, 'pdf') for page in range(1, page_count + 1)]
+            elif extension.lower() in IMAGE_EXTENSIONS:
+                booklets[name] = [(1, path, 'image')]
+            elif os.path.isdir(path):
+                images = sorted(p for p in glob.glob(os.path.join(path, '*'))
+                                if p.lower().endswith(IMAGE_EXTENSIONS))
+                if images:
+                    booklets[os.path.basename(path)] = [(n, p, 'image') for n, p in enumerate(images, 1)]
+        return booklets
+
+    # Stage functions
+
+    def raster(self, item):
+        """Render and enhance a PDF page; page images are used as they are"""
+        if item['kind'] == 'image':
+            item['image'] = item['source']
+            return item
+        path = self._path('pages', item['booklet'], f"page_{item['page']}.png")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            self.raster_pool.submit(process_page, item['source'], item['page'], tmp_path, self.dpi,
+                                    1.5, 1.5, 1.2, 'PNG', None).result()
+            os.replace(tmp_path, path)
+        item['image'] = path
+        return item
+
+    def ocr(self, item):
+        """word_data of a page image, from its checkpoint, the OCR cache or the Read API"""
+        path = self._path('ocr', item['booklet'], f"page_{item['page']}.json")
+        if os.path.exists(path):
+            item['word_data'] = read_json(path)['word_data']
+            return item
+
+        with open(item['image'], 'rb') as f:
+            image_data = f.read()
+        model = ReadApi.READ_MODEL + '+preprocess' if self.preprocess else ReadApi.READ_MODEL
+        key = make_cache_key(image_data, self.read_endpoint, model)
+        result = self.ocr_cache.get(key)
+        if result is None:
+            prepared = prepare_image(image_data) if self.preprocess else None
+            upload = prepared.data if prepared is not None else image_data
+            result = self.poller.analyze(self.read_url, upload).result(timeout=ReadApi.READ_TIMEOUT + 5)
+            if result['status'] != 'succeeded':
+                raise RuntimeError('Text recognition failed')
+            if prepared is not None:
+                prepared.restore_read_result(result)
+            self.ocr_cache.set(key, result)
+
+        item['word_data'] = ReadApi.build_word_data(result)
+        write_json(path, {'word_data': item['word_data']})
+        return item
+
+    def layout(self, item):
+        """
+        Paragraphs of a page in reading order: the layout /process_json builds,
+        without keeping a raw JSON artifact for every page of the run
+        """
+        item['paragraphs'] = PageLayout(item.pop('word_data')).paragraphs
+        return item
+
+    def assemble(self, item):
+        """Collect pages until a booklet is complete, then emit the booklet"""
+        failed = isinstance(item, Failure)
+        booklet = item.booklet if failed else item['booklet']
+        pages = self._pages.setdefault(booklet, {})
+        pages[item.page if failed else item['page']] = item
+        if len(pages) < len(self.booklets[booklet]):
+            return None
+
+        del self._pages[booklet]
+        failed = [page for page in pages.values() if isinstance(page, Failure)]
+        if failed:
+            self.record_failure(failed[0])
+            return None
+        paragraphs = [pages[n]['paragraphs'] for n in sorted(pages)]
+        write_json(self._path('layout', booklet), {'pages': paragraphs})
+        return {'booklet': booklet, 'pages': paragraphs}
+
+    def score(self, booklets):
+        """Encode and score a batch of booklets against the rubric"""
+        segments, owners = [], []
+        for student, booklet in enumerate(booklets):
+            booklet_segments = split_answer([p for page in booklet['pages'] for p in page])
+            segments.extend(booklet_segments)
+            owners.extend([student] * len(booklet_segments))
+
+        embeddings = self.embedding_cache.encode(segments, self.encoder.encode)
+        similarity, segment = best_matches(embeddings, owners, len(booklets), self.rubric_embeddings)
+        reports = score_answers(self.items, segments, similarity, segment)
+        for booklet, report in zip(booklets, reports):
+            report['id'] = booklet['booklet']
+            report['pages'] = len(booklet['pages'])
+            write_json(self._path('scores', booklet['booklet']), report)
+            with self._lock:
+                self.results[booklet['booklet']] = report
+        return []
+
+    def record_failure(self, failure):
+        """Note a booklet that could not be scored; it has no score checkpoint, so the next run retries it"""
+        with self._lock:
+            self.failures.setdefault(failure.booklet, {'stage': failure.stage, 'error': failure.error,
+                                                       'page': failure.page})
+
+    # Backends
+
+    def _start_ocr_backend(self):
+        self.mock_server = None
+        if self.ocr_backend == 'mock':
+            from MockAzure import MockAzureServer
+
+            self.mock_server = MockAzureServer(('127.0.0.1', 0), latency=self.mock_latency).start()
+            self.read_endpoint = self.mock_server.endpoint
+            # Stand-in results are not worth keeping between runs
+            self.ocr_cache = OcrCache(cache_dir=None)
+            self.poller = ReadPoller('mock-key', timeout=ReadApi.READ_TIMEOUT)
+        else:
+            self.read_endpoint = self.endpoint
+            # The same directory as TextExtractor's cache, so pages it has already read are not sent again
+            self.ocr_cache = OcrCache()
+            self.poller = ReadPoller(self.key, timeout=ReadApi.READ_TIMEOUT)
+        self.read_url = ReadApi.read_analyze_url(self.read_endpoint)
+
+    def _load_encoder(self):
+        if self.encoder_backend == 'hashing':
+            self.encoder = HashingEncoder()
+            cache_name = f'hashing-{HASHING_DIM}'
+        else:
+            self.encoder = create_encoder(self.encoder_backend, MODEL_NAME)
+            cache_name = MODEL_NAME if self.encoder_backend == 'torch' else f'{MODEL_NAME}+{self.encoder_backend}'
+        self.embedding_cache = EmbeddingCache(cache_name)
+        self.items = rubric_items(self.rubric)
+        self.rubric_embeddings = self.embedding_cache.encode([text for _, text in self.items], self.encoder.encode)
+
+    # Run
+
+    def run(self):
+        start = time.perf_counter()
+        self.booklets = self.discover()
+        pending = {}
+        for booklet, pages in self.booklets.items():
+            path = self._path('scores', booklet)
+            if not pages:
+                # Failed discovery; already in self.failures
+                continue
+            if os.path.exists(path):
+                self.results[booklet] = read_json(path)
+                self.skipped += 1
+            else:
+                pending[booklet] = pages
+        page_count = sum(len(pages) for pages in pending.values())
+        print(f"{len(self.booklets)} booklets: {self.skipped} already scored, "
+              f"{len(pending)} to grade ({page_count} pages)")
+
+        self._load_encoder()
+        self._start_ocr_backend()
+        self.raster_pool = ProcessPoolExecutor(max_workers=self.workers['raster'])
+        stages = [
+            Stage('raster', self.raster, self.workers['raster']),
+            Stage('ocr', self.ocr, self.workers['ocr']),
+            Stage('layout', self.layout, self.workers['layout']),
+            Stage('assemble', self.assemble, 1, handles_failures=True),
+            Stage('score', self.score, self.workers['score'], batch_size=SCORE_BATCH, sink=self.record_failure),
+        ]
+        try:
+            for stage, next_stage in zip(stages, stages[1:] + [None]):
+                stage.start(next_stage)
+            for booklet, pages in pending.items():
+                for page, source, kind in pages:
+                    stages[0].input.put({'booklet': booklet, 'page': page, 'source': source, 'kind': kind})
+            for stage in stages:
+                stage.close()
+                stage.join()
+        finally:
+            self.raster_pool.shutdown()
+            self.poller.stop()
+            if self.mock_server is not None:
+                self.mock_server.shutdown()
+
+        elapsed = time.perf_counter() - start
+        summary = self.summary(elapsed)
+        write_json(os.path.join(self.output_dir, 'summary.json'), summary)
+        self.report(stages, elapsed, page_count)
+        return summary
+
+    def summary(self, elapsed):
+        scores = [report['score'] for report in self.results.values()]
+        return {
+            'booklets': len(self.booklets),
+            'scored': len(self.results),
+            'resumed': self.skipped,
+            'failed': self.failures,
+            'class_score': round(sum(scores) / len(scores), 4) if scores else None,
+            'elapsed_seconds': round(elapsed, 2),
+            'scores': {booklet: self.results[booklet]['score'] for booklet in sorted(self.results)}
+        }
+
+    def report(self, stages, elapsed, page_count):
+        """
+        Per-stage counts and busy time. items/s is what a stage sustains with
+        all its workers busy; the lowest is the bottleneck to add workers to.
+        """
+        print(f"\n{'stage':<10}{'workers':>8}{'items':>8}{'failed':>8}{'busy s':>9}{'items/s':>9}")
+        for stage in stages:
+            rate = stage.items / stage.busy * stage.workers if stage.busy else 0.0
+            print(f"{stage.name:<10}{stage.workers:>8}{stage.items:>8}{stage.failures:>8}"
+                  f"{stage.busy:>9.2f}{rate:>9.1f}")
+        print(f"\n{page_count} pages in {elapsed:.2f}s ({page_count / elapsed if elapsed else 0:.1f} pages/s); "
+              f"{len(self.results)} booklets scored, {len(self.failures)} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Grade a directory of scanned answer booklets')
+    parser.add_argument('input_dir', help='PDFs, page images, or one directory of page images per booklet')
+    parser.add_argument('--rubric', required=True, help="JSON file with 'definition', 'causes' and 'effects'")
+    parser.add_argument('--output', required=True, help='Run directory; checkpoints and scores are written here')
+    parser.add_argument('--ocr', choices=OCR_BACKENDS, default=DEFAULT_OCR_BACKEND,
+                        help="'read' calls Azure Read; 'mock' runs the local MockAzure stand-in")
+    parser.add_argument('--endpoint', help='Azure Read endpoint (default: ReadApi.endpoint)')
+    parser.add_argument('--key', help='Azure Read key (default: ReadApi.subscription_key)')
+    parser.add_argument('--mock-latency', type=float, default=1.0, help='Seconds a mock Read operation runs')
+    parser.add_argument('--encoder', choices=BACKENDS + ('hashing',), default='torch',
+                        help="Embedding backend; 'hashing' is a local stand-in that needs no model")
+    parser.add_argument('--preprocess', action='store_true', help='Binarize, deskew and downscale before OCR')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--raster-workers', type=int, default=None, help='Processes (default: one per core)')
+    parser.add_argument('--ocr-workers', type=int, default=16, help='Read operations in flight')
+    parser.add_argument('--layout-workers', type=int, default=2)
+    parser.add_argument('--score-workers', type=int, default=1)
+    args = parser.parse_args()
+
+    pipeline = GradePipeline(args.input_dir, read_json(args.rubric), args.output, ocr_backend=args.ocr,
+                             encoder=args.encoder, dpi=args.dpi, raster_workers=args.raster_workers,
+                             ocr_workers=args.ocr_workers, layout_workers=args.layout_workers,
+                             score_workers=args.score_workers, preprocess=args.preprocess,
+                             endpoint=args.endpoint, key=args.key, mock_latency=args.mock_latency)
+    summary = pipeline.run()
+    if summary['failed']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
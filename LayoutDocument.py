@@ -0,0 +1,273 @@
+"""
+Stateful, incrementally updated OCR layout document.
+
+A LayoutDocument holds the OCR items of each page and the paragraphs built
+from them. Page-level deltas (add, replace or remove a page) only lay out the
+page that changed, and word-level deltas only re-render the paragraph whose
+text changed, re-clustering the page only when a box moves. Every update
+returns a diff of the `paragraphs` / `document` lists instead of the whole
+document.
+"""
+import difflib
+import math
+import re
+import threading
+
+from Geometry import polygons_to_boxes
+from ReadingOrder import order_lines
+
+
+def ocr_document_entry(para_text):
+    """Document structure entry for one paragraph of OCR text"""
+    return {
+        'type': 'Question' if re.match(r'^\d+\.', para_text) else 'Text',
+        'content': para_text,
+        'items': []  # Ensure items is always a list
+    }
+
+
+def ocr_item_boxes(items):
+    """
+    4-point [x_min, y_min, x_max, y_max] boxes of OCR items, converting 8-point
+    boxes; other polygons are bounded by their points and empty ones become zero
+    """
+    boxes = []
+    for item in items:
+        box = item.get('boundingBox') or [0, 0, 0, 0]
+        if len(box) == 8:
+            box = polygons_to_boxes(box)[0].tolist()
+        elif len(box) != 4:
+            xs, ys = box[::2], box[1::2]
+            box = [min(xs), min(ys), max(xs), max(ys)] if ys else [0, 0, 0, 0]
+        boxes.append(box)
+    return boxes
+
+
+class DeltaError(ValueError):
+    """Raised when a delta is malformed or refers to a page or word that does not exist"""
+
+
+def check_box(box):
+    """Raise DeltaError unless `box` is a 4-point box or 8-point polygon of finite numbers"""
+    if not isinstance(box, (list, tuple)) or len(box) not in (4, 8) or \
+            not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in box):
+        raise DeltaError("'boundingBox' must be a list of 4 or 8 finite numbers")
+
+
+def check_item(item):
+    """A copy of an OCR item, or DeltaError if it is not an object with valid text and box"""
+    if not isinstance(item, dict):
+        raise DeltaError('OCR items must be objects')
+    if not isinstance(item.get('text', ''), str):
+        raise DeltaError("'text' must be a string")
+    if item.get('boundingBox') is not None:
+        check_box(item['boundingBox'])
+    return dict(item)
+
+
+class PageLayout:
+    """
+    The OCR items of one page and the paragraphs (visual lines) built from them.
+
+    Items from a client are checked with `strict`; OCR output is taken as it
+    comes, so an unusual box from the service does not fail the whole page.
+    """
+
+    def __init__(self, items, strict=False):
+        if not isinstance(items, list):
+            raise DeltaError("Page 'items' must be a list")
+        self.items = [check_item(item) if strict else dict(item) for item in items]
+        self.layout()
+
+    def copy(self):
+        """An independent copy, to be edited while this one stays as it was"""
+        page = PageLayout.__new__(PageLayout)
+        page.items = [dict(item) for item in self.items]
+        page.lines = [list(line) for line in self.lines]
+        page.line_of = dict(self.line_of)
+        page.paragraphs = list(self.paragraphs)
+        return page
+
+    def layout(self):
+        """Cluster the page's items into lines in reading order"""
+        visible = [i for i, item in enumerate(self.items) if item.get('text', '').strip()]
+        self.lines = [[visible[i] for i in line]
+                      for line in order_lines(ocr_item_boxes([self.items[i] for i in visible]))]
+        self.line_of = {item: n for n, line in enumerate(self.lines) for item in line}
+        self.paragraphs = [self.render(line) for line in self.lines]
+
+    def render(self, line):
+        return " ".join(self.items[i]['text'].strip() for i in line)
+
+    def find_item(self, delta):
+        """Index of the item a word-level delta targets, by its `id` or its `index`"""
+        if 'id' in delta:
+            for i, item in enumerate(self.items):
+                if item.get('id') == delta['id']:
+                    return i
+            raise DeltaError(f"No word with id {delta['id']!r} on this page")
+        index = delta.get('index')
+        if not isinstance(index, int) or not 0 <= index < len(self.items):
+            raise DeltaError("Word deltas need an existing 'id' or 'index'")
+        return index
+
+
+class LayoutDocument:
+    """
+    Paragraphs of a multi-page OCR document, updated by deltas.
+
+    Supported deltas:
+      {"op": "set_page", "page": 2, "items": [...]}   add or replace a page
+      {"op": "remove_page", "page": 2}
+      {"op": "update_word", "page": 1, "id": 12, "text": "...", "boundingBox": [...]}
+      {"op": "add_word", "page": 1, "item": {...}}
+      {"op": "remove_word", "page": 1, "id": 12}
+    Items are `extracted_text` lines or `word_data` words.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    @property
+    def paragraphs(self):
+        return [para for number in sorted(self.pages) for para in self.pages[number].paragraphs]
+
+    @property
+    def document(self):
+        return [ocr_document_entry(para) for para in self.paragraphs]
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'pages': sorted(self.pages),
+            'document': self.document,
+            'paragraphs': self.paragraphs
+        }
+
+    def _offset(self, page_number):
+        """Index in the document-wide paragraph list of a page's first paragraph"""
+        return sum(len(self.pages[number].paragraphs) for number in self.pages if number < page_number)
+
+    def _page(self, delta):
+        page_number = delta.get('page', 1)
+        page = self.pages.get(page_number)
+        if page is None:
+            raise DeltaError(f"No page {page_number!r} in this document")
+        return page_number, page
+
+    def apply(self, deltas):
+        """
+        Apply a list of deltas and return the diff they produced.
+
+        The diff is a list of changes in document order, each
+        {"op": "insert" | "delete" | "replace", "index": i, "paragraphs": [...],
+        "document": [...], "removed": n} where `index` is a position in the
+        paragraph list as it was when the change was applied.
+
+        The batch is atomic: if any delta raises, the document is left as it
+        was before the first one and its version is unchanged.
+        """
+        changes = []
+        with self.lock:
+            saved = dict(self.pages)
+            # Pages edited in place are copied once per batch, so `saved` keeps the originals
+            self._copied = set()
+            try:
+                for delta in deltas:
+                    changes.extend(self._apply_one(delta))
+            except Exception:
+                self.pages = saved
+                raise
+            self.version += 1
+        return {'version': self.version, 'changes': changes}
+
+    def _apply_one(self, delta):
+        if not isinstance(delta, dict):
+            raise DeltaError('Each delta must be an object')
+        op = delta.get('op')
+
+        if op == 'set_page':
+            page_number = delta.get('page')
+            if not isinstance(page_number, int):
+                raise DeltaError("'set_page' needs an integer 'page'")
+            old = self.pages[page_number].paragraphs if page_number in self.pages else []
+            self.pages[page_number] = PageLayout(delta.get('items', []), strict=True)
+            self._copied.add(page_number)
+            return self._diff(page_number, old, self.pages[page_number].paragraphs)
+
+        if op == 'remove_page':
+            page_number, page = self._page(delta)
+            changes = self._diff(page_number, page.paragraphs, [])
+            del self.pages[page_number]
+            return changes
+
+        if op not in ('update_word', 'add_word', 'remove_word'):
+            raise DeltaError(f"Unknown delta op {op!r}")
+
+        page_number, page = self._page(delta)
+        if page_number not in self._copied:
+            page = self.pages[page_number] = page.copy()
+            self._copied.add(page_number)
+        old = list(page.paragraphs)
+
+        if op == 'add_word':
+            if not isinstance(delta.get('item'), dict):
+                raise DeltaError("'add_word' needs an 'item' object")
+            page.items.append(check_item(delta['item']))
+            page.layout()
+        elif op == 'remove_word':
+            del page.items[page.find_item(delta)]
+            page.layout()
+        else:
+            index = page.find_item(delta)
+            if 'boundingBox' in delta:
+                check_box(delta['boundingBox'])
+            if not isinstance(delta.get('text', ''), str):
+                raise DeltaError("'text' must be a string")
+            item = page.items[index]
+            moved = 'boundingBox' in delta and delta['boundingBox'] != item.get('boundingBox')
+            appears = bool(delta.get('text', item.get('text', '')).strip()) != bool(item.get('text', '').strip())
+            item.update({key: delta[key] for key in ('text', 'boundingBox', 'confidence') if key in delta})
+
+            if moved or appears:
+                # The word's region changed, so the page's lines must be re-clustered
+                page.layout()
+            elif index in page.line_of:
+                # Same place, new text: only this paragraph changes
+                line = page.line_of[index]
+                page.paragraphs[line] = page.render(page.lines[line])
+                offset = self._offset(page_number)
+                return [{
+                    'op': 'replace',
+                    'index': offset + line,
+                    'removed': 1,
+                    'paragraphs': [page.paragraphs[line]],
+                    'document': [ocr_document_entry(page.paragraphs[line])]
+                }]
+            else:
+                return []
+
+        return self._diff(page_number, old, page.paragraphs)
+
+    def _diff(self, page_number, old, new):
+        """Diff one page's old and new paragraphs, positioned in the whole document"""
+        offset = self._offset(page_number)
+        changes = []
+        shift = 0
+        matcher = difflib.SequenceMatcher(a=old, b=new, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            added = new[j1:j2]
+            changes.append({
+                'op': tag,
+                'index': offset + i1 + shift,
+                'removed': i2 - i1,
+                'paragraphs': added,
+                'document': [ocr_document_entry(para) for para in added]
+            })
+            # Later changes are positioned after this one has been applied
+            shift += len(added) - (i2 - i1)
+        return changes
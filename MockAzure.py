@@ -0,0 +1,354 @@
+"""
+Local stand-in for the Azure Read v3.2 and Form Recognizer APIs.
+
+Imitates the `analyze` + `Operation-Location` polling protocol of both, and
+replays Sample.json-style word data as a Read result or as a
+`prebuilt-document` result, so the extraction and layout code can be
+exercised and benchmarked without live Azure keys. Images registered with
+`register_image` get their own word data back instead of Sample.json's.
+
+Operations stay "running" for `latency` seconds (+/- `jitter`), and any
+request can be failed at random: `throttle_rate` of them with 429 and a
+Retry-After, `error_rate` with 500. Point the apps at it with
+
+    python MockAzure.py --port 5050 --latency 1.0 --throttle-rate 0.05
+    AZURE_READ_ENDPOINT=http://127.0.0.1:5050/ python TextExtractor.py
+    FORM_RECOGNIZER_ENDPOINT=http://127.0.0.1:5050/ python TextLayoutParser.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Sample.json')
+
+READ_ANALYZE_PATH = '/vision/v3.2/read/analyze'
+READ_RESULTS_PATH = '/vision/v3.2/read/analyzeResults/'
+
+# Form Recognizer: /formrecognizer/documentModels/{model}:analyze and
+# /formrecognizer/documentModels/{model}/analyzeResults/{id}
+DOCUMENT_MODELS_PATH = '/formrecognizer/documentModels/'
+DOCUMENT_API_VERSION = '2023-07-31'
+
+
+def load_word_data(path=SAMPLE_PATH):
+    """Load the flat word_data list from a Sample.json-style file"""
+    with open(path) as f:
+        return json.load(f)['word_data']
+
+
+def to_polygon(box):
+    """Convert a [x_min, y_min, x_max, y_max] box back into Azure's 8-point format; polygons pass through"""
+    if len(box) == 8:
+        return list(box)
+    x0, y0, x1, y1 = box
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+def build_read_result(word_data, page_count=1, size=None):
+    """
+    Rebuild a Read v3.2 `analyzeResult` from flat word data.
+
+    Consecutive words sharing a line_text are grouped back into one line.
+    The page is `size` (width, height), or just large enough for the words.
+    """
+    lines = []
+    for word in word_data:
+        if not lines or lines[-1]['text'] != word['line_text']:
+            lines.append({'text': word['line_text'], 'words': []})
+        lines[-1]['words'].append({
+            'text': word['text'],
+            'boundingBox': to_polygon(word['boundingBox']),
+            'confidence': word.get('confidence'),
+        })
+
+    for line in lines:
+        xs = [v for w in line['words'] for v in w['boundingBox'][::2]]
+        ys = [v for w in line['words'] for v in w['boundingBox'][1::2]]
+        line['boundingBox'] = to_polygon([min(xs), min(ys), max(xs), max(ys)])
+
+    width = max((w['boundingBox'][2] for w in word_data), default=0)
+    height = max((w['boundingBox'][3] for w in word_data), default=0)
+    if size is not None:
+        width, height = size
+    read_results = [{
+        'page': page + 1,
+        'angle': 0,
+        'width': width,
+        'height': height,
+        'unit': 'pixel',
+        'lines': lines,
+    } for page in range(page_count)]
+
+    return {'version': '3.2.0', 'readResults': read_results}
+
+
+def _word_spans(line_text, words, line_offset):
+    """(offset, length) of each word within `line_text`, which starts at `line_offset` in the content"""
+    spans, cursor = [], 0
+    for word in words:
+        found = line_text.find(word['text'], cursor)
+        start = found if found >= 0 else cursor
+        spans.append({'offset': line_offset + start, 'length': len(word['text'])})
+        cursor = start + len(word['text'])
+    return spans
+
+
+def build_document_result(word_data, model_id='prebuilt-document', size=None):
+    """
+    Rebuild a Form Recognizer `analyzeResult` from flat word data.
+
+    Uses the Read result's lines: every line is also a paragraph, and `key:
+    value` lines become key-value pairs, as prebuilt-document reports them.
+    """
+    read_page = build_read_result(word_data, size=size)['readResults'][0]
+    content_parts, words, lines, paragraphs, pairs = [], [], [], [], []
+    offset = 0
+    for line in read_page['lines']:
+        text = line['text']
+        span = {'offset': offset, 'length': len(text)}
+        region = [{'pageNumber': 1, 'polygon': line['boundingBox']}]
+        for word, word_span in zip(line['words'], _word_spans(text, line['words'], offset)):
+            words.append({'content': word['text'], 'polygon': word['boundingBox'],
+                          'confidence': word['confidence'] if word['confidence'] is not None else 1.0,
+                          'span': word_span})
+        lines.append({'content': text, 'polygon': line['boundingBox'], 'spans': [span]})
+        paragraphs.append({'content': text, 'boundingRegions': region, 'spans': [span]})
+
+        key, separator, value = text.partition(':')
+        if separator and key.strip() and value.strip():
+            value_offset = offset + len(key) + 1 + (len(value) - len(value.lstrip()))
+            pairs.append({
+                'key': {'content': key.strip(), 'boundingRegions': region,
+                        'spans': [{'offset': offset, 'length': len(key.rstrip())}]},
+                'value': {'content': value.strip(), 'boundingRegions': region,
+                          'spans': [{'offset': value_offset, 'length': len(value.strip())}]},
+                'confidence': 0.9,
+            })
+        content_parts.append(text)
+        offset += len(text) + 1
+
+    content = '\n'.join(content_parts)
+    return {
+        'apiVersion': DOCUMENT_API_VERSION,
+        'modelId': model_id,
+        'stringIndexType': 'textElements',
+        'content': content,
+        'pages': [{
+            'pageNumber': 1,
+            'angle': 0,
+            'width': read_page['width'],
+            'height': read_page['height'],
+            'unit': 'pixel',
+            'words': words,
+            'lines': lines,
+            'selectionMarks': [],
+            'spans': [{'offset': 0, 'length': len(content)}],
+        }],
+        'paragraphs': paragraphs,
+        'tables': [],
+        'keyValuePairs': pairs,
+        'styles': [],
+    }
+
+
+class MockAzureServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the state of every submitted operation"""
+
+    daemon_threads = True
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 256
+
+    def __init__(self, address, latency=1.0, retry_after=None, word_data=None, jitter=0.0, throttle_rate=0.0,
+                 error_rate=0.0, throttle_retry_after=1, seed=None):
+        super().__init__(address, MockAzureHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after = retry_after
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.throttle_retry_after = throttle_retry_after
+        self.word_data = word_data if word_data is not None else load_word_data()
+        self.operations = {}
+        self.images = {}
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.throttled_count = 0
+        self.error_count = 0
+
+    def operation_latency(self):
+        """Seconds the next operation stays running"""
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def injected_failure(self):
+        """Count a request; returns 429 or 500 if it is to be failed, else None"""
+        with self.lock:
+            self.request_count += 1
+            draw = self.random.random()
+            if draw < self.throttle_rate:
+                self.throttled_count += 1
+                return 429
+            if draw < self.throttle_rate + self.error_rate:
+                self.error_count += 1
+                return 500
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.request_count, 'throttled': self.throttled_count, 'errors': self.error_count,
+                    'operations': len(self.operations)}
+
+    def register_image(self, image_data, word_data, size=None):
+        """Answer Read requests for exactly these image bytes with `word_data` on a page of `size`"""
+        with self.lock:
+            self.images[hashlib.sha256(image_data).hexdigest()] = (word_data, size)
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        """Serve in a daemon thread and return self"""
+        thread = threading.Thread(target=self.serve_forever, name='mock-azure', daemon=True)
+        thread.start()
+        return self
+
+
+class MockAzureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_failure(self, status):
+        if status == 429:
+            return self._send_json(429, {'error': {'code': '429', 'message': 'Rate limit exceeded'}},
+                                   {'Retry-After': str(self.server.throttle_retry_after)})
+        return self._send_json(500, {'error': {'code': 'InternalServerError', 'message': 'Injected failure'}})
+
+    def _route(self):
+        """('read' | 'document', model id or None, operation id or None) of the request path, or None"""
+        path = self.path.split('?')[0]
+        if path == READ_ANALYZE_PATH:
+            return 'read', None, None
+        if path.startswith(READ_RESULTS_PATH):
+            return 'read', None, path[len(READ_RESULTS_PATH):]
+        if path.startswith(DOCUMENT_MODELS_PATH):
+            rest = path[len(DOCUMENT_MODELS_PATH):]
+            if rest.endswith(':analyze'):
+                return 'document', rest[:-len(':analyze')], None
+            model_id, separator, operation_id = rest.partition('/analyzeResults/')
+            if separator:
+                return 'document', model_id, operation_id
+        return None
+
+    def do_POST(self):
+        body = self._read_body()
+        failure = self.server.injected_failure()
+        route = self._route()
+
+        if route is None or route[2] is not None:
+            return self._send_json(404, {'error': {'code': 'NotFound', 'message': self.path}})
+        if failure:
+            return self._send_failure(failure)
+        if not body:
+            return self._send_json(400, {'error': {'code': 'InvalidImage', 'message': 'Empty body'}})
+
+        api, model_id, _ = route
+        operation_id = str(uuid.uuid4())
+        digest = hashlib.sha256(body).hexdigest()
+        latency = self.server.operation_latency()
+        with self.server.lock:
+            self.server.operations[operation_id] = {'submitted': time.monotonic(), 'latency': latency,
+                                                    'image': self.server.images.get(digest)}
+
+        host = self.headers.get('Host')
+        if api == 'read':
+            location = f"http://{host}{READ_RESULTS_PATH}{operation_id}"
+        else:
+            location = (f"http://{host}{DOCUMENT_MODELS_PATH}{model_id}/analyzeResults/{operation_id}"
+                        f"?api-version={DOCUMENT_API_VERSION}")
+        self._send_json(202, headers={'Operation-Location': location, 'apim-request-id': operation_id})
+
+    def do_GET(self):
+        failure = self.server.injected_failure()
+        route = self._route()
+        if route is None or route[2] is None:
+            return self._send_json(404, {'error': {'code': 'NotFound', 'message': self.path}})
+        if failure:
+            return self._send_failure(failure)
+
+        api, model_id, operation_id = route
+        with self.server.lock:
+            operation = self.server.operations.get(operation_id)
+        if operation is None:
+            return self._send_json(404, {'error': {'code': 'NotFound', 'message': operation_id}})
+
+        now = time.monotonic()
+        if now - operation['submitted'] < operation['latency']:
+            headers = {}
+            if self.server.retry_after is not None:
+                headers['Retry-After'] = str(self.server.retry_after)
+            return self._send_json(200, {'status': 'running'}, headers)
+
+        word_data, size = operation['image'] or (self.server.word_data, None)
+        if api == 'read':
+            return self._send_json(200, {
+                'status': 'succeeded',
+                'analyzeResult': build_read_result(word_data, size=size),
+            })
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._send_json(200, {
+            'status': 'succeeded',
+            'createdDateTime': timestamp,
+            'lastUpdatedDateTime': timestamp,
+            'analyzeResult': build_document_result(word_data, model_id, size=size),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Azure Read and Form Recognizer server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='Seconds an operation stays "running" before it succeeds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Latency varies uniformly by +/- this much')
+    parser.add_argument('--retry-after', type=float, default=None,
+                        help='Retry-After value sent with "running" responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 500')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for latency jitter and injected failures')
+    args = parser.parse_args()
+
+    server = MockAzureServer((args.host, args.port), latency=args.latency, retry_after=args.retry_after,
+                             jitter=args.jitter, throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+                             seed=args.seed)
+    print(f"Mock Azure Read and Form Recognizer listening on {server.endpoint}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
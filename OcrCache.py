@@ -0,0 +1,150 @@
+"""
+Content-addressed cache for OCR results.
+
+Results are keyed by a SHA-256 of the image bytes plus the service endpoint
+and model, so re-uploading the same page returns the stored result without a
+network round trip. There are two tiers: an in-memory LRU per process and a
+directory of JSON files shared by every process pointed at the same folder.
+
+Disk entries not used for `max_age` seconds are deleted, and the least
+recently used go first while the directory is over `max_bytes` (see
+DiskRetention); collection runs at most every `gc_interval` seconds after a
+store, or on demand with
+
+    python OcrCache.py --root ocr_cache
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from DiskRetention import DirectoryRetention, gc_main
+
+DEFAULT_CACHE_DIR = 'ocr_cache'
+
+# Retention of the disk tier: entries idle for 30 days go, and the directory
+# is kept under 1 GB
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 1024 ** 3
+DEFAULT_GC_INTERVAL = 600
+
+# Size of the chunks read when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def make_cache_key(content, endpoint, model):
+    """
+    Build the cache key for an image.
+
+    `content` may be bytes or a binary file object; file objects are hashed in
+    chunks and rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    else:
+        position = content.tell()
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        content.seek(position)
+    digest.update(b'\0' + endpoint.encode() + b'\0' + model.encode())
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """Two-tier (memory LRU + disk) cache of JSON-serializable OCR results"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=256, max_age=DEFAULT_MAX_AGE,
+                 max_bytes=DEFAULT_MAX_BYTES, gc_interval=DEFAULT_GC_INTERVAL):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+        self.retention = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.retention = DirectoryRetention(cache_dir, max_age, max_bytes, gc_interval)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        # Caller holds the lock
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached result for a key, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+        value = None
+        if self.cache_dir:
+            try:
+                with open(self._path(key)) as f:
+                    value = json.load(f)
+                # A disk hit counts as a use for gc(); memory hits do not reach the disk
+                os.utime(self._path(key))
+            except (OSError, ValueError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self._counters['misses'] += 1
+            else:
+                self._counters['disk_hits'] += 1
+                self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store a result in both tiers"""
+        with self._lock:
+            self._remember(key, value)
+            self._counters['stores'] += 1
+
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.retention.maybe_gc()
+
+    def stats(self):
+        """Hit/miss counters and tier sizes, for sizing the cache"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_items'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        stats['max_memory_items'] = self.max_memory_items
+        if self.retention is not None:
+            stats.update(self.retention.stats())
+        return stats
+
+
+def main():
+    gc_main('Garbage-collect the disk tier of an OCR cache',
+            lambda root, max_age, max_bytes: OcrCache(root, max_age=max_age, max_bytes=max_bytes),
+            DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE, DEFAULT_MAX_BYTES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Parallel PDF rasterization and enhancement.
+
+Pages are rendered one at a time with poppler's `pdftoppm` (the renderer
+pdf2image drives), and each worker process renders, enhances and saves its
+own page. At most a few pages are in flight at once, so memory stays flat
+however long the PDF is, and throughput scales with the number of workers.
+"""
+import io
+import os
+import shutil
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image, ImageEnhance, ImageFilter
+from pypdf import PdfReader
+
+from EnhanceKernel import enhance_image_fused
+
+DEFAULT_DPI = 300
+DEFAULT_OUTPUT_DIR = 'enhanced_images'
+
+# Pages queued per worker beyond the one it is processing
+PAGES_IN_FLIGHT_PER_WORKER = 1
+
+
+class PdfRasterError(RuntimeError):
+    """Raised when poppler is missing or fails to render a page"""
+
+
+def pdf_page_count(pdf_path):
+    return len(PdfReader(pdf_path).pages)
+
+
+def page_numbers(page_count, first_page=None, last_page=None):
+    """1-based page numbers from first_page to last_page, clamped to the document"""
+    first_page = max(first_page or 1, 1)
+    last_page = min(last_page or page_count, page_count)
+    return range(first_page, last_page + 1)
+
+
+def rasterize_page(pdf_path, page, dpi=DEFAULT_DPI, poppler_path=None):
+    """Render one page (1-based) to a PIL image"""
+    pdftoppm = os.path.join(poppler_path, 'pdftoppm') if poppler_path else shutil.which('pdftoppm')
+    if not pdftoppm:
+        raise PdfRasterError('pdftoppm not found; install poppler-utils')
+    # Without an output root, pdftoppm writes the PPM to stdout
+    result = subprocess.run([pdftoppm, '-r', str(dpi), '-f', str(page), '-l', str(page), pdf_path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0 or not result.stdout:
+        raise PdfRasterError(f"pdftoppm failed on page {page}: {result.stderr.decode(errors='replace').strip()}")
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image
+
+
+def iter_pdf_pages(pdf_path, dpi=DEFAULT_DPI, first_page=None, last_page=None, poppler_path=None):
+    """Yield (page number, image) one page at a time"""
+    for page in page_numbers(pdf_page_count(pdf_path), first_page, last_page):
+        yield page, rasterize_page(pdf_path, page, dpi, poppler_path)
+
+
+def enhance_image(image, contrast_factor=1.5, sharpness_factor=1.5, brightness_factor=1.2):
+    """
+    Enhance image clarity by adjusting contrast, sharpness, and brightness
+
+    'L' and 'RGB' pages go through the fused NumPy kernel (EnhanceKernel);
+    other modes through the PIL chain in enhance_image_pil.
+
+    Parameters:
+    - image: PIL Image object
+    - contrast_factor: float, contrast enhancement factor
+    - sharpness_factor: float, sharpness enhancement factor
+    - brightness_factor: float, brightness enhancement factor
+
+    Returns:
+    - Enhanced PIL Image object
+    """
+    if image.mode in ('L', 'RGB'):
+        return enhance_image_fused(image, contrast_factor, sharpness_factor, brightness_factor)
+    return enhance_image_pil(image, contrast_factor, sharpness_factor, brightness_factor)
+
+
+def enhance_image_pil(image, contrast_factor=1.5, sharpness_factor=1.5, brightness_factor=1.2):
+    """
+    The original enhancement chain: blur, brightness, contrast and sharpness,
+    one full-image PIL pass each
+
+    Parameters:
+    - image: PIL Image object
+    - contrast_factor: float, contrast enhancement factor
+    - sharpness_factor: float, sharpness enhancement factor
+    - brightness_factor: float, brightness enhancement factor
+
+    Returns:
+    - Enhanced PIL Image object
+    """
+    # Apply a slight Gaussian blur to reduce noise
+    image = image.filter(ImageFilter.GaussianBlur(radius=0.5))
+
+    # Increase brightness
+    image = ImageEnhance.Brightness(image).enhance(brightness_factor)
+
+    # Increase contrast
+    image = ImageEnhance.Contrast(image).enhance(contrast_factor)
+
+    # Increase sharpness
+    image = ImageEnhance.Sharpness(image).enhance(sharpness_factor)
+
+    return image
+
+
+def process_page(pdf_path, page, output_path, dpi, contrast, sharpness, brightness, output_format, poppler_path):
+    """Render, enhance and save one page; runs in a worker process"""
+    image = rasterize_page(pdf_path, page, dpi, poppler_path)
+    enhanced = enhance_image(image, contrast_factor=contrast, sharpness_factor=sharpness,
+                             brightness_factor=brightness)
+    enhanced.save(output_path, format=output_format)
+    return page, output_path
+
+
+def iter_enhanced_pages(pdf_path, output_dir=DEFAULT_OUTPUT_DIR, dpi=DEFAULT_DPI,
+                        contrast=1.5, sharpness=1.5, brightness=1.2, output_format='PNG',
+                        first_page=None, last_page=None, workers=None, poppler_path=None):
+    """
+    Yield (page number, image path) as each page is written, in completion order.
+
+    `workers` processes (default: one per core) each take a page at a time;
+    with workers=1 everything runs in this process.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pages = iter(page_numbers(pdf_page_count(pdf_path), first_page, last_page))
+    workers = workers or os.cpu_count() or 1
+
+    def task(page):
+        output_path = os.path.join(output_dir, f'page_{page}.{output_format.lower()}')
+        return (pdf_path, page, output_path, dpi, contrast, sharpness, brightness, output_format, poppler_path)
+
+    if workers == 1:
+        for page in pages:
+            yield process_page(*task(page))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded window of pages in flight, topping it up as pages finish
+        window = workers * (1 + PAGES_IN_FLIGHT_PER_WORKER)
+        pending = {pool.submit(process_page, *task(page)) for _, page in zip(range(window), pages)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = next(pages, None)
+                if page is not None:
+                    pending.add(pool.submit(process_page, *task(page)))
+                yield future.result()
+
+
+def convert_pdf_to_enhanced_images(pdf_path, dpi=DEFAULT_DPI,
+                                   contrast=1.5, sharpness=1.5, brightness=1.2,
+                                   output_format='PNG', output_dir=DEFAULT_OUTPUT_DIR,
+                                   first_page=None, last_page=None, workers=None, poppler_path=None):
+    """
+    Convert PDF pages to enhanced images
+
+    Parameters:
+    - pdf_path: string, path to the PDF file
+    - dpi: int, DPI for rendering PDF pages
+    - contrast: float, contrast enhancement factor
+    - sharpness: float, sharpness enhancement factor
+    - brightness: float, brightness enhancement factor
+    - output_format: string, format for output images (PNG, JPEG, etc.)
+    - output_dir: string, directory the page images are written to
+    - first_page, last_page: int, optional 1-based page range
+    - workers: int, worker processes (default: one per core)
+
+    Returns:
+    - List of paths to the generated image files, in page order
+    """
+    page_count = len(page_numbers(pdf_page_count(pdf_path), first_page, last_page))
+    print(f"Converting {page_count} PDF pages to images with DPI={dpi}...")
+
+    paths = {}
+    for page, path in iter_enhanced_pages(pdf_path, output_dir, dpi, contrast, sharpness, brightness,
+                                          output_format, first_page, last_page, workers, poppler_path):
+        paths[page] = path
+        print(f"Processed page {page} ({len(paths)}/{page_count})")
+    return [paths[page] for page in sorted(paths)]
@@ -0,0 +1,260 @@
+"""
+OCR-oriented preprocessing of page images before they are uploaded.
+
+Full-resolution colour scans are mostly bytes the OCR service does not need.
+`prepare_image` turns a page into a small 1-bit PNG: it estimates and removes
+skew, downscales so text lines stay TARGET_LINE_HEIGHT pixels tall, applies
+Sauvola adaptive binarization (robust to shadows and uneven lighting) and
+crops to the content area. The returned PreparedImage records the transform,
+so coordinates in a Read result for the small image can be mapped back onto
+the original page.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from BlobStore import stream_size
+from Geometry import page_skew
+
+# Downscale until text lines are about this many pixels tall; the Read API
+# recommends text of at least 12 pixels for printed and more for handwriting
+TARGET_LINE_HEIGHT = 28
+
+# Never produce an image smaller than the Read API's 50 x 50 minimum
+MIN_SIDE = 50
+
+# Downscaling stops once the longest side reaches this many pixels, so a bad
+# line-height estimate (diagrams, tables, rotated text) cannot shrink the text
+# below what OCR can read
+MIN_LONG_SIDE = 1600
+
+# Skew search: +/- MAX_SKEW degrees in SKEW_STEP steps, on a copy of the page
+# at most SKEW_SAMPLE_SIDE pixels on its longest side
+MAX_SKEW = 5.0
+SKEW_STEP = 0.2
+SKEW_SAMPLE_SIDE = 1000
+
+# Sauvola threshold: T = mean * (1 + k * (std / R - 1))
+SAUVOLA_K = 0.34
+SAUVOLA_R = 128.0
+
+# A row or column is content if ink covers more than CONTENT_MIN of it and,
+# to skip black scanner borders, less than CONTENT_MAX
+CONTENT_MIN = 0.002
+CONTENT_MAX = 0.6
+
+# Blank margin kept around the content, in line heights
+CROP_MARGIN = 1.0
+
+
+def otsu_threshold(gray):
+    """Global threshold maximizing the between-class variance of a uint8 image"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(histogram)
+    total = weight[-1]
+    level_sum = np.cumsum(histogram * np.arange(256))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (level_sum[-1] * weight - total * level_sum) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between))
+
+
+def sauvola_binarize(gray, window):
+    """Ink mask (True = dark) from Sauvola's local threshold over `window`-pixel squares"""
+    gray = gray.astype(np.float64)
+    height, width = gray.shape
+    half = window // 2
+    # Integral images of the values and their squares, with a zero row and column
+    integral = np.zeros((height + 1, width + 1))
+    integral_sq = np.zeros((height + 1, width + 1))
+    np.cumsum(np.cumsum(gray, axis=0), axis=1, out=integral[1:, 1:])
+    np.cumsum(np.cumsum(gray * gray, axis=0), axis=1, out=integral_sq[1:, 1:])
+
+    top = np.clip(np.arange(height) - half, 0, height)[:, None]
+    bottom = np.clip(np.arange(height) + half + 1, 0, height)[:, None]
+    left = np.clip(np.arange(width) - half, 0, width)[None, :]
+    right = np.clip(np.arange(width) + half + 1, 0, width)[None, :]
+    area = (bottom - top) * (right - left)
+
+    def window_sum(table):
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    mean = window_sum(integral) / area
+    std = np.sqrt(np.clip(window_sum(integral_sq) / area - mean * mean, 0, None))
+    return gray < mean * (1 + SAUVOLA_K * (std / SAUVOLA_R - 1))
+
+
+def estimate_skew(ink):
+    """
+    Rotation in degrees (PIL's counter-clockwise convention) that makes the
+    text lines of an ink mask horizontal, by maximizing the sharpness of the
+    horizontal projection profile.
+    """
+    ys, xs = np.nonzero(ink)
+    if len(xs) < 100:
+        return 0.0
+    xs = xs - ink.shape[1] / 2
+    ys = ys - ink.shape[0] / 2
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-MAX_SKEW, MAX_SKEW + SKEW_STEP / 2, SKEW_STEP):
+        theta = np.radians(angle)
+        # Row of each ink pixel once the page is rotated by `angle`
+        rows = np.round(ys * np.cos(theta) - xs * np.sin(theta)).astype(np.intp)
+        profile = np.bincount(rows - rows.min())
+        score = float(np.sum(np.diff(profile.astype(np.float64)) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def line_height(ink):
+    """Median height in pixels of the runs of rows that contain ink, or None"""
+    rows = ink.mean(axis=1) > CONTENT_MIN
+    edges = np.diff(np.concatenate([[0], rows.astype(np.int8), [0]]))
+    starts, stops = np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]
+    heights = stops - starts
+    heights = heights[heights > 2]
+    return float(np.median(heights)) if len(heights) else None
+
+
+def content_box(ink, margin):
+    """[left, top, right, bottom] of the content of an ink mask, padded by `margin`"""
+    height, width = ink.shape
+    row_ink, column_ink = ink.mean(axis=1), ink.mean(axis=0)
+    rows = np.nonzero((row_ink > CONTENT_MIN) & (row_ink < CONTENT_MAX))[0]
+    columns = np.nonzero((column_ink > CONTENT_MIN) & (column_ink < CONTENT_MAX))[0]
+    if len(rows) == 0 or len(columns) == 0:
+        return [0, 0, width, height]
+    return [max(int(columns[0] - margin), 0), max(int(rows[0] - margin), 0),
+            min(int(columns[-1] + 1 + margin), width), min(int(rows[-1] + 1 + margin), height)]
+
+
+class PreparedImage:
+    """
+    A preprocessed page and the transform from original to prepared pixels:
+    rotate by `angle` about the centre (canvas expanded), scale by `scale`,
+    then crop at `offset`.
+    """
+
+    def __init__(self, data, original_size, size, angle=0.0, scale=1.0, offset=(0, 0), rotated_size=None,
+                 original_bytes=0):
+        self.data = data
+        self.original_size = original_size
+        self.size = size
+        self.angle = angle
+        self.scale = scale
+        self.offset = offset
+        self.rotated_size = rotated_size or original_size
+        self.original_bytes = original_bytes
+
+    @property
+    def identity(self):
+        return self.angle == 0 and self.scale == 1 and tuple(self.offset) == (0, 0)
+
+    def stats(self):
+        """Bytes saved and the transform applied, for logs and response headers"""
+        return {
+            'original_bytes': self.original_bytes,
+            'bytes': len(self.data),
+            'saved_bytes': self.original_bytes - len(self.data),
+            'original_size': list(self.original_size),
+            'size': list(self.size),
+            'deskew_degrees': round(self.angle, 2),
+            'scale': round(self.scale, 4)
+        }
+
+    def _rotation(self):
+        theta = np.radians(self.angle)
+        return np.cos(theta), np.sin(theta)
+
+    def to_prepared(self, points):
+        """Map (N, 2) original-page points into the prepared image"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        cos, sin = self._rotation()
+        dx = points[:, 0] - self.original_size[0] / 2
+        dy = points[:, 1] - self.original_size[1] / 2
+        # PIL rotates counter-clockwise on screen, i.e. with y pointing down
+        x = dx * cos + dy * sin + self.rotated_size[0] / 2
+        y = -dx * sin + dy * cos + self.rotated_size[1] / 2
+        return np.stack([x * self.scale - self.offset[0], y * self.scale - self.offset[1]], axis=1)
+
+    def to_original(self, points):
+        """Map (N, 2) prepared-image points back onto the original page"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        cos, sin = self._rotation()
+        x = (points[:, 0] + self.offset[0]) / self.scale - self.rotated_size[0] / 2
+        y = (points[:, 1] + self.offset[1]) / self.scale - self.rotated_size[1] / 2
+        return np.stack([x * cos - y * sin + self.original_size[0] / 2,
+                         x * sin + y * cos + self.original_size[1] / 2], axis=1)
+
+    def restore_read_result(self, result):
+        """Map every boundingBox of a Read v3.2 result back onto the original page, in place"""
+        if self.identity or result.get('status') != 'succeeded':
+            return result
+        for page in result['analyzeResult']['readResults']:
+            polygons = []
+            for line in page.get('lines', []):
+                for item in [line] + line.get('words', []):
+                    item['boundingBox'] = [round(float(v), 1) for v in
+                                           self.to_original(item['boundingBox']).ravel()]
+                    polygons.append(item['boundingBox'])
+            page['width'], page['height'] = self.original_size
+            if polygons:
+                page['angle'] = round(page_skew(polygons), 2)
+        return result
+
+
+def prepare_image(image_data, target_line_height=TARGET_LINE_HEIGHT):
+    """
+    Binarize, deskew, downscale and crop an encoded page image (bytes or a
+    seekable binary stream).
+
+    Returns a PreparedImage, or None if the result would not be smaller than
+    the upload, which should then be sent as it is.
+    """
+    if isinstance(image_data, (bytes, bytearray)):
+        original_bytes = len(image_data)
+        original = Image.open(io.BytesIO(image_data))
+    else:
+        original_bytes = stream_size(image_data)
+        original = Image.open(image_data)
+    original_size = original.size
+    gray = original.convert('L')
+
+    # Skew and line height are estimated on a small copy with a global threshold
+    sample_scale = min(1.0, SKEW_SAMPLE_SIDE / max(gray.size))
+    sample = gray.resize((max(1, round(gray.width * sample_scale)), max(1, round(gray.height * sample_scale))),
+                         Image.BILINEAR) if sample_scale < 1 else gray
+    sample_pixels = np.asarray(sample)
+    angle = estimate_skew(sample_pixels < otsu_threshold(sample_pixels))
+
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    rotated_size = gray.size
+
+    pixels = np.asarray(gray)
+    height = line_height(pixels < otsu_threshold(pixels))
+    scale = 1.0
+    if height:
+        scale = min(1.0, target_line_height / height)
+    scale = max(scale, MIN_SIDE / min(rotated_size), MIN_LONG_SIDE / max(rotated_size))
+    if scale < 1.0:
+        gray = gray.resize((round(gray.width * scale), round(gray.height * scale)), Image.LANCZOS)
+    else:
+        scale = 1.0
+
+    pixels = np.asarray(gray)
+    scaled_line = (height or target_line_height) * scale
+    ink = sauvola_binarize(pixels, window=max(15, int(2 * scaled_line) | 1))
+    left, top, right, bottom = content_box(ink, margin=CROP_MARGIN * scaled_line)
+    # Keep the Read API's minimum size
+    right, bottom = max(right, min(left + MIN_SIDE, ink.shape[1])), max(bottom, min(top + MIN_SIDE, ink.shape[0]))
+    ink = ink[top:bottom, left:right]
+
+    buffer = io.BytesIO()
+    Image.fromarray(~ink).convert('1').save(buffer, format='PNG', optimize=True)
+    data = buffer.getvalue()
+    if len(data) >= original_bytes:
+        return None
+    return PreparedImage(data, original_size, (ink.shape[1], ink.shape[0]), angle=angle, scale=scale,
+                         offset=(left, top), rotated_size=rotated_size, original_bytes=original_bytes)
@@ -0,0 +1,75 @@
+"""
+Azure Read API settings and result parsing, shared by TextExtractor and
+GradePipeline.
+
+Importing this module has no side effects: no app, poller or cache is
+created, so batch tools can use it without starting the TextExtractor service.
+"""
+import os
+
+from Geometry import polygons_to_boxes
+
+# Azure credentials; AZURE_READ_ENDPOINT / AZURE_READ_KEY override them,
+# e.g. to point at a local MockAzure server
+subscription_key = os.environ.get(
+    'AZURE_READ_KEY', '6b2uM74mq58QMzHkU50QsZwJXDVoUuklAi6fqiob6b7XiaCMR4zUJQQJ99BDACYeBjFXJ3w3AAAFACOGki3V')
+endpoint = os.environ.get('AZURE_READ_ENDPOINT', 'https://vellan.cognitiveservices.azure.com/')
+READ_MODEL = 'read-3.2'
+
+# Seconds a request waits for its Read operation before giving up
+READ_TIMEOUT = 120
+
+
+def read_analyze_url(endpoint):
+    """Read API analyze URL of an endpoint (which ends in '/')"""
+    return endpoint + "vision/v3.2/read/analyze"
+
+
+def build_line_data(result):
+    """Build the line-level extracted_text list from the first page of a Read result"""
+    lines = result["analyzeResult"]["readResults"][0]["lines"]
+    # Convert every line's 8-point box to 4-point format in one array operation
+    boxes = polygons_to_boxes([line["boundingBox"] for line in lines]).tolist()
+    
+    extracted_text = []
+    for line, box in zip(lines, boxes):
+        # Create a dictionary for each line
+        line_data = {
+            "text": line["text"],
+            "boundingBox": box,
+            "confidence": None  # Default to None
+        }
+        
+        # Azure's OCR API returns word-level confidence, so we can calculate the average
+        if "words" in line and line["words"]:
+            confidences = [word.get("confidence", 0) for word in line["words"] if "confidence" in word]
+            if confidences:
+                line_data["confidence"] = sum(confidences) / len(confidences)
+        
+        extracted_text.append(line_data)
+    return extracted_text
+
+
+def iter_word_data(result, start_id=0):
+    """Yield the word_data records of every page of a Read result, one at a time"""
+    word_id = start_id
+    
+    for page_result in result["analyzeResult"]["readResults"]:
+        words = [(line["text"], word) for line in page_result["lines"] for word in line.get("words", [])]
+        # One array operation converts the whole page's boxes to 4-point format
+        boxes = polygons_to_boxes([word["boundingBox"] for _, word in words]).tolist()
+        
+        for (line_text, word), box in zip(words, boxes):
+            yield {
+                "id": word_id,
+                "text": word["text"],
+                "boundingBox": box,
+                "confidence": word.get("confidence", None),
+                "line_text": line_text
+            }
+            word_id += 1
+
+
+def build_word_data(result, start_id=0):
+    """Build the flat word_data list across every page of a Read result"""
+    return list(iter_word_data(result, start_id))
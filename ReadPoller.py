@@ -0,0 +1,211 @@
+"""
+Non-blocking polling engine for Azure Read operations.
+
+Every in-flight Read operation is driven by one asyncio event loop running in
+a background thread. Request handlers get a concurrent.futures.Future back and
+wait on it instead of sleeping in their own polling loop, so a single poller
+can track hundreds of operations at once.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+import AzureSession
+from AzureSession import RequestTiming
+
+
+class ReadOperationError(Exception):
+    """Raised when a Read operation cannot be submitted or does not finish in time"""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+def parse_retry_after(response):
+    """Return the Retry-After header of a response in seconds, or None"""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class ReadPoller:
+    """
+    Submit images to the Read API and poll their Operation-Location on a shared loop.
+
+    Polling starts at `min_interval` seconds and backs off by `backoff` up to
+    `max_interval`. A Retry-After header from the service always takes
+    precedence over the computed interval. Each operation, submission and
+    polling together, fails with ReadOperationError after `timeout` seconds.
+    """
+
+    def __init__(self, subscription_key, min_interval=0.25, max_interval=4.0,
+                 backoff=1.5, timeout=120.0, http_workers=16):
+        self.subscription_key = subscription_key
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+
+        # The HTTP round trips themselves are blocking, so they run on a small
+        # thread pool; the waiting between polls happens on the event loop.
+        self._executor = ThreadPoolExecutor(max_workers=http_workers, thread_name_prefix='read-http')
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the event loop thread if it is not already running"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run, name='read-poller', daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+
+    def stop(self):
+        """Stop the event loop thread; pending operations are cancelled"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = self._thread = None
+
+    def analyze(self, read_url, image_data, timing=None):
+        """
+        Submit an image to the Read API; returns a Future resolving to the final result JSON.
+
+        `image_data` is bytes or a seekable binary stream, which is uploaded in
+        chunks rather than read into memory. Pass a RequestTiming to have
+        connect, server and poll wait time recorded into it.
+        """
+        self.start()
+        timing = timing if timing is not None else RequestTiming()
+        return asyncio.run_coroutine_threadsafe(
+            self._within_timeout(self._analyze(read_url, image_data, timing), read_url), self._loop)
+
+    def analyze_many(self, read_url, images, concurrency=8):
+        """
+        Submit several images with at most `concurrency` Read operations in flight.
+
+        Returns one Future per image, in input order. Each image is submitted as
+        soon as a slot frees up, so a slow page never holds back later pages;
+        its timeout starts when it gets the slot. An image may also be a
+        concurrent Future of its data (one still being preprocessed, say),
+        which waits for a slot only once it resolves.
+        """
+        self.start()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(image_data):
+            if isinstance(image_data, Future):
+                image_data = await asyncio.wrap_future(image_data)
+            async with semaphore:
+                return await self._within_timeout(self._analyze(read_url, image_data, RequestTiming()), read_url)
+
+        return [asyncio.run_coroutine_threadsafe(bounded(image_data), self._loop) for image_data in images]
+
+    def poll(self, operation_url, timing=None):
+        """Poll an already submitted operation; returns a Future resolving to the final result JSON"""
+        self.start()
+        timing = timing if timing is not None else RequestTiming()
+        return asyncio.run_coroutine_threadsafe(
+            self._within_timeout(self._poll(operation_url, timing), operation_url), self._loop)
+
+    async def _within_timeout(self, operation, url):
+        """
+        Run an operation coroutine for at most `timeout` seconds. The deadline
+        checks in _analyze and _poll give up before it; this also bounds an
+        HTTP call that hangs past the deadline.
+        """
+        try:
+            return await asyncio.wait_for(operation, self.timeout)
+        except asyncio.TimeoutError:
+            raise ReadOperationError('Azure Read operation timed out', url) from None
+
+    async def _request(self, timing, method, url, **kwargs):
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                self._executor, lambda: AzureSession.request(method, url, **kwargs))
+        except requests.RequestException as e:
+            raise ReadOperationError(f'Azure Read {method} request failed', str(e)) from e
+        timing.add_response(response)
+        return response
+
+    async def _sleep(self, timing, delay):
+        await asyncio.sleep(delay)
+        timing.poll_wait += delay
+
+    async def _analyze(self, read_url, image_data, timing):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        headers = {
+            "Ocp-Apim-Subscription-Key": self.subscription_key,
+            "Content-Type": "application/octet-stream"
+        }
+
+        while True:
+            # A stream body is sent from the start on every attempt
+            if hasattr(image_data, 'seek'):
+                image_data.seek(0)
+            response = await self._request(timing, 'POST', read_url, headers=headers, data=image_data)
+            retry_after = parse_retry_after(response)
+            # Submissions throttled with a Retry-After are resent once it elapses
+            if response.status_code == 429 and retry_after is not None and loop.time() + retry_after < deadline:
+                await self._sleep(timing, retry_after)
+                continue
+            break
+
+        if response.status_code != 202:
+            raise ReadOperationError('Azure Read API call failed', response.text)
+
+        # Polling shares the submission's deadline rather than starting a new one
+        return await self._poll(response.headers["Operation-Location"], timing, retry_after, deadline)
+
+    async def _poll(self, operation_url, timing, first_delay=None, deadline=None):
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + self.timeout
+        headers = {"Ocp-Apim-Subscription-Key": self.subscription_key}
+        interval = self.min_interval
+        delay = first_delay if first_delay is not None else self.min_interval
+
+        while True:
+            if loop.time() + delay > deadline:
+                raise ReadOperationError('Azure Read operation timed out', operation_url)
+            await self._sleep(timing, delay)
+
+            response = await self._request(timing, 'GET', operation_url, headers=headers)
+            retry_after = parse_retry_after(response)
+
+            # Throttled: wait as long as the service asks and try again
+            if response.status_code == 429:
+                delay = retry_after if retry_after is not None else interval
+                continue
+            if response.status_code != 200:
+                raise ReadOperationError('Azure Read result call failed', response.text)
+
+            result = response.json()
+            if result["status"] in ["succeeded", "failed"]:
+                return result
+
+            interval = min(interval * self.backoff, self.max_interval)
+            delay = retry_after if retry_after is not None else interval
@@ -0,0 +1,147 @@
+"""
+Reading-order engine for OCR boxes.
+
+Takes a page of `[x_min, y_min, x_max, y_max]` boxes (lines from
+/extract-text or words from /word-level) and returns them grouped into
+visual lines in reading order: column by column, top to bottom, and left to
+right within each line. Line tolerance comes from the box heights rather than
+a fixed pixel threshold, page skew is estimated and sheared out before
+clustering, and everything except the final grouping is array math, so a
+page costs O(n log n).
+"""
+import numpy as np
+
+from Geometry import box_centroids
+
+# Items whose deskewed centres are within this many box heights share a line
+LINE_TOLERANCE = 0.6
+
+# A vertical whitespace band at least this many line heights wide splits columns
+COLUMN_GAP = 3.0
+
+# Boxes wider than this fraction of the content width are headings or rules,
+# not column content, and are left out of the column search
+WIDE_BOX_FRACTION = 0.5
+
+# Neighbours (in y order) compared with each box when estimating skew
+SKEW_NEIGHBOURS = 8
+
+# Largest skew slope believed (about 11 degrees); anything more is noise
+MAX_SKEW_SLOPE = 0.2
+
+
+def estimate_skew(centers, line_height):
+    """
+    Estimate page skew as a slope (dy per dx) from pairs of nearby boxes.
+
+    Boxes that sit side by side on the same line are found among the few
+    neighbours of each box in y order; the median slope between them is
+    robust to the odd pair from different lines.
+    """
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    if len(centers) < 3:
+        return 0.0
+    ordered = centers[np.argsort(centers[:, 1], kind='stable')]
+
+    slopes = []
+    for shift in range(1, min(SKEW_NEIGHBOURS, len(ordered) - 1) + 1):
+        delta = ordered[shift:] - ordered[:-shift]
+        same_line = ((np.abs(delta[:, 0]) > 0.5 * line_height) &
+                     (np.abs(delta[:, 0]) < 8 * line_height) &
+                     (np.abs(delta[:, 1]) < 0.6 * line_height))
+        slopes.append(delta[same_line, 1] / delta[same_line, 0])
+    slopes = np.concatenate(slopes)
+    if len(slopes) < 3:
+        return 0.0
+    return float(np.clip(np.median(slopes), -MAX_SKEW_SLOPE, MAX_SKEW_SLOPE))
+
+
+def find_columns(boxes, min_gap):
+    """
+    Return the [x_start, x_end] intervals of the text columns on a page.
+
+    Columns are separated by vertical bands at least `min_gap` wide that no
+    box crosses. Very wide boxes are ignored here, otherwise a heading across
+    both columns would close the gap.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros((0, 2))
+    widths = boxes[:, 2] - boxes[:, 0]
+    content_width = boxes[:, 2].max() - boxes[:, 0].min()
+    narrow = boxes[widths <= WIDE_BOX_FRACTION * content_width] if content_width > 0 else boxes
+    if len(narrow) == 0:
+        narrow = boxes
+
+    order = np.argsort(narrow[:, 0], kind='stable')
+    starts = narrow[order, 0]
+    # Running maximum of the right edges: a gap opens wherever the next box
+    # starts beyond everything seen so far
+    reach = np.maximum.accumulate(narrow[order, 2])
+    splits = np.nonzero(starts[1:] - reach[:-1] >= min_gap)[0]
+
+    column_starts = np.concatenate([[starts[0]], starts[splits + 1]])
+    column_ends = np.concatenate([reach[splits], [reach[-1]]])
+    return np.stack([column_starts, column_ends], axis=1)
+
+
+def _split_lines(indices, line_y, heights, line_tolerance):
+    """Cluster items into lines by breaking the y-sorted sequence at large gaps"""
+    if len(indices) == 0:
+        return []
+    indices = indices[np.argsort(line_y[indices], kind='stable')]
+    gaps = np.diff(line_y[indices])
+    pair_height = (heights[indices[1:]] + heights[indices[:-1]]) / 2
+    breaks = np.nonzero(gaps > line_tolerance * pair_height)[0] + 1
+    return np.split(indices, breaks)
+
+
+def order_lines(boxes, line_tolerance=LINE_TOLERANCE, column_gap=COLUMN_GAP):
+    """
+    Group boxes into visual lines in reading order.
+
+    Returns a list of lines, each a list of indices into `boxes` ordered
+    left to right. Lines are ordered column by column (left to right) and
+    top to bottom within a column; boxes that span several columns, such as
+    headings, cut the page into horizontal bands that are read in turn.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    if len(boxes) == 0:
+        return []
+
+    heights = np.clip(boxes[:, 3] - boxes[:, 1], 1e-6, None)
+    line_height = float(np.median(heights))
+    centers = box_centroids(boxes)
+
+    # Shear the skew out so that every line of text becomes horizontal
+    slope = estimate_skew(centers, line_height)
+    line_y = centers[:, 1] - slope * centers[:, 0]
+
+    # Assign each box to the column(s) it overlaps
+    columns = find_columns(boxes, column_gap * line_height)
+    overlaps = (boxes[:, None, 0] <= columns[None, :, 1]) & (boxes[:, None, 2] >= columns[None, :, 0])
+    column = np.argmax(overlaps, axis=1)
+    spanning = overlaps.sum(axis=1) > 1
+
+    # Lines of spanning boxes become bands; everything else falls between them
+    spanning_lines = _split_lines(np.nonzero(spanning)[0], line_y, heights, line_tolerance)
+    band_y = np.array([line_y[line].mean() for line in spanning_lines])
+    order = np.argsort(band_y, kind='stable')
+    spanning_lines = [spanning_lines[i] for i in order]
+    band_y = band_y[order]
+
+    band = 2 * np.searchsorted(band_y, line_y)
+    for rank, line in enumerate(spanning_lines):
+        band[line] = 2 * rank + 1
+        column[line] = 0
+
+    # Read band by band, and column by column within a band
+    group_key = band * (len(columns) + 1) + column
+    by_group = np.argsort(group_key, kind='stable')
+    groups = np.split(by_group, np.nonzero(np.diff(group_key[by_group]))[0] + 1)
+
+    lines = []
+    for members in groups:
+        group_lines = _split_lines(members, line_y, heights, line_tolerance)
+        lines.extend(line[np.argsort(boxes[line, 0], kind='stable')].tolist() for line in group_lines)
+    return lines
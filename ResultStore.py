@@ -0,0 +1,81 @@
+"""
+Bounded, thread-safe key/value store with TTL eviction.
+
+Used to keep job results and other per-request artifacts around long enough
+for a client to collect them, without letting memory grow without bound.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLStore:
+    """
+    Keep at most `max_items` entries, each for at most `ttl` seconds.
+
+    Entries are evicted lazily: expired entries are dropped whenever the store
+    is touched, and the oldest entries go first once the store is full.
+    Entries for which `keep(value)` is true are never evicted: an expired one
+    gets a fresh TTL, and capacity evictions pass over it (so a store full of
+    kept entries can exceed `max_items`).
+    """
+
+    def __init__(self, max_items=1000, ttl=3600, keep=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.keep = keep
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._evict_expired()
+            return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def _kept(self, value):
+        return self.keep is not None and self.keep(value)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        renewed = []
+        while self._items:
+            key, (expires, value) = next(iter(self._items.items()))
+            if expires > now:
+                break
+            self._items.popitem(last=False)
+            if self._kept(value):
+                renewed.append((key, value))
+        for key, value in renewed:
+            self._items[key] = (now + self.ttl, value)
+
+    def set(self, key, value):
+        """Store a value, resetting its TTL, and evict if the store is over capacity"""
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._evict_expired()
+            kept = []
+            while self._items and len(self._items) + len(kept) > self.max_items:
+                item = self._items.popitem(last=False)
+                if self._kept(item[1][1]):
+                    kept.append(item)
+            # Kept entries go back in front, in their original order
+            for key, entry in reversed(kept):
+                self._items[key] = entry
+                self._items.move_to_end(key, last=False)
+
+    def get(self, key, default=None):
+        """Return the value for a key, or default if it is missing or expired"""
+        with self._lock:
+            self._evict_expired()
+            entry = self._items.get(key)
+            return entry[1] if entry is not None else default
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value"""
+        with self._lock:
+            entry = self._items.pop(key, None)
+            return entry[1] if entry is not None else default
@@ -0,0 +1,115 @@
+"""
+Answer-to-rubric similarity scoring.
+
+Each student answer is split into segments (sentences, or the paragraphs
+`process_ocr_json` returns), and every rubric item (the definition, each
+cause and each effect) is matched with its most similar segment. A whole
+class is scored with one matrix multiply of L2-normalized segment embeddings
+against the rubric embeddings, followed by a padded max/argmax per student.
+"""
+import re
+
+import numpy as np
+
+RUBRIC_FIELDS = ('definition', 'causes', 'effects')
+
+# An item counts as covered when its best segment is at least this similar
+MATCH_THRESHOLD = 0.5
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def split_answer(answer):
+    """
+    Segments of one answer: a string is split into sentences and lines, a
+    list (e.g. `paragraphs` from /process_json) is used as given.
+    """
+    if isinstance(answer, str):
+        segments = _SENTENCE_END.split(answer)
+    else:
+        segments = [str(segment) for segment in answer]
+    return [segment.strip() for segment in segments if segment.strip()]
+
+
+def rubric_items(rubric):
+    """Flatten a rubric into (field, text) pairs in embedding order"""
+    return ([('definition', rubric['definition'])] +
+            [('causes', text) for text in rubric['causes']] +
+            [('effects', text) for text in rubric['effects']])
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def best_matches(segment_embeddings, owners, student_count, rubric_embeddings):
+    """
+    Best-matching segment of every student for every rubric item.
+
+    `owners[i]` is the student that segment i belongs to. Returns
+    (similarity, segment) arrays of shape (students, rubric items), where
+    `segment` indexes `segment_embeddings` and is -1 for a student with no
+    segments (whose similarity is 0).
+    """
+    owners = np.asarray(owners, dtype=np.intp)
+    rubric = normalize_rows(rubric_embeddings)
+    item_count = len(rubric)
+    similarity = np.zeros((student_count, item_count), dtype=np.float32)
+    segment = np.full((student_count, item_count), -1, dtype=np.intp)
+    if len(owners) == 0:
+        return similarity, segment
+
+    # (segments, items) cosine similarities in one multiply
+    scores = normalize_rows(segment_embeddings) @ rubric.T
+
+    # Scatter into a (students, longest answer, items) block padded with -inf
+    counts = np.bincount(owners, minlength=student_count)
+    order = np.argsort(owners, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    position = np.empty(len(owners), dtype=np.intp)
+    position[order] = np.arange(len(owners)) - np.repeat(starts, counts)
+    padded = np.full((student_count, counts.max(), item_count), -np.inf, dtype=np.float32)
+    padded[owners, position] = scores
+    index = np.full((student_count, counts.max()), -1, dtype=np.intp)
+    index[owners, position] = np.arange(len(owners))
+
+    best = padded.argmax(axis=1)
+    answered = counts > 0
+    similarity[answered] = np.take_along_axis(padded, best[:, None, :], axis=1)[answered, 0]
+    segment[answered] = np.take_along_axis(index, best, axis=1)[answered]
+    return similarity, segment
+
+
+def score_answers(items, segments, similarity, segment, threshold=MATCH_THRESHOLD):
+    """
+    Per-student reports from the output of best_matches.
+
+    Each report has an overall `score` (mean best similarity over all rubric
+    items, negatives counted as 0), `matched` / `total` items, and per field
+    a `score` and the best `matches` for each of its items.
+    """
+    fields = np.array([field for field, _ in items])
+    clipped = np.clip(similarity, 0, 1)
+    reports = []
+    for student in range(len(similarity)):
+        report = {
+            'score': round(float(clipped[student].mean()), 4) if len(items) else 0.0,
+            'matched': int((similarity[student] >= threshold).sum()),
+            'total': len(items),
+            'fields': {}
+        }
+        for field in RUBRIC_FIELDS:
+            columns = np.nonzero(fields == field)[0]
+            report['fields'][field] = {
+                'score': round(float(clipped[student, columns].mean()), 4) if len(columns) else None,
+                'matches': [{
+                    'rubric': items[column][1],
+                    'answer': segments[segment[student, column]] if segment[student, column] >= 0 else None,
+                    'similarity': round(float(similarity[student, column]), 4),
+                    'matched': bool(similarity[student, column] >= threshold)
+                } for column in columns]
+            }
+        reports.append(report)
+    return reports
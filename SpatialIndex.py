@@ -0,0 +1,145 @@
+"""
+Static R-tree over word bounding boxes.
+
+Built once per page from `[x_min, y_min, x_max, y_max]` boxes (the format
+produced by `Geometry.polygons_to_boxes`) with Sort-Tile-Recursive packing, and
+answers rectangle-intersection, containment and k-nearest queries without
+scanning every word.
+"""
+import heapq
+import math
+
+# Maximum children per node; 16 keeps the tree shallow for a page of words
+NODE_CAPACITY = 16
+
+
+def _union(boxes):
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+def _intersects(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def _point_distance(box, x, y):
+    """Euclidean distance from a point to a box; zero when the point is inside"""
+    dx = max(box[0] - x, 0, x - box[2])
+    dy = max(box[1] - y, 0, y - box[3])
+    return math.hypot(dx, dy)
+
+
+def _str_pack(items, capacity):
+    """
+    Group (box, payload) items into nodes of at most `capacity` entries.
+
+    Items are sliced into vertical strips by x centre, and each strip is cut
+    into runs by y centre, so every node covers a compact tile of the page.
+    """
+    count = len(items)
+    node_count = math.ceil(count / capacity)
+    slice_count = math.ceil(math.sqrt(node_count))
+    slice_size = slice_count * capacity
+
+    items = sorted(items, key=lambda item: item[0][0] + item[0][2])
+    nodes = []
+    for start in range(0, count, slice_size):
+        strip = sorted(items[start:start + slice_size], key=lambda item: item[0][1] + item[0][3])
+        for node_start in range(0, len(strip), capacity):
+            children = strip[node_start:node_start + capacity]
+            nodes.append((_union([box for box, _ in children]), children))
+    return nodes
+
+
+class SpatialIndex:
+    """
+    R-tree over a list of boxes; query results are indices into that list.
+
+    Leaves hold (box, index) pairs and inner nodes hold (box, child nodes).
+    """
+
+    def __init__(self, boxes, node_capacity=NODE_CAPACITY):
+        self.boxes = [tuple(box) for box in boxes]
+        self._root = None
+        self._height = 0
+
+        level = [(box, i) for i, box in enumerate(self.boxes)]
+        if not level:
+            return
+        nodes = _str_pack(level, node_capacity)
+        self._height = 1
+        while len(nodes) > 1:
+            nodes = _str_pack(nodes, node_capacity)
+            self._height += 1
+        self._root = nodes[0]
+
+    @classmethod
+    def from_word_data(cls, word_data, node_capacity=NODE_CAPACITY):
+        """Build an index over the boundingBox of each word_data record"""
+        return cls([word["boundingBox"] for word in word_data], node_capacity)
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _search(self, node_test, entry_test):
+        if self._root is None:
+            return []
+        found = []
+        # Stack of (node, depth); depth == height means the node's children are entries
+        stack = [(self._root, 1)]
+        while stack:
+            (box, children), depth = stack.pop()
+            if not node_test(box):
+                continue
+            if depth == self._height:
+                found.extend(i for child_box, i in children if entry_test(child_box))
+            else:
+                stack.extend((child, depth + 1) for child in children)
+        return sorted(found)
+
+    def intersects(self, rect):
+        """Indices of boxes overlapping `rect` = [x_min, y_min, x_max, y_max]"""
+        rect = tuple(rect)
+        return self._search(lambda box: _intersects(box, rect), lambda box: _intersects(box, rect))
+
+    def within(self, rect):
+        """Indices of boxes lying entirely inside `rect`, e.g. the words of an answer box"""
+        rect = tuple(rect)
+        return self._search(lambda box: _intersects(box, rect), lambda box: _contains(rect, box))
+
+    def containing(self, x, y):
+        """Indices of boxes that contain the point (x, y)"""
+        point = (x, y, x, y)
+        return self._search(lambda box: _contains(box, point), lambda box: _contains(box, point))
+
+    def nearest(self, x, y, k=1):
+        """
+        The `k` boxes closest to the point (x, y), as (index, distance) pairs.
+
+        Best-first search: nodes are expanded in order of their distance to the
+        point, so only the part of the tree near the point is visited.
+        """
+        if self._root is None or k <= 0:
+            return []
+        counter = 0  # tie-breaker so the heap never compares nodes
+        heap = [(_point_distance(self._root[0], x, y), counter, 1, self._root)]
+        results = []
+        while heap and len(results) < k:
+            distance, _, depth, entry = heapq.heappop(heap)
+            if depth > self._height:
+                results.append((entry, distance))
+                continue
+            box, children = entry
+            for child in children:
+                counter += 1
+                child_box, payload = child if depth == self._height else (child[0], child)
+                heapq.heappush(heap, (_point_distance(child_box, x, y), counter, depth + 1, payload))
+        return results
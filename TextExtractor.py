@@ -1,148 +1,774 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
-import time
 from PIL import Image
 import io
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from urllib.parse import urlsplit
+
+import requests
+from werkzeug.exceptions import RequestEntityTooLarge
+from pypdf import PdfReader, PdfWriter
+
+from AzureSession import RequestTiming
+from BlobStore import copy_stream, peek, stream_size
+from OcrCache import OcrCache, make_cache_key
+from Preprocess import prepare_image
+from ReadApi import (READ_MODEL, READ_TIMEOUT, build_line_data, build_word_data, endpoint, iter_word_data,
+                     read_analyze_url, subscription_key)
+from ReadPoller import ReadPoller, ReadOperationError
+from ResultStore import TTLStore
+from SpatialIndex import SpatialIndex
 
 app = Flask(__name__)
 
 # Enable CORS for all routes and origins
 CORS(app, origins="*")
 
-# Azure credentials
-subscription_key = '6b2uM74mq58QMzHkU50QsZwJXDVoUuklAi6fqiob6b7XiaCMR4zUJQQJ99BDACYeBjFXJ3w3AAAFACOGki3V'
-endpoint = 'https://vellan.cognitiveservices.azure.com/'
-read_url = endpoint + "vision/v3.2/read/analyze"
+# Requests larger than this are refused with 413 before the body is read
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 
-@app.route('/extract-text', methods=['POST'])
-def extract_text():
+# werkzeug spools each uploaded file to a temporary file once it passes
+# 500 KB. Smaller uploads are read into bytes; larger ones stay on disk and
+# are streamed to Azure in chunks, so request memory does not grow with them
+IN_MEMORY_UPLOAD_BYTES = 500 * 1024
+
+# Azure credentials and timeout are in ReadApi; the URL is kept here so it
+# can be pointed elsewhere per process
+read_url = read_analyze_url(endpoint)
+
+# One poller (and one event loop thread) shared by every request in this worker
+poller = ReadPoller(subscription_key, timeout=READ_TIMEOUT)
+
+# Succeeded Read results keyed by image hash, shared on disk with TextLayoutParser
+ocr_cache = OcrCache()
+
+# Submitted jobs and their results; finished jobs are kept for JOB_TTL seconds.
+# Running jobs are never evicted, and at most MAX_JOBS may run at once
+JOB_TTL = 3600
+MAX_JOBS = 5000
+jobs = TTLStore(max_items=MAX_JOBS, ttl=JOB_TTL, keep=lambda job: job.status == 'running')
+running_jobs = threading.BoundedSemaphore(MAX_JOBS)
+
+# Job webhooks may only call http(s) URLs on these hosts (JOB_WEBHOOK_HOSTS,
+# comma-separated; a leading '.' also allows subdomains), and never a host
+# that resolves to a private, loopback or link-local address. Unset, webhooks
+# are refused
+WEBHOOK_ALLOWED_HOSTS = [host.strip().lower() for host in os.environ.get('JOB_WEBHOOK_HOSTS', '').split(',')
+                         if host.strip()]
+
+# Longest a GET /jobs/<id>?wait=... long-poll is allowed to hold the connection
+MAX_LONG_POLL = 30
+
+# Batch extraction: Read operations in flight per batch request, and pages per request
+BATCH_CONCURRENCY = 8
+MAX_BATCH_PAGES = 200
+
+# Binarize, deskew and downscale images before upload (see Preprocess.py).
+# Off by default; a request opts in or out with `preprocess=1` / `preprocess=0`
+PREPROCESS_UPLOADS = False
+
+# Spatial indexes over the words of a page, keyed by (extraction key, page)
+region_indexes = TTLStore(max_items=256, ttl=JOB_TTL)
+
+# Webhook deliveries run here so they never block the poller's event loop
+webhook_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='job-webhook')
+
+# Batch pages are preprocessed here, in parallel and off the request thread
+PREPROCESS_WORKERS = 4
+preprocess_executor = ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix='preprocess')
+
+# Work on finished Read results (caching them, building job payloads) runs
+# here: done-callbacks fire on the poller's event loop thread, and anything
+# slow there would hold up every other operation's polling
+result_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='read-results')
+
+
+def then(future, fn):
+    """Future for fn(result of `future`), computed on result_executor once `future` is done"""
+    chained = Future()
+
+    def run(future):
+        if future.cancelled():
+            chained.cancel()
+        elif future.exception() is not None:
+            chained.set_exception(future.exception())
+        else:
+            try:
+                chained.set_result(fn(future.result()))
+            except Exception as e:
+                chained.set_exception(e)
+
+    future.add_done_callback(lambda future: result_executor.submit(run, future))
+    return chained
+
+
+def cached_read_future(key):
+    """Return a resolved Future holding the cached Read result for a key, or None"""
+    cached = ocr_cache.get(key)
+    if cached is None:
+        return None
+    future = Future()
+    future.set_result(cached)
+    return future
+
+
+def cache_when_succeeded(key, future):
+    """Future for the Read result of `future`, stored in the OCR cache (off the event loop) if it succeeded"""
+    def store(result):
+        if result["status"] == "succeeded":
+            ocr_cache.set(key, result)
+        return result
+
+    return then(future, store)
+
+
+def upload_body(file):
+    """
+    Content of an uploaded file for the Read API: bytes for a small file,
+    otherwise its spooled temporary file, rewound
+    """
+    stream = file.stream
+    stream.seek(0)
+    if stream_size(stream) <= IN_MEMORY_UPLOAD_BYTES:
+        return stream.read()
+    return stream
+
+
+def detach_upload(image_data):
+    """
+    A copy of a streamed upload that outlives the request, whose files are
+    closed at teardown; bytes are returned as they are
+    """
+    if isinstance(image_data, bytes):
+        return image_data
+    copy = tempfile.TemporaryFile()
+    copy_stream(image_data, copy)
+    copy.seek(0)
+    return copy
+
+
+def is_pdf(image_data):
+    head = image_data[:5] if isinstance(image_data, bytes) else peek(image_data, 5)
+    return head == b'%PDF-'
+
+
+def read_cache_key(image_data, preprocess=False):
+    """
+    Extraction key of an image: its OCR cache key for the Read endpoint and
+    model. Preprocessed extractions are cached apart from plain ones.
+    """
+    model = READ_MODEL + '+preprocess' if preprocess else READ_MODEL
+    return make_cache_key(image_data, endpoint, model)
+
+
+def wants_preprocess():
+    """True when the request's `preprocess` parameter (or PREPROCESS_UPLOADS) asks for preprocessing"""
+    value = request.values.get('preprocess')
+    if value is None:
+        return PREPROCESS_UPLOADS
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def prepare_upload(image_data):
+    """
+    Preprocessed version of an image for the Read API, or None to send the
+    original (PDFs, images PIL cannot decode, and those it would not shrink)
+    """
+    if is_pdf(image_data):
+        return None
+    try:
+        return prepare_image(image_data)
+    except Exception as e:
+        app.logger.debug("Preprocessing skipped: %s", e)
+        return None
+
+
+def analyze_prepared(image_data, timing=None, preprocess=False, preprocess_stats=None):
+    """
+    Start a Read operation for an image, preprocessed first if asked.
+    Preprocessing stats are written into the `preprocess_stats` dict if given.
+    """
+    prepared = prepare_upload(image_data) if preprocess else None
+    if prepared is None:
+        return poller.analyze(read_url, image_data, timing=timing)
+    if preprocess_stats is not None:
+        preprocess_stats.update(prepared.stats())
+    # Coordinates are mapped back onto the original image off the poller's loop
+    return then(poller.analyze(read_url, prepared.data, timing=timing), prepared.restore_read_result)
+
+
+def submit_read_operation(image_data, timing=None, key=None, preprocess=False, preprocess_stats=None):
+    """
+    Return a Future for the Read result of an image.
+
+    A cached result resolves immediately; otherwise the image goes to the
+    shared poller and a succeeded result is cached when it arrives. Network
+    timing is recorded into `timing` if one is given. With `preprocess`, the
+    image is binarized, deskewed and downscaled before upload and the result's
+    coordinates are mapped back onto the original image.
+    """
+    key = key or read_cache_key(image_data, preprocess)
+    future = cached_read_future(key)
+    if future is not None:
+        return future
+
+    return cache_when_succeeded(key, analyze_prepared(image_data, timing, preprocess, preprocess_stats))
+
+
+def submit_read_operations(pages, concurrency=BATCH_CONCURRENCY, preprocess=False, preprocess_stats=None):
+    """
+    Return Futures for the Read results of several pages, in page order.
+
+    Cached pages resolve immediately; the rest go to the poller with at most
+    `concurrency` operations in flight. With `preprocess`, image pages are
+    preprocessed on preprocess_executor, each submitted as soon as it is
+    ready, and if `preprocess_stats` is a list, one entry per page is added
+    to it: the page's stats, set by the time its Future resolves, or None for
+    pages sent as they are.
+    """
+    keys = [read_cache_key(page_data, preprocess) for page_data in pages]
+    futures = [cached_read_future(key) for key in keys]
+    if preprocess_stats is not None:
+        preprocess_stats.extend([None] * len(pages))
+
+    missing = [i for i, future in enumerate(futures) if future is None]
+    prepared = {}
+
+    def prepare(i):
+        """Upload for page i: its preprocessed image, or the page as it is"""
+        prepared[i] = prepare_upload(pages[i])
+        if prepared[i] is None:
+            return pages[i]
+        if preprocess_stats is not None:
+            preprocess_stats[i] = prepared[i].stats()
+        return prepared[i].data
+
+    uploads = [preprocess_executor.submit(prepare, i) if preprocess else pages[i] for i in missing]
+    submitted = poller.analyze_many(read_url, uploads, concurrency=concurrency)
+    for i, future in zip(missing, submitted):
+        if preprocess:
+            future = then(future, lambda result, i=i: prepared[i].restore_read_result(result)
+                          if prepared[i] is not None else result)
+        futures[i] = cache_when_succeeded(keys[i], future)
+    return futures
+
+
+def split_pdf_pages(pdf_data):
+    """Split a PDF (bytes or a seekable stream) into one single-page PDF per page"""
+    pages = []
+    for page in PdfReader(io.BytesIO(pdf_data) if isinstance(pdf_data, bytes) else pdf_data).pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pages.append(buffer.getvalue())
+    return pages
+
+
+def wait_for_read(future):
+    """
+    Result of a Read future. The poller fails operations after READ_TIMEOUT;
+    a wait that still runs out raises the same ReadOperationError.
+    """
+    try:
+        return future.result(timeout=READ_TIMEOUT + 5)
+    except FutureTimeoutError:
+        raise ReadOperationError('Azure Read operation timed out') from None
+
+
+def run_read_operation(image_data, timing=None, key=None, preprocess=False, preprocess_stats=None):
+    """
+    Submit an image to the Azure Read API and wait for the final result.
+
+    The polling itself happens on the shared poller's event loop; this thread
+    only waits on the returned future.
+    """
+    return wait_for_read(submit_read_operation(image_data, timing, key, preprocess, preprocess_stats))
+
+
+def extract_text_payload(result):
+    """Response body of /extract-text for a succeeded Read result"""
+    return {'extracted_text': build_line_data(result)}
+
+
+def word_level_payload(result):
+    """Response body of /word-level for a succeeded Read result"""
+    word_data = build_word_data(result)
+    return {
+        'word_data': word_data,
+        'total_words': len(word_data)
+    }
+
+
+# Payload builder for each extraction mode a job can run in
+JOB_MODES = {
+    'extract-text': extract_text_payload,
+    'word-level': word_level_payload,
+}
+
+
+class Job:
+    """A submitted extraction and, once finished, its result"""
+
+    def __init__(self, mode, key, webhook=None):
+        self.id = str(uuid.uuid4())
+        self.mode = mode
+        self.key = key
+        self.webhook = webhook
+        self.status = 'running'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.timing = RequestTiming()
+        self.done = threading.Event()
+
+    def to_dict(self):
+        job = {
+            'job_id': self.id,
+            'mode': self.mode,
+            'extraction_key': self.key,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'timing': self.timing.to_dict()
+        }
+        if self.status == 'succeeded':
+            job['result'] = self.result
+        elif self.status == 'failed':
+            job['error'] = self.error
+        return job
+
+
+def complete_job(job, future):
+    """Record the outcome of a job's Read operation and fire its webhook"""
+    try:
+        result = future.result()
+        if result["status"] == "succeeded":
+            job.result = JOB_MODES[job.mode](result)
+            job.status = 'succeeded'
+        else:
+            job.error = {'error': 'Text recognition failed'}
+            job.status = 'failed'
+    except ReadOperationError as e:
+        job.error = {'error': str(e), 'details': e.details}
+        job.status = 'failed'
+    except Exception as e:
+        job.error = {'error': f"Unexpected error: {str(e)}"}
+        job.status = 'failed'
+
+    job.finished = time.time()
+    # Re-storing the job restarts its TTL from completion rather than submission
+    jobs.set(job.id, job)
+    running_jobs.release()
+    job.done.set()
+
+    if job.webhook:
+        webhook_executor.submit(deliver_webhook, job)
+
+
+def check_webhook(url):
+    """Raise ValueError unless `url` is an http(s) URL on an allowed host that resolves only to public addresses"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise ValueError("'webhook' must be an http or https URL")
+    if not any(host == allowed or (allowed.startswith('.') and host.endswith(allowed))
+               for allowed in WEBHOOK_ALLOWED_HOSTS):
+        raise ValueError(f"Webhook host '{host}' is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError) as e:
+        raise ValueError(f"Webhook host '{host}' could not be resolved") from e
+    if not all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses):
+        raise ValueError(f"Webhook host '{host}' resolves to a non-public address")
+
+
+def deliver_webhook(job):
+    """POST the finished job to the client's webhook; failures are only logged"""
+    try:
+        # Checked again at delivery, in case the host now resolves elsewhere
+        check_webhook(job.webhook)
+        requests.post(job.webhook, json=job.to_dict(), timeout=10, allow_redirects=False)
+    except (ValueError, requests.RequestException) as e:
+        print(f"Webhook delivery for job {job.id} failed: {str(e)}")
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submit an image for extraction and return a job id immediately.
+
+    Form fields: `image` (required), `mode` (`word-level` or `extract-text`,
+    default `word-level`), an optional `webhook` URL that receives the
+    finished job as JSON (its host must be in WEBHOOK_ALLOWED_HOSTS), and
+    `preprocess` to preprocess the image before upload.
+    """
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
     
-    image = request.files['image']
+    mode = request.form.get('mode', 'word-level')
+    if mode not in JOB_MODES:
+        return jsonify({'error': f"Unknown mode '{mode}'", 'modes': list(JOB_MODES)}), 400
     
-    # Read the image data once and store it
-    image_data = image.read()
+    webhook = request.form.get('webhook')
+    if webhook:
+        try:
+            check_webhook(webhook)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
     
-    # Send image to Azure Read API
-    headers = {
-        "Ocp-Apim-Subscription-Key": subscription_key,
-        "Content-Type": "application/octet-stream"
-    }
+    # The Read operation runs after this request ends, so it gets its own copy
+    image_data = detach_upload(upload_body(request.files['image']))
+    
+    preprocess = wants_preprocess()
+    key = read_cache_key(image_data, preprocess)
+    if not running_jobs.acquire(blocking=False):
+        if not isinstance(image_data, bytes):
+            image_data.close()
+        return jsonify({'error': 'Too many jobs in progress; retry later'}), 503
+    job = Job(mode, key, webhook=webhook or None)
+    try:
+        jobs.set(job.id, job)
+        future = submit_read_operation(image_data, job.timing, key=job.key, preprocess=preprocess)
+    except Exception:
+        # The job never started, so complete_job will not free its slot or upload
+        jobs.pop(job.id, None)
+        running_jobs.release()
+        if not isinstance(image_data, bytes):
+            image_data.close()
+        raise
+    # Building the payload is CPU work, so it runs on result_executor, not the poller's loop
+    future.add_done_callback(lambda future: result_executor.submit(complete_job, job, future))
+    if not isinstance(image_data, bytes):
+        future.add_done_callback(lambda future: image_data.close())
+    
+    response = jsonify({'job_id': job.id, 'status': job.status})
+    response.status_code = 202
+    response.headers['Location'] = f"/jobs/{job.id}"
+    return response
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Return a job's status, and its result once finished.
+
+    Pass `?wait=<seconds>` to long-poll until the job finishes or the wait
+    (capped at MAX_LONG_POLL) runs out.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
     
-    response = requests.post(read_url, headers=headers, data=image_data)
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_LONG_POLL)
+    except ValueError:
+        return jsonify({'error': "'wait' must be a number of seconds"}), 400
+    if wait > 0:
+        job.done.wait(wait)
     
-    if response.status_code != 202:
-        return jsonify({'error': 'Azure Read API call failed', 'details': response.text}), 500
+    return jsonify(job.to_dict())
+
+
+@app.route('/extract-text', methods=['POST'])
+def extract_text():
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image uploaded'}), 400
     
-    operation_url = response.headers["Operation-Location"]
+    image = request.files['image']
     
-    # Polling for result
-    while True:
-        result = requests.get(operation_url, headers={"Ocp-Apim-Subscription-Key": subscription_key}).json()
-        if result["status"] in ["succeeded", "failed"]:
-            break
-        time.sleep(1)
+    # Small uploads as bytes, large ones streamed from their temporary file
+    image_data = upload_body(image)
+    
+    timing = RequestTiming()
+    preprocess_stats = {}
+    try:
+        result = run_read_operation(image_data, timing, preprocess=wants_preprocess(),
+                                    preprocess_stats=preprocess_stats)
+    except ReadOperationError as e:
+        return jsonify({'error': str(e), 'details': e.details}), 500
     
     if result["status"] == "succeeded":
-        extracted_text = []
-        for line in result["analyzeResult"]["readResults"][0]["lines"]:
-            # Create a dictionary for each line
-            line_data = {
-                "text": line["text"],
-                "boundingBox": convert_bbox_format(line["boundingBox"]),  # Convert to 4-point format
-                "confidence": None  # Default to None
-            }
-            
-            # Azure's OCR API returns word-level confidence, so we can calculate the average
-            if "words" in line and line["words"]:
-                confidences = [word.get("confidence", 0) for word in line["words"] if "confidence" in word]
-                if confidences:
-                    line_data["confidence"] = sum(confidences) / len(confidences)
-            
-            extracted_text.append(line_data)
-        
-        return jsonify({
-            'extracted_text': extracted_text
-        })
+        response = jsonify(extract_text_payload(result))
+        response.headers['Server-Timing'] = timing.server_timing_header()
+        if preprocess_stats:
+            response.headers['X-Preprocess-Stats'] = json.dumps(preprocess_stats)
+        return response
     else:
         return jsonify({'error': 'Text recognition failed'}), 500
 
 
+def wants_ndjson():
+    """True when the client opted into a streamed NDJSON response"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
+
+
+def stream_word_data(image_data, preprocess=False):
+    """
+    Stream word_data records as NDJSON, one word per line.
+
+    PDFs are split and their pages submitted concurrently, so the words of
+    each page are sent as soon as that page (and the ones before it) finish.
+    Only one page's words are held at a time, so memory does not grow with
+    the page count. As
+    in /batch, a failed page gets an error line and the pages after it are
+    still sent.
+    """
+    if is_pdf(image_data):
+        futures = submit_read_operations(split_pdf_pages(image_data))
+    else:
+        futures = [submit_read_operation(image_data, preprocess=preprocess)]
+    
+    def generate():
+        word_id = 0
+        for page_number, future in enumerate(futures, 1):
+            try:
+                result = wait_for_read(future)
+                if result["status"] != "succeeded":
+                    yield json.dumps({'page': page_number, 'error': 'Text recognition failed'}) + '\n'
+                    continue
+                # Built before any line is sent, so a malformed page sends only its error line
+                words = list(iter_word_data(result, start_id=word_id))
+            except ReadOperationError as e:
+                yield json.dumps({'page': page_number, 'error': str(e), 'details': e.details}) + '\n'
+                continue
+            except Exception as e:
+                yield json.dumps({'page': page_number, 'error': f"Unexpected error: {str(e)}"}) + '\n'
+                continue
+            
+            word_id += len(words)
+            for word_info in words:
+                yield json.dumps(word_info) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/word-level', methods=['POST'])
 def word_level_extraction():
     """
     Extract text with word-level bounding boxes using Azure Read API
+
+    Pass `?stream=1` (or `Accept: application/x-ndjson`) to receive one word
+    record per NDJSON line instead of a single JSON document, and
+    `preprocess=1` to binarize, deskew and downscale the image before upload
+    (boxes are still in the coordinates of the uploaded image).
     """
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
     
     image = request.files['image']
     
-    # Read the image data once
-    image_data = image.read()
-    
-    # Send image to Azure Read API
-    headers = {
-        "Ocp-Apim-Subscription-Key": subscription_key,
-        "Content-Type": "application/octet-stream"
-    }
+    # Small uploads as bytes, large ones streamed from their temporary file
+    image_data = upload_body(image)
     
-    response = requests.post(read_url, headers=headers, data=image_data)
+    preprocess = wants_preprocess()
+    if wants_ndjson():
+        try:
+            return stream_word_data(image_data, preprocess)
+        except Exception as e:
+            if is_pdf(image_data):
+                return jsonify({'error': f"Could not read PDF: {str(e)}"}), 400
+            return jsonify({'error': f"Unexpected error: {str(e)}"}), 500
     
-    if response.status_code != 202:
-        return jsonify({'error': 'Azure Read API call failed', 'details': response.text}), 500
-    
-    operation_url = response.headers["Operation-Location"]
-    
-    # Polling for result
-    while True:
-        result = requests.get(operation_url, headers={"Ocp-Apim-Subscription-Key": subscription_key}).json()
-        if result["status"] in ["succeeded", "failed"]:
-            break
-        time.sleep(1)
+    key = read_cache_key(image_data, preprocess)
+    timing = RequestTiming()
+    preprocess_stats = {}
+    try:
+        result = run_read_operation(image_data, timing, key=key, preprocess=preprocess,
+                                    preprocess_stats=preprocess_stats)
+    except ReadOperationError as e:
+        return jsonify({'error': str(e), 'details': e.details}), 500
     
     if result["status"] == "succeeded":
         # Extract word-level data
-        word_data = []
-        word_id = 0
-        
-        for page_result in result["analyzeResult"]["readResults"]:
-            for line in page_result["lines"]:
-                line_text = line["text"]
-                
-                if "words" in line:
-                    for word in line["words"]:
-                        word_info = {
-                            "id": word_id,
-                            "text": word["text"],
-                            "boundingBox": convert_bbox_format(word["boundingBox"]),
-                            "confidence": word.get("confidence", None),
-                            "line_text": line_text
-                        }
-                        word_data.append(word_info)
-                        word_id += 1
-        
-        return jsonify({
-            'word_data': word_data,
-            'total_words': len(word_data)
-        })
+        response = jsonify(word_level_payload(result))
+        response.headers['Server-Timing'] = timing.server_timing_header()
+        # Clients pass this key to /regions to query the cached extraction
+        response.headers['X-Extraction-Key'] = key
+        if preprocess_stats:
+            response.headers['X-Preprocess-Stats'] = json.dumps(preprocess_stats)
+        return response
     else:
         return jsonify({'error': 'Text recognition failed'}), 500
 
 
-def convert_bbox_format(bounding_box):
+@app.route('/batch', methods=['POST'])
+def batch_word_level_extraction():
+    """
+    Word-level extraction for a multi-page PDF or many page images at once.
+
+    Send either one `document` PDF or several `images` files. Pages are sent to
+    the Read API concurrently (at most BATCH_CONCURRENCY in flight) and the
+    response streams one NDJSON line per page, in page order, as soon as that
+    page and every page before it have finished. Word ids run across pages.
+    With `preprocess=1`, image pages are preprocessed before upload and each
+    line carries that page's `preprocess` stats.
     """
-    Convert 8-point bounding box (from Azure) into 4-point (top-left, bottom-right).
+    if 'document' in request.files:
+        try:
+            pages = split_pdf_pages(upload_body(request.files['document']))
+        except Exception as e:
+            return jsonify({'error': f"Could not read PDF: {str(e)}"}), 400
+    else:
+        pages = [upload_body(image) for image in request.files.getlist('images')]
+    
+    if not pages:
+        return jsonify({'error': 'No document or images uploaded'}), 400
+    if len(pages) > MAX_BATCH_PAGES:
+        return jsonify({'error': f"At most {MAX_BATCH_PAGES} pages per batch"}), 413
+    
+    preprocess = wants_preprocess()
+    preprocess_stats = []
+    futures = submit_read_operations(pages, preprocess=preprocess, preprocess_stats=preprocess_stats)
+    
+    def generate():
+        word_id = 0
+        for page_number, future in enumerate(futures, 1):
+            # A failed page gets an error line; the pages after it are still sent
+            try:
+                result = wait_for_read(future)
+                if result["status"] != "succeeded":
+                    yield json.dumps({'page': page_number, 'error': 'Text recognition failed'}) + '\n'
+                    continue
+                word_data = build_word_data(result, start_id=word_id)
+            except ReadOperationError as e:
+                yield json.dumps({'page': page_number, 'error': str(e), 'details': e.details}) + '\n'
+                continue
+            except Exception as e:
+                yield json.dumps({'page': page_number, 'error': f"Unexpected error: {str(e)}"}) + '\n'
+                continue
+            
+            word_id += len(word_data)
+            line = {
+                'page': page_number,
+                'word_data': word_data,
+                'total_words': len(word_data)
+            }
+            if preprocess and preprocess_stats[page_number - 1]:
+                line['preprocess'] = preprocess_stats[page_number - 1]
+            yield json.dumps(line) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def get_page_index(key, page):
     """
-    x_coords = bounding_box[::2]
-    y_coords = bounding_box[1::2]
-    x0, y0 = min(x_coords), min(y_coords)
-    x1, y1 = max(x_coords), max(y_coords)
+    Return (word_data, SpatialIndex) for one page of a cached extraction.
+
+    Indexes are built once per page and kept in region_indexes. Returns None
+    if the extraction is no longer cached or the page does not exist.
+    """
+    entry = region_indexes.get((key, page))
+    if entry is not None:
+        return entry
+    
+    result = ocr_cache.get(key)
+    if result is None:
+        return None
+    read_results = result["analyzeResult"]["readResults"]
+    if not 1 <= page <= len(read_results):
+        return None
+    
+    # Word ids match /word-level, which numbers words across all pages
+    start_id = sum(len(line.get("words", [])) for page_result in read_results[:page - 1]
+                   for line in page_result["lines"])
+    page_result = {"analyzeResult": {"readResults": [read_results[page - 1]]}}
+    word_data = build_word_data(page_result, start_id=start_id)
+    entry = (word_data, SpatialIndex.from_word_data(word_data))
+    region_indexes.set((key, page), entry)
+    return entry
+
+
+def run_region_query(word_data, index, query):
+    """Run one region query against a page index and return the matching words"""
+    if not isinstance(query, dict):
+        raise ValueError('Each query must be an object')
+    query_type = query.get('type')
+    if query_type not in ('intersects', 'within', 'containing', 'nearest'):
+        raise ValueError(f"Unknown query type '{query_type}'")
+    if query_type in ('intersects', 'within'):
+        rect = query.get('rect')
+        if not isinstance(rect, list) or len(rect) != 4:
+            raise ValueError(f"'{query_type}' queries need 'rect': [x_min, y_min, x_max, y_max]")
+        indices = index.intersects(rect) if query_type == 'intersects' else index.within(rect)
+        return {'type': query_type, 'words': [word_data[i] for i in indices]}
+    
+    point = query.get('point')
+    if not isinstance(point, list) or len(point) != 2:
+        raise ValueError(f"'{query_type}' queries need 'point': [x, y]")
+    if query_type == 'containing':
+        return {'type': query_type, 'words': [word_data[i] for i in index.containing(*point)]}
+    nearest = index.nearest(point[0], point[1], k=int(query.get('k', 1)))
+    return {
+        'type': query_type,
+        'words': [dict(word_data[i], distance=distance) for i, distance in nearest]
+    }
+
+
+@app.route('/regions', methods=['POST'])
+def region_query():
+    """
+    Run spatial queries against a cached word-level extraction.
+
+    JSON body: `key` (the X-Extraction-Key of a /word-level response) or
+    `job_id`, an optional 1-based `page`, and a list of `queries`, each one of
+    {"type": "intersects" | "within", "rect": [x_min, y_min, x_max, y_max]} or
+    {"type": "containing" | "nearest", "point": [x, y], "k": 3}.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    key = data.get('key')
+    if key is None and 'job_id' in data:
+        job = jobs.get(data['job_id'])
+        key = job.key if job is not None else None
+    if key is None:
+        return jsonify({'error': "Provide the 'key' or 'job_id' of an extraction"}), 400
+    if not isinstance(key, str) or not all(c in '0123456789abcdef' for c in key):
+        return jsonify({'error': "'key' must be an extraction key"}), 400
+    
+    page = data.get('page', 1)
+    if not isinstance(page, int) or isinstance(page, bool) or page < 1:
+        return jsonify({'error': "'page' must be a positive integer"}), 400
+    
+    queries = data.get('queries')
+    if not isinstance(queries, list):
+        return jsonify({'error': "'queries' must be a list"}), 400
+    
+    entry = get_page_index(key, page)
+    if entry is None:
+        return jsonify({'error': 'Extraction or page not found in cache'}), 404
+    word_data, index = entry
+    
+    try:
+        results = [run_region_query(word_data, index, query) for query in queries]
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'results': results})
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': f"Upload too large: the limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
+
 
-    # Return as [x_min, y_min, x_max, y_max]
-    return [x0, y0, x1, y1]
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the OCR result cache"""
+    return jsonify(ocr_cache.stats())
 
 
 if __name__ == '__main__':
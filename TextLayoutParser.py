@@ -1,4 +1,5 @@
-from flask import Flask, request, jsonify, render_template_string, redirect, url_for
+from flask import Flask, Request, Response, request, jsonify, render_template_string, redirect, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import json
 import time
@@ -9,19 +10,57 @@ import traceback
 # Import Azure modules
 # You need to install these with: pip install azure-ai-formrecognizer
 from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from azure.core.pipeline.transport import RequestsTransport
+from azure.ai.formrecognizer import DocumentAnalysisClient, AnalyzeResult
+
+from AzureSession import get_session, get_sdk_client
+from BlobStore import BlobStore, BlobTooLarge
+from LayoutDocument import DeltaError, LayoutDocument, PageLayout, ocr_document_entry
+from OcrCache import OcrCache, make_cache_key
+from ResultStore import TTLStore
 
 app = Flask(__name__)
 
 # Azure Form Recognizer Configuration
-# Replace these with your actual Form Recognizer endpoint and key
-# Consider using environment variables for these sensitive values
-FORM_RECOGNIZER_ENDPOINT = 'https://test1tran.cognitiveservices.azure.com/'
-FORM_RECOGNIZER_KEY = 'W9FBaeGXDDqNVqUz7W9yEO6NoGxQElZA6BR63yWYhaA0IueHqWjqJQQJ99BEACYeBjFXJ3w3AAALACOGHJy1'
+# FORM_RECOGNIZER_ENDPOINT / FORM_RECOGNIZER_KEY in the environment override
+# these, e.g. to point at a local MockAzure server
+FORM_RECOGNIZER_ENDPOINT = os.environ.get('FORM_RECOGNIZER_ENDPOINT', 'https://test1tran.cognitiveservices.azure.com/')
+FORM_RECOGNIZER_KEY = os.environ.get(
+    'FORM_RECOGNIZER_KEY', 'W9FBaeGXDDqNVqUz7W9yEO6NoGxQElZA6BR63yWYhaA0IueHqWjqJQQJ99BEACYeBjFXJ3w3AAALACOGHJy1')
+FORM_RECOGNIZER_MODEL = 'prebuilt-document'
+
+# Analysis results keyed by document hash, shared on disk with TextExtractor
+ocr_cache = OcrCache()
+
+# Raw analysis results behind the "Raw JSON" tab, serialized only when fetched
+RAW_JSON_TTL = 3600
+MAX_RAW_JSON_ARTIFACTS = 200
+raw_json_artifacts = TTLStore(max_items=MAX_RAW_JSON_ARTIFACTS, ttl=RAW_JSON_TTL)
 
-# Create a directory to store uploaded files
+# Incrementally edited OCR documents, kept while teachers work on them
+DOCUMENT_TTL = 4 * 3600
+MAX_DOCUMENTS = 500
+layout_documents = TTLStore(max_items=MAX_DOCUMENTS, ttl=DOCUMENT_TTL)
+
+# Uploaded documents, stored once per distinct content and removed after a
+# week unused (or least recently used first past 2 GB); see BlobStore.py
 UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+upload_store = BlobStore(os.path.join(UPLOAD_FOLDER, 'blobs'))
+
+# Requests larger than this are refused with 413 before the body is read
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Memory a request's non-file form fields (the OCR JSON box) may take; file
+# parts spool to a temporary file past 500 KB, so they never count against it
+MAX_FORM_MEMORY_BYTES = 16 * 1024 * 1024
+
+
+class UploadRequest(Request):
+    max_form_memory_size = MAX_FORM_MEMORY_BYTES
+
+
+app.request_class = UploadRequest
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -282,14 +321,19 @@ HTML_TEMPLATE = """
                 {% if results.tables and results.tables is mapping %}
                 {% for table_idx, table in results.tables.items() %}
                 {% if table is iterable %}
+                {% set spans = (results.table_spans or {}).get(table_idx, {}) %}
                 <h4>Table {{ table_idx }}</h4>
                 <div class="table-view">
                     <table>
                         {% for row in table %}
                         {% if row is iterable %}
+                        {% set row_idx = loop.index0 %}
                         <tr>
                             {% for cell in row %}
-                            <td>{{ cell }}</td>
+                            {% if cell is not none %}
+                            {% set span = spans.get(row_idx ~ ',' ~ loop.index0) %}
+                            <td{% if span %} rowspan="{{ span[0] }}" colspan="{{ span[1] }}"{% endif %}>{{ cell }}</td>
+                            {% endif %}
                             {% endfor %}
                         </tr>
                         {% endif %}
@@ -318,7 +362,11 @@ HTML_TEMPLATE = """
             
             <div id="json" class="tab-content">
                 <h3>Raw JSON Response</h3>
+                {% if results.raw_json %}
                 <pre>{{ results.raw_json }}</pre>
+                {% else %}
+                <pre id="raw-json" data-src="/raw_json/{{ results.raw_json_id }}">Loading...</pre>
+                {% endif %}
             </div>
         </div>
         {% endif %}
@@ -335,6 +383,11 @@ HTML_TEMPLATE = """
             // Show the selected tab content
             document.getElementById(tabName).classList.add('active');
             
+            // The raw JSON is only fetched the first time its tab is opened
+            if (tabName === 'json') {
+                loadRawJson();
+            }
+            
             // Update tab buttons
             var tabs = document.getElementsByClassName('tab');
             for (var i = 0; i < tabs.length; i++) {
@@ -350,6 +403,27 @@ HTML_TEMPLATE = """
             }
         }
         
+        function loadRawJson() {
+            var pre = document.getElementById('raw-json');
+            if (!pre || pre.dataset.loaded) {
+                return;
+            }
+            pre.dataset.loaded = 'true';
+            fetch(pre.dataset.src)
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error('Raw JSON is no longer available');
+                    }
+                    return response.json();
+                })
+                .then(function(data) {
+                    pre.textContent = JSON.stringify(data, null, 2);
+                })
+                .catch(function(error) {
+                    pre.textContent = error.message;
+                });
+        }
+        
         function toggleJsonExample() {
             var example = document.getElementById('json-example');
             if (example.style.display === 'none') {
@@ -364,53 +438,129 @@ HTML_TEMPLATE = """
 """
 
 def get_document_analysis_client():
-    """Create and return an Azure Form Recognizer Document Analysis client"""
-    credential = AzureKeyCredential(FORM_RECOGNIZER_KEY)
-    return DocumentAnalysisClient(endpoint=FORM_RECOGNIZER_ENDPOINT, credential=credential)
+    """
+    Return the process-wide Azure Form Recognizer Document Analysis client.
 
-def analyze_document(file_path):
-    """Analyze a document using Azure Form Recognizer"""
-    document_analysis_client = get_document_analysis_client()
+    The client is built once and sends its requests over the shared keep-alive
+    session from AzureSession.
+    """
+    def create_client():
+        credential = AzureKeyCredential(FORM_RECOGNIZER_KEY)
+        transport = RequestsTransport(session=get_session(), session_owner=False)
+        return DocumentAnalysisClient(endpoint=FORM_RECOGNIZER_ENDPOINT, credential=credential, transport=transport)
     
+    return get_sdk_client(('document-analysis', FORM_RECOGNIZER_ENDPOINT, FORM_RECOGNIZER_KEY), create_client)
+
+def analyze_document(file_path):
+    """
+    Analyze a document using Azure Form Recognizer.
+
+    Results are cached by document content, so analyzing the same bytes again
+    is served from the OCR cache without calling Azure.
+    """
     with open(file_path, "rb") as f:
-        poller = document_analysis_client.begin_analyze_document("prebuilt-document", f)
+        key = make_cache_key(f, FORM_RECOGNIZER_ENDPOINT, FORM_RECOGNIZER_MODEL)
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            return AnalyzeResult.from_dict(cached)
+        
+        document_analysis_client = get_document_analysis_client()
+        poller = document_analysis_client.begin_analyze_document(FORM_RECOGNIZER_MODEL, f)
         result = poller.result()
     
+    ocr_cache.set(key, result.to_dict())
     return result
 
-def process_form_recognizer_result(result):
-    """Process and structure the Form Recognizer analysis result"""
+def store_raw_json(source):
+    """
+    Keep an analysis result for the Raw JSON tab and return its artifact id.
+
+    Nothing is serialized here; the JSON is built on the first fetch of
+    /raw_json/<id>. `source` is a Form Recognizer result or a plain dict.
+    """
+    artifact_id = str(uuid.uuid4())
+    raw_json_artifacts.set(artifact_id, source)
+    return artifact_id
+
+def materialize_table(table):
+    """
+    Build a table's grid in one pass over its cells.
+
+    Returns (rows, spans). `rows` is a row_count x column_count grid of cell
+    text; positions covered by a cell spanning several rows or columns hold
+    None. `spans` maps "row,column" of each spanning cell to
+    [row_span, column_span].
+    """
+    rows = [[""] * table.column_count for _ in range(table.row_count)]
+    spans = {}
+    
+    for cell in table.cells:
+        row_idx, col_idx = cell.row_index, cell.column_index
+        row_span = getattr(cell, 'row_span', None) or 1
+        column_span = getattr(cell, 'column_span', None) or 1
+        
+        if row_span > 1 or column_span > 1:
+            spans[f"{row_idx},{col_idx}"] = [row_span, column_span]
+            for covered_row in range(row_idx, min(row_idx + row_span, table.row_count)):
+                for covered_col in range(col_idx, min(col_idx + column_span, table.column_count)):
+                    rows[covered_row][covered_col] = None
+        
+        rows[row_idx][col_idx] = cell.content
+    
+    return rows, spans
+
+def columnar_table(table):
+    """
+    Compact column-oriented form of a table: one list per cell attribute.
+
+    Only the cells that exist are stored, so sparse tables stay small.
+    """
+    columns = {
+        'row_count': table.row_count,
+        'column_count': table.column_count,
+        'row_index': [],
+        'column_index': [],
+        'row_span': [],
+        'column_span': [],
+        'content': []
+    }
+    for cell in table.cells:
+        columns['row_index'].append(cell.row_index)
+        columns['column_index'].append(cell.column_index)
+        columns['row_span'].append(getattr(cell, 'row_span', None) or 1)
+        columns['column_span'].append(getattr(cell, 'column_span', None) or 1)
+        columns['content'].append(cell.content)
+    return columns
+
+def process_form_recognizer_result(result, columnar_tables=False):
+    """
+    Process and structure the Form Recognizer analysis result
+
+    With `columnar_tables`, each table is also returned in the compact
+    column-oriented form under 'tables_columnar'.
+    """
     processed_result = {
-        'raw_json': json.dumps(result.to_dict(), indent=2),
+        'raw_json_id': store_raw_json(result),
         'document': [],
         'tables': {},
+        'table_spans': {},
         'paragraphs': []
     }
+    if columnar_tables:
+        processed_result['tables_columnar'] = {}
     
     # Extract tables
     for i, table in enumerate(result.tables):
-        table_data = []
-        for row_idx in range(table.row_count):
-            row_data = []
-            for col_idx in range(table.column_count):
-                # Find cells for this row and column
-                cell_content = ""
-                for cell in table.cells:
-                    if cell.row_index == row_idx and cell.column_index == col_idx:
-                        cell_content = cell.content
-                        break
-                row_data.append(cell_content)
-            table_data.append(row_data)
+        table_data, spans = materialize_table(table)
         processed_result['tables'][i+1] = table_data
+        processed_result['table_spans'][i+1] = spans
+        if columnar_tables:
+            processed_result['tables_columnar'][i+1] = columnar_table(table)
     
     # Extract paragraphs
     for paragraph in result.paragraphs:
         processed_result['paragraphs'].append(paragraph.content)
     
-    # Create a debug log of the available attributes and their types
-    result_dict = result.to_dict()
-    print(f"Available keys in result: {list(result_dict.keys())}")
-    
     # Approach based on document info found in paragraphs and spans
     current_section = None
     
@@ -476,79 +626,30 @@ def process_form_recognizer_result(result):
 def process_ocr_json(ocr_data):
     """
     Process existing OCR JSON data using Form Recognizer's layout capabilities
+
+    Accepts the `extracted_text` lines of /extract-text or the `word_data`
+    words of /word-level. Items are grouped into lines and put in reading
+    order by ReadingOrder.order_lines (through LayoutDocument.PageLayout).
     """
     try:
-        # Get the extracted_text from the OCR data
-        extracted_text = ocr_data.get('extracted_text', [])
+        # Get the extracted_text (or word_data) from the OCR data
+        extracted_text = ocr_data.get('extracted_text', ocr_data.get('word_data', []))
         
         # Verify extracted_text is a list before proceeding
         if not isinstance(extracted_text, list):
             raise ValueError("'extracted_text' must be a list")
         
-        # Sort by Y coordinate to reconstruct reading order
-        sorted_text = sorted(extracted_text, key=lambda x: x['boundingBox'][1])
-        
         processed_result = {
-            'raw_json': json.dumps(ocr_data, indent=2),
+            'raw_json_id': store_raw_json(ocr_data),
             'document': [],
             'paragraphs': [],
             'tables': {}
         }
         
-        # Group text into paragraphs based on Y-coordinates
-        current_para = []
-        current_y = None
-        y_threshold = 20  # Adjust based on document line spacing
-        
-        for item in sorted_text:
-            text = item.get('text', '').strip()
-            y_coord = item['boundingBox'][1] if len(item.get('boundingBox', [])) > 1 else 0
-            
-            if not text:
-                continue
-                
-            if current_y is None or abs(y_coord - current_y) <= y_threshold:
-                current_para.append(text)
-                current_y = y_coord
-            else:
-                if current_para:
-                    para_text = " ".join(current_para)
-                    processed_result['paragraphs'].append(para_text)
-                    
-                    # Add to document structure
-                    if re.match(r'^\d+\.', para_text):
-                        processed_result['document'].append({
-                            'type': 'Question',
-                            'content': para_text,
-                            'items': []  # Ensure items is always a list
-                        })
-                    else:
-                        processed_result['document'].append({
-                            'type': 'Text',
-                            'content': para_text,
-                            'items': []  # Ensure items is always a list
-                        })
-                        
-                current_para = [text]
-                current_y = y_coord
-        
-        # Add the last paragraph
-        if current_para:
-            para_text = " ".join(current_para)
-            processed_result['paragraphs'].append(para_text)
-            
-            if re.match(r'^\d+\.', para_text):
-                processed_result['document'].append({
-                    'type': 'Question',
-                    'content': para_text,
-                    'items': []  # Ensure items is always a list
-                })
-            else:
-                processed_result['document'].append({
-                    'type': 'Text',
-                    'content': para_text,
-                    'items': []  # Ensure items is always a list
-                })
+        # Each visual line, in reading order, becomes one paragraph
+        page = PageLayout(extracted_text)
+        processed_result['paragraphs'] = page.paragraphs
+        processed_result['document'] = [ocr_document_entry(para_text) for para_text in page.paragraphs]
         
         return processed_result
     except Exception as e:
@@ -562,49 +663,158 @@ def process_ocr_json(ocr_data):
             'tables': {}
         }
 
+@app.route('/raw_json/<artifact_id>', methods=['GET'])
+def raw_json(artifact_id):
+    """Serve the compact raw JSON of an analysis, serializing it on first request"""
+    source = raw_json_artifacts.get(artifact_id)
+    if source is None:
+        return jsonify({'error': 'Unknown or expired raw JSON artifact'}), 404
+    
+    if not isinstance(source, str):
+        data = source.to_dict() if hasattr(source, 'to_dict') else source
+        source = json.dumps(data, separators=(',', ':'))
+        # Keep the serialized form so later fetches skip the work
+        raw_json_artifacts.set(artifact_id, source)
+    
+    return Response(source, mimetype='application/json')
+
+@app.route('/documents', methods=['POST'])
+def create_document():
+    """
+    Create an incrementally editable OCR document.
+
+    JSON body: optional `pages`, a list of {"page": n, "items": [...]}, or an
+    `extracted_text` / `word_data` list that becomes page 1. Returns the
+    document id and the full initial layout.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    if 'pages' in data:
+        pages = data['pages']
+    elif 'extracted_text' in data or 'word_data' in data:
+        pages = [{'page': 1, 'items': data.get('extracted_text', data.get('word_data'))}]
+    else:
+        pages = []
+    
+    document = LayoutDocument()
+    try:
+        if not isinstance(pages, list):
+            raise DeltaError("'pages' must be a list")
+        document.apply([dict(page, op='set_page') for page in pages])
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    document_id = str(uuid.uuid4())
+    layout_documents.set(document_id, document)
+    return jsonify(dict(document.to_dict(), document_id=document_id)), 201
+
+@app.route('/documents/<document_id>', methods=['GET'])
+def get_document(document_id):
+    """Return the current layout of an OCR document"""
+    document = layout_documents.get(document_id)
+    if document is None:
+        return jsonify({'error': 'Unknown or expired document'}), 404
+    with document.lock:
+        return jsonify(document.to_dict())
+
+@app.route('/documents/<document_id>/deltas', methods=['POST'])
+def apply_document_deltas(document_id):
+    """
+    Apply page- or word-level deltas to an OCR document.
+
+    JSON body: {"deltas": [...]} (see LayoutDocument for the delta ops).
+    Only the changed pages or paragraphs are recomputed, and the response
+    is the diff of `paragraphs` / `document`, not the whole document.
+    """
+    document = layout_documents.get(document_id)
+    if document is None:
+        return jsonify({'error': 'Unknown or expired document'}), 404
+    
+    deltas = (request.get_json(silent=True) or {}).get('deltas')
+    if not isinstance(deltas, list):
+        return jsonify({'error': "'deltas' must be a list"}), 400
+    
+    try:
+        diff = document.apply(deltas)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Touch the document so its TTL runs from the last edit
+    layout_documents.set(document_id, document)
+    return jsonify(diff)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the OCR result cache"""
+    return jsonify(ocr_cache.stats())
+
+@app.route('/upload-store/stats', methods=['GET'])
+def upload_store_stats():
+    """Blob count, size, deduplication and GC counters of the upload store"""
+    return jsonify(upload_store.stats())
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    message = f"Upload too large: the limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    return render_template_string(HTML_TEMPLATE, error=message), 413
+
 @app.route('/')
 def index():
     return render_template_string(HTML_TEMPLATE)
 
+def flag(name):
+    """True when the request's `name` parameter is set to 1, true or yes"""
+    return request.values.get(name, '').lower() in ('1', 'true', 'yes')
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'document' not in request.files:
-        return render_template_string(HTML_TEMPLATE, error="No file selected")
+    """
+    Analyze a document with Form Recognizer and show the results page.
+
+    Pass `format=json` to get the processed result as JSON instead, and
+    `columnar_tables=1` to include each table in its compact column-oriented
+    form under 'tables_columnar' there.
+    """
+    as_json = request.values.get('format') == 'json'
+    
+    def error(message, status):
+        if as_json:
+            return jsonify({'error': message}), status
+        # The page shows errors in its body; only an oversized upload changes the status
+        return render_template_string(HTML_TEMPLATE, error=message), 413 if status == 413 else 200
+    
+    if 'document' not in request.files or request.files['document'].filename == '':
+        return error("No file selected", 400)
     
     file = request.files['document']
-    if file.filename == '':
-        return render_template_string(HTML_TEMPLATE, error="No file selected")
     
     try:
-        # Create a unique filename
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        
-        # Save the file
-        file.save(file_path)
+        # Stream the upload into the content-addressed store; re-uploads of
+        # the same document reuse the stored copy
+        digest = upload_store.put(file.stream, max_size=MAX_UPLOAD_BYTES)
         
         # Analyze with Form Recognizer
-        result = analyze_document(file_path)
+        result = analyze_document(upload_store.path(digest))
         
         # Process the results
-        processed_result = process_form_recognizer_result(result)
-        
-        # Clean up the file after processing (optional)
-        # os.remove(file_path)
+        processed_result = process_form_recognizer_result(
+            result, columnar_tables=as_json and flag('columnar_tables'))
         
+        if as_json:
+            return jsonify(processed_result)
         return render_template_string(
             HTML_TEMPLATE, 
             results=processed_result,
             success_message=f"Successfully analyzed document: {file.filename}"
         )
     
+    except BlobTooLarge as e:
+        return error(str(e), 413)
+    
     except Exception as e:
         error_details = traceback.format_exc()
         print(f"Error: {str(e)}\n{error_details}")
-        return render_template_string(
-            HTML_TEMPLATE, 
-            error=f"Error analyzing document: {str(e)}"
-        )
+        return error(f"Error analyzing document: {str(e)}", 500)
 
 @app.route('/process_json', methods=['POST'])
 def process_json():
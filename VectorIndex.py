@@ -0,0 +1,396 @@
+"""
+Approximate nearest-neighbour index over embeddings (IVF, pure NumPy).
+
+Vectors are L2-normalized, so inner product is cosine similarity. After
+`train()`, k-means centroids split the vectors into inverted lists and a
+query only scores the vectors in its `nprobe` closest lists instead of the
+whole bank. Before training (or for small banks) search is exact. Vectors
+can be added and removed at any time; the index saves to a single .npz file.
+
+SharedVectorIndex keeps one index consistent across the processes of a
+pre-forking server: changes are appended to a journal next to the .npz
+under a file lock, every process replays the entries it has not seen, and
+the journal is folded into a new snapshot in the background.
+"""
+import base64
+import contextlib
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: journal writes are only serialized within a process
+    fcntl = None
+
+import numpy as np
+
+# Lists probed per query; more lists means better recall and slower queries
+DEFAULT_NPROBE = 8
+
+# Banks smaller than this are searched exactly; add() trains the index once
+# the bank reaches it
+AUTO_TRAIN_SIZE = 1024
+
+KMEANS_ITERATIONS = 10
+
+# Removed vectors stay in the arrays as tombstones until they make up this
+# fraction of the index
+COMPACT_FRACTION = 0.25
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32).reshape(len(matrix), -1)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means: centroids are re-normalized after every update"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        # Restart empty lists from random vectors rather than losing them
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    IVF index of string ids -> unit vectors, each with optional JSON metadata.
+
+    All methods are thread-safe.
+    """
+
+    def __init__(self, dim=None, nprobe=DEFAULT_NPROBE):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.vectors = np.zeros((0, dim or 0), dtype=np.float32)
+        self.ids = []
+        self.metadata = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_of = {}
+        self.centroids = None
+        self.assignment = np.zeros(0, dtype=np.intp)
+        self._lists = None
+        # Snapshot generation this index was loaded from (see SharedVectorIndex)
+        self.generation = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _check_dim(self, vectors):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.vectors = self.vectors.reshape(0, self.dim)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {vectors.shape[1]} dimensions; the index has {self.dim}")
+
+    def add(self, ids, vectors, metadata=None):
+        """Add (or replace) vectors under the given ids"""
+        vectors = normalize_rows(vectors)
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        if not len(ids) == len(vectors) == len(metadata):
+            raise ValueError('ids, vectors and metadata must have the same length')
+        if len(set(ids)) != len(ids):
+            raise ValueError('ids must be unique')
+        with self.lock:
+            self._check_dim(vectors)
+            self.remove([i for i in ids if i in self.row_of])
+            start = len(self.ids)
+            self.vectors = np.concatenate([self.vectors, vectors])
+            self.ids.extend(ids)
+            self.metadata.extend(metadata)
+            self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            self.row_of.update((vector_id, start + n) for n, vector_id in enumerate(ids))
+            if self.trained:
+                self.assignment = np.concatenate([self.assignment, (vectors @ self.centroids.T).argmax(axis=1)])
+                self._lists = None
+            elif len(self) >= AUTO_TRAIN_SIZE:
+                self.train()
+
+    def remove(self, ids):
+        """Remove ids from the index; unknown ids are ignored. Returns the number removed"""
+        with self.lock:
+            rows = [self.row_of.pop(i) for i in ids if i in self.row_of]
+            self.alive[rows] = False
+            self._lists = None
+            if len(self.ids) and (len(self.ids) - len(self)) / len(self.ids) > COMPACT_FRACTION:
+                self._compact()
+            return len(rows)
+
+    def _compact(self):
+        keep = np.nonzero(self.alive)[0]
+        self.vectors = self.vectors[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        if self.trained:
+            self.assignment = self.assignment[keep]
+        self.row_of = {vector_id: row for row, vector_id in enumerate(self.ids)}
+
+    def train(self, n_lists=None):
+        """Cluster the current vectors into `n_lists` inverted lists (default sqrt(size))"""
+        with self.lock:
+            self._compact()
+            n_lists = n_lists or max(1, int(np.sqrt(len(self))))
+            if len(self) < n_lists:
+                raise ValueError(f"Need at least {n_lists} vectors to train {n_lists} lists")
+            self.centroids = kmeans(self.vectors, n_lists)
+            self.assignment = (self.vectors @ self.centroids.T).argmax(axis=1)
+            self._lists = None
+
+    def _inverted_lists(self):
+        """Live rows of each list, rebuilt after adds and removes"""
+        if self._lists is None:
+            live = np.nonzero(self.alive)[0]
+            live = live[np.argsort(self.assignment[live], kind='stable')]
+            counts = np.bincount(self.assignment[live], minlength=len(self.centroids))
+            self._lists = np.split(live, np.cumsum(counts)[:-1])
+        return self._lists
+
+    def search(self, queries, k=10, nprobe=None, exact=False):
+        """
+        Top-k vectors for each query, as lists of (id, score, metadata).
+
+        `exact=True` (or an untrained index) scores every vector.
+        """
+        if nprobe is not None and (not isinstance(nprobe, (int, np.integer)) or nprobe < 1):
+            raise ValueError(f"nprobe must be a positive integer, not {nprobe!r}")
+        queries = normalize_rows(queries)
+        with self.lock:
+            if not len(self):
+                return [[] for _ in queries]
+            if exact or not self.trained:
+                candidates = [np.nonzero(self.alive)[0]] * len(queries)
+            else:
+                lists = self._inverted_lists()
+                nprobe = min(self.nprobe if nprobe is None else nprobe, len(lists))
+                probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+                candidates = [np.concatenate([lists[p] for p in probe]) for probe in probes]
+
+            results = []
+            for query, rows in zip(queries, candidates):
+                scores = self.vectors[rows] @ query
+                top = np.argsort(-scores, kind='stable')[:k] if len(rows) <= k else \
+                    np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top], kind='stable')]
+                results.append([(self.ids[rows[i]], float(scores[i]), self.metadata[rows[i]]) for i in top])
+            return results
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': len(self),
+                'tombstones': len(self.ids) - len(self),
+                'dim': self.dim,
+                'trained': self.trained,
+                'lists': 0 if self.centroids is None else len(self.centroids),
+                'nprobe': self.nprobe
+            }
+
+    def save(self, path, generation=0):
+        """Write the index to `path` (.npz), atomically"""
+        with self.lock:
+            self._compact()
+            arrays = {
+                'vectors': self.vectors,
+                'header': np.array(json.dumps({'dim': self.dim, 'nprobe': self.nprobe, 'ids': self.ids,
+                                               'metadata': self.metadata, 'generation': generation}))
+            }
+            if self.trained:
+                arrays['centroids'] = self.centroids
+                arrays['assignment'] = self.assignment
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(str(data['header']))
+            index = cls(header['dim'], header['nprobe'])
+            index.vectors = data['vectors']
+            if 'centroids' in data:
+                index.centroids = data['centroids']
+                index.assignment = data['assignment']
+        index.ids = header['ids']
+        index.metadata = header['metadata']
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index.row_of = {vector_id: row for row, vector_id in enumerate(index.ids)}
+        index.generation = header.get('generation', 0)
+        return index
+
+
+# Seconds after a change before the journal is folded into a new snapshot;
+# further changes in that window are folded in by the same rewrite
+SNAPSHOT_DELAY = 30
+
+
+def _write_atomically(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SharedVectorIndex:
+    """
+    A VectorIndex persisted as `path` (.npz snapshot) plus `path`.journal,
+    safe to share between processes.
+
+    add() and remove() append one journal line each instead of rewriting the
+    snapshot. Every call first replays journal lines written by other
+    processes, so all workers answer from the same index. The journal starts
+    with the generation of the snapshot it extends; snapshot() writes
+    generation + 1 and starts an empty journal, and runs SNAPSHOT_DELAY
+    seconds after a change, in a background thread.
+    """
+
+    def __init__(self, path, snapshot_delay=SNAPSHOT_DELAY):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock_path = path + '.lock'
+        self.snapshot_delay = snapshot_delay
+        self.index = VectorIndex()
+        self.index.generation = -1
+        self._offset = 0
+        self._journal_id = None
+        self._timer = None
+        self._lock = threading.RLock()
+        with self._locked():
+            self._sync()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive lock on the index files, across processes and the threads of this one"""
+        with self._lock, open(self.lock_path, 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _stat_id(self):
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _sync(self):
+        """Catch up with the files; the caller holds the file lock"""
+        snapshot_generation = -1
+        if os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as data:
+                snapshot_generation = json.loads(str(data['header'])).get('generation', 0)
+
+        journal_generation = None
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as f:
+                first = f.readline()
+            journal_generation = json.loads(first)['generation'] if first.strip() else None
+        if journal_generation is None or journal_generation < snapshot_generation:
+            # No journal yet, or one already folded into the snapshot by an interrupted snapshot()
+            journal_generation = max(snapshot_generation, 0)
+            _write_atomically(self.journal_path, json.dumps({'generation': journal_generation}).encode() + b'\n')
+
+        if self.index.generation != journal_generation:
+            if os.path.exists(self.path):
+                self.index = VectorIndex.load(self.path)
+            else:
+                self.index = VectorIndex()
+                self.index.generation = journal_generation
+            self._offset = 0
+
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            if self._offset == 0:
+                f.readline()
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._replay(json.loads(line))
+                self._offset = f.tell()
+            if self._offset == 0:
+                self._offset = f.tell()
+        self._journal_id = self._stat_id()
+
+    def _replay(self, entry):
+        if entry['op'] == 'add':
+            vectors = np.frombuffer(base64.b64decode(entry['vectors']), dtype=np.float32)
+            self.index.add(entry['ids'], vectors.reshape(len(entry['ids']), -1), entry['metadata'])
+        else:
+            self.index.remove(entry['ids'])
+
+    def _append(self, entry):
+        with open(self.journal_path, 'ab') as f:
+            f.write(json.dumps(entry).encode() + b'\n')
+            self._offset = f.tell()
+        self._journal_id = self._stat_id()
+        self._schedule_snapshot()
+
+    def _fresh(self):
+        """Replay other processes' changes if the journal changed since this process last looked"""
+        if self._stat_id() != self._journal_id:
+            with self._locked():
+                self._sync()
+        return self.index
+
+    def add(self, ids, vectors, metadata=None):
+        vectors = normalize_rows(vectors)
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        with self._locked():
+            self._sync()
+            self.index.add(ids, vectors, metadata)
+            self._append({'op': 'add', 'ids': list(ids), 'metadata': list(metadata),
+                          'vectors': base64.b64encode(vectors.tobytes()).decode('ascii')})
+
+    def remove(self, ids):
+        with self._locked():
+            self._sync()
+            removed = self.index.remove(ids)
+            if removed:
+                self._append({'op': 'remove', 'ids': list(ids)})
+            return removed
+
+    def search(self, queries, k=10, nprobe=None, exact=False):
+        return self._fresh().search(queries, k, nprobe=nprobe, exact=exact)
+
+    def stats(self):
+        return self._fresh().stats()
+
+    def _schedule_snapshot(self):
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Timer(self.snapshot_delay, self.snapshot)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def snapshot(self):
+        """Fold the journal into a new .npz snapshot and start an empty journal"""
+        with self._locked():
+            self._sync()
+            generation = self.index.generation + 1
+            self.index.save(self.path, generation)
+            _write_atomically(self.journal_path, json.dumps({'generation': generation}).encode() + b'\n')
+            self.index.generation = generation
+            self._offset = 0
+            self._sync()
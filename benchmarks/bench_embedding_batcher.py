@@ -0,0 +1,101 @@
+"""
+Benchmark: per-request encode vs MicroBatcher under concurrent load.
+
+By default the encoder is a cost model of a CPU transformer: a fixed cost per
+call plus a cost per text, serialized like a model that saturates the CPU.
+Pass --real to use SentenceTransformer('all-MiniLM-L6-v2') instead.
+
+    python benchmarks/bench_embedding_batcher.py --clients 32 --requests 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EmbeddingBatcher import MicroBatcher  # noqa: E402
+
+RUBRIC = {
+    "definition": "Resources are everything available in our environment that can satisfy our needs.",
+    "causes": ["Deforestation", "Over irrigation", "Mining", "Overgrazing"],
+    "effects": ["Soil erosion", "Land degradation", "Loss of fertility"],
+}
+
+
+class CostModelEncoder:
+    """Serialized encoder costing `call_ms` per call plus `item_ms` per text"""
+
+    def __init__(self, call_ms, item_ms, dim=384):
+        self.call = call_ms / 1000
+        self.item = item_ms / 1000
+        self.dim = dim
+        self.lock = threading.Lock()
+
+    def encode(self, texts):
+        with self.lock:
+            time.sleep(self.call + self.item * len(texts))
+        return np.zeros((len(texts), self.dim), dtype=np.float32)
+
+
+def run(encode, clients, requests_per_client):
+    texts = [RUBRIC["definition"]] + RUBRIC["causes"] + RUBRIC["effects"]
+    latencies = []
+    lock = threading.Lock()
+
+    def client(_):
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            encode(texts)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'texts_per_s': len(latencies) * len(texts) / wall,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--call-ms', type=float, default=8.0, help='Cost model: fixed cost per encode call')
+    parser.add_argument('--item-ms', type=float, default=0.4, help='Cost model: cost per text')
+    parser.add_argument('--real', action='store_true', help='Use the real MiniLM model')
+    args = parser.parse_args()
+
+    if args.real:
+        from sentence_transformers import SentenceTransformer
+        encode_fn = SentenceTransformer('all-MiniLM-L6-v2').encode
+    else:
+        encode_fn = CostModelEncoder(args.call_ms, args.item_ms).encode
+
+    print(f"{'clients':>8}{'mode':>10}{'texts/s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for clients in args.clients:
+        direct = run(encode_fn, clients, args.requests)
+        batcher = MicroBatcher(encode_fn, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+        batched = run(batcher.encode, clients, args.requests)
+        for mode, result in (('direct', direct), ('batched', batched)):
+            print(f"{clients:>8}{mode:>10}{result['texts_per_s']:>10.0f}"
+                  f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}")
+        print(f"{'':>8}{'':>10}mean batch {batcher.stats()['mean_batch_size']:.1f} texts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: /generate-embeddings response size and serialize/parse time for
+JSON vs raw float32/float16 vs .npy.
+
+Uses random 384-dim embeddings (the size of all-MiniLM-L6-v2), so it runs
+without the model. JSON is encoded the way the endpoint does it: `.tolist()`
+per vector plus json.dumps.
+
+    python benchmarks/bench_embedding_format.py --rows 8 64 512
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from EmbeddingFormat import NPY_MIMETYPE, RAW_MIMETYPE, decode_embeddings, embedding_layout, encode_embeddings  # noqa: E402
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def formats(embeddings, causes, effects):
+    """name -> (encode, decode) callables for one embedding matrix"""
+    texts = ['x'] * len(embeddings)
+
+    def json_encode():
+        return json.dumps({
+            'definition': {'text': texts[0], 'embedding': embeddings[0].tolist()},
+            'causes': [{'text': texts[1 + i], 'embedding': embeddings[1 + i].tolist()} for i in range(causes)],
+            'effects': [{'text': texts[1 + causes + j], 'embedding': embeddings[1 + causes + j].tolist()}
+                        for j in range(effects)],
+        })
+
+    def json_decode(body):
+        data = json.loads(body)
+        return np.array([data['definition']['embedding']] +
+                        [item['embedding'] for item in data['causes'] + data['effects']], dtype=np.float32)
+
+    result = {'json': (json_encode, json_decode)}
+    for name, mimetype, dtype in (('float32', RAW_MIMETYPE, 'float32'), ('float16', RAW_MIMETYPE, 'float16'),
+                                  ('npy', NPY_MIMETYPE, 'float32')):
+        layout = embedding_layout(causes, effects, dtype, embeddings.shape[1])
+        result[name] = (lambda m=mimetype, d=dtype: encode_embeddings(embeddings, m, d),
+                        lambda body, m=mimetype, lay=layout: decode_embeddings(body, m, lay))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[8, 64, 512], help='Texts per response')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>6}{'format':>9}{'bytes':>10}{'vs json':>9}{'encode ms':>11}{'decode ms':>11}")
+    for rows in args.rows:
+        embeddings = rng.standard_normal((rows, args.dim)).astype(np.float32)
+        causes = (rows - 1) // 2
+        effects = rows - 1 - causes
+        json_size = None
+        for name, (encode, decode) in formats(embeddings, causes, effects).items():
+            body = encode()
+            if isinstance(body, str):
+                body = body.encode()
+            json_size = json_size or len(body)
+            encode_ms = best_of(encode, args.repeat) * 1000
+            decode_ms = best_of(lambda: decode(body), args.repeat) * 1000
+            print(f"{rows:>6}{name:>9}{len(body):>10}{len(body) / json_size:>9.2f}"
+                  f"{encode_ms:>11.3f}{decode_ms:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
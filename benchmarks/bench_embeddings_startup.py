@@ -0,0 +1,112 @@
+"""
+Benchmark: embedding-service worker startup, per-worker model load vs a
+model loaded once in the parent and shared copy-on-write by forked workers
+(what embeddings_gunicorn.py does).
+
+For each mode, N workers are forked; each reports how long /health took to
+answer and how long the first /generate-embeddings request took to succeed
+(time-to-first-request, from the fork). While all workers are alive, their
+RSS and PSS (proportional set size: shared pages split between sharers) are
+read from /proc, so PSS shows what each worker really adds. Linux only.
+
+    python benchmarks/bench_embeddings_startup.py --workers 4
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RUBRIC = {
+    "definition": "Resources are everything available in our environment that can satisfy our needs.",
+    "causes": ["Deforestation", "Mining"],
+    "effects": ["Soil erosion"],
+}
+
+
+def memory_kb(pid):
+    """RSS and PSS of a process in kB, from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name.lower()] = int(rest.split()[0])
+    return values
+
+
+def worker(forked_at, report_fd, release_fd):
+    import Embeddings
+    client = Embeddings.app.test_client()
+
+    health = client.get('/health')
+    health_s = time.perf_counter() - forked_at
+    response = client.post('/generate-embeddings', json=RUBRIC)
+    first_request_s = time.perf_counter() - forked_at
+    assert health.status_code == 200 and response.status_code == 200
+
+    os.write(report_fd, (json.dumps({'pid': os.getpid(), 'health_s': health_s,
+                                     'first_request_s': first_request_s}) + '\n').encode())
+    # Stay alive until the parent has measured every worker
+    os.read(release_fd, 1)
+    os._exit(0)
+
+
+def run(mode, workers):
+    if mode == 'shared':
+        import Embeddings
+        Embeddings.get_model()
+        gc.freeze()
+
+    report_r, report_w = os.pipe()
+    release_r, release_w = os.pipe()
+    pids = []
+    for _ in range(workers):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            worker(forked_at, report_w, release_r)
+        pids.append(pid)
+
+    reports = []
+    with os.fdopen(report_r) as lines:
+        while len(reports) < workers:
+            reports.append(json.loads(lines.readline()))
+    for report in reports:
+        report.update(memory_kb(report['pid']))
+
+    os.write(release_w, b'x' * workers)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=['per-worker', 'shared'], help='Run one mode (default: both, in subprocesses)')
+    args = parser.parse_args()
+
+    if args.mode is None:
+        # Each mode in a fresh interpreter, so the shared run's parent model
+        # cannot leak into the per-worker run
+        import subprocess
+        for mode in ('per-worker', 'shared'):
+            subprocess.run([sys.executable, __file__, '--workers', str(args.workers), '--mode', mode], check=True)
+        return
+
+    reports = run(args.mode, args.workers)
+    print(f"{args.mode}: {args.workers} workers")
+    print(f"{'pid':>8}{'health ms':>11}{'first req s':>13}{'RSS MB':>9}{'PSS MB':>9}")
+    for report in reports:
+        print(f"{report['pid']:>8}{report['health_s'] * 1000:>11.1f}{report['first_request_s']:>13.2f}"
+              f"{report['rss'] / 1024:>9.0f}{report['pss'] / 1024:>9.0f}")
+    print(f"{'total':>8}{'':>24}{sum(r['rss'] for r in reports) / 1024:>9.0f}"
+          f"{sum(r['pss'] for r in reports) / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
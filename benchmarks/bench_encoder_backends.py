@@ -0,0 +1,78 @@
+"""
+Parity check and benchmark for the encoder backends in EncoderBackends.
+
+Every backend encodes the same texts: lines of words rebuilt from
+Sample.json (real OCR'd answer text) plus rubric-style phrases. Drift is
+1 - cosine similarity to the torch backend's embedding of the same text;
+the script exits non-zero if any backend's largest drift exceeds its bound,
+so it doubles as the parity test. Throughput is measured per backend and
+thread count.
+
+    python benchmarks/bench_encoder_backends.py --backends torch int8 onnx --threads 1 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from EncoderBackends import BACKENDS, MAX_DRIFT, cosine_drift, create_encoder  # noqa: E402
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+RUBRIC_TEXTS = [
+    "Resources are everything available in our environment that can satisfy our needs.",
+    "Deforestation", "Over irrigation", "Mining", "Overgrazing",
+    "Soil erosion", "Land degradation", "Loss of soil fertility",
+    "Conservation of resources is necessary for sustainable development.",
+]
+
+
+def sample_texts(words_per_line=8):
+    """Runs of words from Sample.json in reading order, as answer-like text"""
+    with open(os.path.join(ROOT, 'Sample.json')) as f:
+        words = [word['text'] for word in json.load(f)['word_data']]
+    return [' '.join(words[i:i + words_per_line]) for i in range(0, len(words), words_per_line)]
+
+
+def throughput(encoder, texts, repeat):
+    encoder.encode(texts[:8])
+    best = min(_timed(encoder, texts) for _ in range(repeat))
+    return len(texts) / best
+
+
+def _timed(encoder, texts):
+    start = time.perf_counter()
+    encoder.encode(texts)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    texts = RUBRIC_TEXTS + sample_texts()
+    reference = create_encoder('torch', MODEL_NAME).encode(texts)
+    print(f"{len(texts)} texts")
+    print(f"{'backend':>8}{'threads':>9}{'texts/s':>10}{'max drift':>12}{'mean drift':>12}{'parity':>8}")
+
+    failed = False
+    for backend in args.backends:
+        for threads in args.threads:
+            encoder = create_encoder(backend, MODEL_NAME, threads)
+            drift = cosine_drift(reference, encoder.encode(texts))
+            ok = drift.max() <= MAX_DRIFT[backend]
+            failed = failed or not ok
+            print(f"{backend:>8}{threads:>9}{throughput(encoder, texts, args.repeat):>10.0f}"
+                  f"{drift.max():>12.2e}{drift.mean():>12.2e}{'ok' if ok else 'FAIL':>8}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
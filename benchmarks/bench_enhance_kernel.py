@@ -0,0 +1,111 @@
+"""
+Benchmark and equivalence check: the fused NumPy enhancement kernel
+(EnhanceKernel) vs the original chain of PIL passes (enhance_image_pil).
+
+Pages are A4 at 100, 200, 300 and 600 DPI, made by scaling a scan from
+uploads/. For each size the outputs of both are compared, and each timing
+runs in a fresh interpreter, which reports the best per-page time and how
+far peak RSS rose above the RSS with just the page loaded. The script exits
+non-zero if the outputs differ by more than the tolerance or the kernel's
+peak is above the PIL chain's.
+
+    python benchmarks/bench_enhance_kernel.py --dpi 100 200 300 600 --mode RGB
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from EnhanceKernel import MAX_MEAN_DIFF, MAX_P99_DIFF, FusedEnhancer  # noqa: E402
+from PdfPipeline import enhance_image_pil  # noqa: E402
+
+A4_INCHES = (8.27, 11.69)
+
+
+def a4_page(dpi, mode):
+    scans = sorted(glob.glob(os.path.join(ROOT, 'uploads', '*.jpg')))
+    if not scans:
+        sys.exit('No scans in uploads/ to build a test page from')
+    size = (round(A4_INCHES[0] * dpi), round(A4_INCHES[1] * dpi))
+    return Image.open(scans[0]).convert(mode).resize(size, Image.BICUBIC)
+
+
+def status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss():
+    """Reset VmHWM (peak RSS) to the current RSS; Linux only"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def measure(method, dpi, mode, repeat):
+    """Runs in a fresh interpreter: best time per page and peak RSS growth"""
+    page = a4_page(dpi, mode)
+    reset_peak_rss()
+    baseline = status_mb('VmRSS')
+    enhance = enhance_image_pil if method == 'pil' else FusedEnhancer()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        enhance(page)
+        times.append(time.perf_counter() - start)
+    peak = status_mb('VmHWM')
+    print(f"{dpi:>5}{method:>7}{f'{page.width}x{page.height}':>12}{min(times) * 1000:>10.0f}"
+          f"{peak - baseline:>13.1f}", flush=True)
+
+
+def check_equivalence(dpi, mode):
+    page = a4_page(dpi, mode)
+    diff = np.abs(np.asarray(enhance_image_pil(page), np.int16) - np.asarray(FusedEnhancer()(page), np.int16))
+    mean, p99 = diff.mean(), np.percentile(diff, 99)
+    ok = mean <= MAX_MEAN_DIFF and p99 <= MAX_P99_DIFF
+    print(f"{dpi:>5} DPI: mean |diff| {mean:.3f}, p99 {p99:.0f}, max {diff.max()} levels - {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dpi', type=int, nargs='+', default=[100, 200, 300, 600])
+    parser.add_argument('--mode', choices=['RGB', 'L'], default='RGB')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--method', choices=['pil', 'fused'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.method:
+        measure(args.method, args.dpi[0], args.mode, args.repeat)
+        return
+
+    print('Equivalence with the PIL chain')
+    ok = all([check_equivalence(dpi, args.mode) for dpi in args.dpi])
+
+    print(f"\n{'dpi':>5}{'method':>7}{'size':>12}{'ms/page':>10}{'peak +MB':>13}")
+    for dpi in args.dpi:
+        peaks = {}
+        for method in ('pil', 'fused'):
+            row = subprocess.run([sys.executable, __file__, '--method', method, '--dpi', str(dpi),
+                                  '--mode', args.mode, '--repeat', str(args.repeat)],
+                                 check=True, capture_output=True, text=True).stdout
+            print(row, end='')
+            peaks[method] = float(row.split()[-1])
+        if peaks['fused'] > peaks['pil']:
+            print(f"{dpi:>5} DPI: fused peak above the PIL chain's - FAIL")
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
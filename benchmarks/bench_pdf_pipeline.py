@@ -0,0 +1,85 @@
+"""
+Benchmark: PDF rasterization + enhancement, all pages at once on one core
+(the old convert_pdf_to_enhanced_images) vs the PdfPipeline process pool.
+
+The test PDF is built from the scans in uploads/, repeated to --pages pages.
+Reports pages/s and peak RSS, for this process and for the largest worker
+(ru_maxrss of the children). Needs poppler's pdftoppm on the PATH.
+
+    python benchmarks/bench_pdf_pipeline.py --pages 24 --workers 1 2 4
+"""
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image  # noqa: E402
+
+from PdfPipeline import enhance_image_pil, iter_enhanced_pages, pdf_page_count, rasterize_page  # noqa: E402
+
+
+def build_pdf(path, pages):
+    scans = sorted(glob.glob(os.path.join(ROOT, 'uploads', '*.jpg')))
+    if not scans:
+        sys.exit('No scans in uploads/ to build a test PDF from')
+    images = [Image.open(scans[i % len(scans)]).convert('RGB') for i in range(pages)]
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=150)
+
+
+def all_at_once(pdf_path, output_dir, dpi):
+    """The old approach: render every page, keep them all, then enhance in a loop"""
+    images = [rasterize_page(pdf_path, page, dpi) for page in range(1, pdf_page_count(pdf_path) + 1)]
+    for i, image in enumerate(images):
+        enhance_image_pil(image).save(os.path.join(output_dir, f'page_{i + 1}.png'), format='PNG')
+
+
+def run_mode(args):
+    """One measurement in a fresh interpreter, so ru_maxrss is not carried over"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        if args.mode == 'all-at-once':
+            all_at_once(args.pdf, output_dir, args.dpi)
+        else:
+            for _ in iter_enhanced_pages(args.pdf, output_dir, args.dpi, workers=args.run_workers):
+                pass
+        elapsed = time.perf_counter() - start
+    pages = pdf_page_count(args.pdf)
+    self_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    child_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"{args.mode:>14}{args.run_workers or 1:>9}{pages / elapsed:>9.2f}{self_mb:>10.0f}{child_mb:>11.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=24)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument('--mode', choices=['all-at-once', 'pipeline'], help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    parser.add_argument('--run-workers', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'bench.pdf')
+        build_pdf(pdf_path, args.pages)
+        print(f"{args.pages} pages at {args.dpi} DPI")
+        print(f"{'mode':>14}{'workers':>9}{'pages/s':>9}{'self MB':>10}{'worker MB':>11}")
+        base = [sys.executable, __file__, '--pdf', pdf_path, '--dpi', str(args.dpi)]
+        subprocess.run(base + ['--mode', 'all-at-once'], check=True)
+        for workers in sorted(set(args.workers)):
+            subprocess.run(base + ['--mode', 'pipeline', '--run-workers', str(workers)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: eager vs lazy raw JSON in process_form_recognizer_result.
+
+Before, every upload ran `result.to_dict()` twice and pretty-printed the whole
+result with `json.dumps(..., indent=2)`. Now processing only stores the result
+and /raw_json/<id> serializes it compactly on demand. This measures latency
+and peak traced memory of both on synthetic multi-page results.
+
+TextLayoutParser imports the Azure SDK, so the Form Recognizer packages must
+be installed to run this.
+
+    python benchmarks/bench_raw_json.py --pages 10 50 --words 400
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TextLayoutParser  # noqa: E402
+from TextLayoutParser import process_form_recognizer_result  # noqa: E402
+
+
+class SyntheticResult:
+    """Stand-in for an AnalyzeResult: to_dict() rebuilds a fresh dict on every call, like the SDK"""
+
+    def __init__(self, pages, words_per_page):
+        self.page_count = pages
+        self.words_per_page = words_per_page
+        self.tables = []
+        self.paragraphs = [
+            SimpleNamespace(content=f"Paragraph {p}.{i} " + "word " * 40, spans=[])
+            for p in range(pages) for i in range(words_per_page // 40)
+        ]
+
+    def to_dict(self):
+        pages = []
+        for p in range(self.page_count):
+            words = [{
+                'content': f"word{i}",
+                'polygon': [{'x': i * 1.5, 'y': p * 2.0}, {'x': i * 1.5 + 1, 'y': p * 2.0},
+                            {'x': i * 1.5 + 1, 'y': p * 2.0 + 1}, {'x': i * 1.5, 'y': p * 2.0 + 1}],
+                'span': {'offset': i * 6, 'length': 5},
+                'confidence': 0.99,
+            } for i in range(self.words_per_page)]
+            pages.append({'page_number': p + 1, 'angle': 0.0, 'width': 8.5, 'height': 11.0,
+                          'unit': 'inch', 'words': words, 'lines': [], 'selection_marks': []})
+        return {
+            'api_version': '2022-08-31',
+            'model_id': 'prebuilt-document',
+            'content': ' '.join(p.content for p in self.paragraphs),
+            'pages': pages,
+            'paragraphs': [{'content': p.content} for p in self.paragraphs],
+            'tables': [],
+        }
+
+
+def eager(result):
+    """What every upload used to pay: processing plus both to_dict() calls"""
+    processed = process_form_recognizer_result(result)
+    processed['raw_json'] = json.dumps(result.to_dict(), indent=2)
+    list(result.to_dict().keys())
+    return processed
+
+
+def lazy(result):
+    return process_form_recognizer_result(result)
+
+
+def fetch_raw_json(processed):
+    """The on-demand path: what /raw_json/<id> does the first time the tab is opened"""
+    source = TextLayoutParser.raw_json_artifacts.get(processed['raw_json_id'])
+    return json.dumps(source.to_dict(), separators=(',', ':'))
+
+
+def measure(fn, *args):
+    """Latency from an untraced run, peak memory from a second run under tracemalloc"""
+    start = time.perf_counter()
+    value = fn(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2 ** 20, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--words', type=int, default=400, help='Words per page')
+    args = parser.parse_args()
+
+    print(f"{'pages':>6}{'mode':>18}{'ms':>10}{'peak MiB':>10}{'JSON MiB':>10}")
+    for pages in args.pages:
+        result = SyntheticResult(pages, args.words)
+        eager_ms, eager_peak, eager_out = measure(eager, result)
+        lazy_ms, lazy_peak, lazy_out = measure(lazy, result)
+        fetch_ms, fetch_peak, compact = measure(fetch_raw_json, lazy_out)
+
+        print(f"{pages:>6}{'eager (before)':>18}{eager_ms:>10.1f}{eager_peak:>10.1f}"
+              f"{len(eager_out['raw_json']) / 2 ** 20:>10.1f}")
+        print(f"{'':>6}{'lazy upload':>18}{lazy_ms:>10.1f}{lazy_peak:>10.1f}{0:>10.1f}")
+        print(f"{'':>6}{'raw JSON fetch':>18}{fetch_ms:>10.1f}{fetch_peak:>10.1f}"
+              f"{len(compact) / 2 ** 20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
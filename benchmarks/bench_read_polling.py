@@ -0,0 +1,93 @@
+"""
+Benchmark: concurrent Read uploads per worker, blocking loop vs ReadPoller.
+
+Both modes run against a local MockAzure Read server. The blocking mode is the
+original `while True` / `time.sleep(1)` loop with one worker thread per
+in-flight upload; the poller mode submits every upload from a single worker
+thread and waits on the futures.
+
+    python benchmarks/bench_read_polling.py --uploads 64 --workers 4 --latency 1.0
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MockAzure import MockAzureServer  # noqa: E402
+from ReadPoller import ReadPoller  # noqa: E402
+
+SUBSCRIPTION_KEY = 'mock-key'
+
+
+def blocking_read(read_url, image_data):
+    """The polling loop TextExtractor used before ReadPoller"""
+    headers = {
+        "Ocp-Apim-Subscription-Key": SUBSCRIPTION_KEY,
+        "Content-Type": "application/octet-stream"
+    }
+    response = requests.post(read_url, headers=headers, data=image_data)
+    operation_url = response.headers["Operation-Location"]
+    while True:
+        result = requests.get(operation_url, headers={"Ocp-Apim-Subscription-Key": SUBSCRIPTION_KEY}).json()
+        if result["status"] in ["succeeded", "failed"]:
+            return result
+        time.sleep(1)
+
+
+def run_blocking(read_url, image_data, uploads, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda _: blocking_read(read_url, image_data), range(uploads)))
+    elapsed = time.perf_counter() - start
+    assert all(r["status"] == "succeeded" for r in results)
+    return elapsed, workers
+
+
+def run_poller(read_url, image_data, uploads):
+    poller = ReadPoller(SUBSCRIPTION_KEY)
+    poller.start()
+
+    start = time.perf_counter()
+    futures = [poller.analyze(read_url, image_data) for _ in range(uploads)]
+    results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    poller.stop()
+    assert all(r["status"] == "succeeded" for r in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Worker threads available to the blocking loop')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='Seconds the mock server takes to finish one operation')
+    args = parser.parse_args()
+
+    server = MockAzureServer(('127.0.0.1', 0), latency=args.latency).start()
+    read_url = server.endpoint + "vision/v3.2/read/analyze"
+    image_data = b'\xff\xd8' + os.urandom(64 * 1024)
+
+    print(f"{args.uploads} uploads, mock latency {args.latency:.2f}s")
+    print(f"{'mode':<10}{'workers':>8}{'wall s':>10}{'uploads/s':>12}{'uploads/s/worker':>18}")
+
+    elapsed, workers = run_blocking(read_url, image_data, args.uploads, args.workers)
+    print(f"{'blocking':<10}{workers:>8}{elapsed:>10.2f}{args.uploads / elapsed:>12.1f}"
+          f"{args.uploads / elapsed / workers:>18.1f}")
+
+    elapsed = run_poller(read_url, image_data, args.uploads)
+    print(f"{'poller':<10}{1:>8}{elapsed:>10.2f}{args.uploads / elapsed:>12.1f}"
+          f"{args.uploads / elapsed:>18.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
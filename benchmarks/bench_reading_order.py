@@ -0,0 +1,109 @@
+"""
+Benchmark: ReadingOrder.order_lines vs the original sort-and-threshold pass.
+
+Accuracy runs on the fixtures in reading_order_fixtures.py:
+  - line integrity: share of Azure lines whose words come out contiguous
+    and left to right
+  - column order: share of (left column, right column) word pairs read
+    left column first, on two-column fixtures
+
+Timing runs on synthetic two-column pages of growing size.
+
+    python benchmarks/bench_reading_order.py --words 1000 10000 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ReadingOrder import order_lines  # noqa: E402
+from reading_order_fixtures import fixtures  # noqa: E402
+
+
+def legacy_order_lines(boxes, y_threshold=20):
+    """The original process_ocr_json grouping: sort by y_min, chain items within 20 px"""
+    order = sorted(range(len(boxes)), key=lambda i: boxes[i][1])
+    lines = []
+    current_y = None
+    for i in order:
+        y = boxes[i][1]
+        if current_y is None or abs(y - current_y) > y_threshold:
+            lines.append([])
+        lines[-1].append(i)
+        current_y = y
+    return lines
+
+
+def line_integrity(sequence, expected_lines):
+    position = {word_id: p for p, word_id in enumerate(sequence)}
+    intact = 0
+    for line in expected_lines:
+        positions = [position[word_id] for word_id in line]
+        if positions == list(range(positions[0], positions[0] + len(line))):
+            intact += 1
+    return intact / len(expected_lines)
+
+
+def column_order(sequence, columns):
+    """Fraction of (left, right) pairs with the left-column word read first"""
+    left_seen = 0
+    correct = 0
+    total_left = columns.count(0)
+    for word_id in sequence:
+        if columns[word_id] == 0:
+            left_seen += 1
+        else:
+            correct += left_seen
+    return correct / (total_left * (len(columns) - total_left))
+
+
+def synthetic_page(word_count, seed=0):
+    """Two columns of slightly skewed, jittered handwriting-sized words"""
+    rng = random.Random(seed)
+    boxes = []
+    per_line = 10
+    for i in range(word_count):
+        line, slot = divmod(i, per_line * 2)
+        column, col_slot = divmod(slot, per_line)
+        x = column * 2600 + col_slot * 220 + rng.uniform(0, 30)
+        y = line * 110 + x * 0.03 + rng.uniform(-10, 10)
+        boxes.append([x, y, x + rng.uniform(80, 190), y + rng.uniform(55, 80)])
+    return boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'fixture':<20}{'engine':>10}{'line integrity':>16}{'column order':>14}")
+    for name, fixture in fixtures().items():
+        boxes = [w['boundingBox'] for w in fixture['word_data']]
+        for engine, fn in (('legacy', legacy_order_lines), ('adaptive', order_lines)):
+            sequence = [i for line in fn(boxes) for i in line]
+            integrity = line_integrity(sequence, fixture['lines'])
+            columns = f"{column_order(sequence, fixture['columns']):.3f}" if fixture['columns'] else '-'
+            print(f"{name:<20}{engine:>10}{integrity:>16.3f}{columns:>14}")
+
+    print()
+    print(f"{'words':>8}{'legacy ms':>11}{'adaptive ms':>13}{'us/word':>9}")
+    for word_count in args.words:
+        boxes = synthetic_page(word_count)
+        start = time.perf_counter()
+        legacy_order_lines(boxes)
+        legacy_ms = (time.perf_counter() - start) * 1000
+        array = np.asarray(boxes)
+        start = time.perf_counter()
+        order_lines(array)
+        adaptive_ms = (time.perf_counter() - start) * 1000
+        print(f"{word_count:>8}{legacy_ms:>11.1f}{adaptive_ms:>13.1f}{adaptive_ms * 1000 / word_count:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
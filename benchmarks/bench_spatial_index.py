@@ -0,0 +1,99 @@
+"""
+Benchmark: SpatialIndex region queries vs a linear scan over word boxes.
+
+Builds synthetic answer-sheet pages (rows of words with jitter, in the
+[x_min, y_min, x_max, y_max] format of word_data) and checks that every query
+returns exactly what a linear scan returns.
+
+    python benchmarks/bench_spatial_index.py --words 10000 20000 50000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SpatialIndex import SpatialIndex  # noqa: E402
+
+
+def synthetic_page(word_count, seed=0):
+    """Words laid out in lines across a page wide enough to hold them"""
+    rng = random.Random(seed)
+    boxes = []
+    words_per_line = 40
+    line_height = 60
+    for i in range(word_count):
+        row, col = divmod(i, words_per_line)
+        x = col * 120 + rng.uniform(0, 20)
+        y = row * line_height + rng.uniform(-8, 8)
+        boxes.append([x, y, x + rng.uniform(30, 100), y + rng.uniform(25, 45)])
+    return boxes
+
+
+def linear_intersects(boxes, r):
+    return [i for i, b in enumerate(boxes) if b[0] <= r[2] and r[0] <= b[2] and b[1] <= r[3] and r[1] <= b[3]]
+
+
+def linear_within(boxes, r):
+    return [i for i, b in enumerate(boxes) if r[0] <= b[0] and r[1] <= b[1] and b[2] <= r[2] and b[3] <= r[3]]
+
+
+def linear_nearest(boxes, x, y, k):
+    distances = [math.hypot(max(b[0] - x, 0, x - b[2]), max(b[1] - y, 0, y - b[3])) for b in boxes]
+    return sorted(distances)[:k]
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(*q) for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1e6, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--words', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'words':>8}{'build ms':>10}{'query':>12}{'index us':>11}{'scan us':>11}{'speedup':>9}")
+    for word_count in args.words:
+        boxes = synthetic_page(word_count)
+        width = max(b[2] for b in boxes)
+        height = max(b[3] for b in boxes)
+
+        start = time.perf_counter()
+        index = SpatialIndex(boxes)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        rng = random.Random(1)
+        rects = []
+        for _ in range(args.queries):
+            x, y = rng.uniform(0, width), rng.uniform(0, height)
+            rects.append(([x, y, x + 600, y + 300],))
+        points = [(rng.uniform(0, width), rng.uniform(0, height), args.k) for _ in range(args.queries)]
+
+        cases = [
+            ('intersects', index.intersects, lambda r: linear_intersects(boxes, r), rects, None),
+            ('within', index.within, lambda r: linear_within(boxes, r), rects, None),
+            ('nearest', index.nearest, lambda x, y, k: linear_nearest(boxes, x, y, k), points,
+             lambda res: [round(d, 6) for _, d in res]),
+        ]
+        first = True
+        for name, indexed, scan, queries, normalize in cases:
+            index_us, index_results = timed(indexed, queries)
+            scan_us, scan_results = timed(scan, queries)
+            if normalize:
+                index_results = [normalize(r) for r in index_results]
+                scan_results = [[round(d, 6) for d in r] for r in scan_results]
+            assert index_results == scan_results, f"{name} results differ from linear scan"
+            label = f"{word_count:>8}{build_ms:>10.1f}" if first else f"{'':>18}"
+            print(f"{label}{name:>12}{index_us:>11.1f}{scan_us:>11.1f}{scan_us / index_us:>8.1f}x")
+            first = False
+
+
+if __name__ == '__main__':
+    main()
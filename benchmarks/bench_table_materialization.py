@@ -0,0 +1,86 @@
+"""
+Benchmark: one-pass table materialization vs the original cell scan.
+
+The original loop in process_form_recognizer_result scanned every cell for
+every (row, column) pair. This builds synthetic Form Recognizer tables
+(default 200 x 20, with some merged cells) and times both approaches.
+
+TextLayoutParser imports the Azure SDK, so the Form Recognizer packages must
+be installed to run this.
+
+    python benchmarks/bench_table_materialization.py --rows 200 --cols 20
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TextLayoutParser import columnar_table, materialize_table  # noqa: E402
+
+
+def synthetic_table(row_count, column_count, merge_every=7):
+    """A table whose every `merge_every`-th row has its first two columns merged"""
+    cells = []
+    for row in range(row_count):
+        col = 0
+        while col < column_count:
+            column_span = 2 if row % merge_every == 0 and col == 0 else 1
+            cells.append(SimpleNamespace(row_index=row, column_index=col, row_span=1,
+                                         column_span=column_span, content=f"r{row}c{col}"))
+            col += column_span
+    return SimpleNamespace(row_count=row_count, column_count=column_count, cells=cells)
+
+
+def scan_table(table):
+    """The original O(rows x cols x cells) loop"""
+    table_data = []
+    for row_idx in range(table.row_count):
+        row_data = []
+        for col_idx in range(table.column_count):
+            cell_content = ""
+            for cell in table.cells:
+                if cell.row_index == row_idx and cell.column_index == col_idx:
+                    cell_content = cell.content
+                    break
+            row_data.append(cell_content)
+        table_data.append(row_data)
+    return table_data
+
+
+def timed(fn, table, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(table)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--cols', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    table = synthetic_table(args.rows, args.cols)
+    print(f"{args.rows} x {args.cols} table, {len(table.cells)} cells")
+
+    scan_ms, scanned = timed(scan_table, table, args.repeat)
+    one_pass_ms, (rows, spans) = timed(materialize_table, table, args.repeat)
+    columnar_ms, _ = timed(columnar_table, table, args.repeat)
+
+    # Apart from the positions covered by merged cells, both grids must agree
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            if cell is not None:
+                assert cell == scanned[r][c], (r, c)
+
+    print(f"{'original scan':<16}{scan_ms:>10.2f} ms")
+    print(f"{'one pass':<16}{one_pass_ms:>10.2f} ms  ({scan_ms / one_pass_ms:.0f}x, {len(spans)} spanning cells)")
+    print(f"{'columnar':<16}{columnar_ms:>10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: memory TextExtractor's /word-level holds per upload, by upload size.
+
+For each size a fresh server process handles one upload against a local
+MockAzure Read server and reports the peak Python heap (tracemalloc) of that
+request. `read-all` is the old handler behaviour, `image.read()` of the
+whole file; `streamed` is the current one, where uploads past 500 KB stay in
+werkzeug's temporary file and are streamed to the Read API.
+
+    python benchmarks/bench_upload_memory.py --sizes 1 10 40
+"""
+import argparse
+import io
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from MockAzure import MockAzureServer  # noqa: E402
+
+
+def serve_one(port, endpoint, read_all):
+    """Server process: handle a warm-up request, then one traced request, and print its peak heap in bytes"""
+    import tracemalloc
+
+    from werkzeug.serving import make_server
+
+    import TextExtractor
+    from OcrCache import OcrCache
+    from ReadPoller import ReadPoller
+
+    TextExtractor.endpoint = endpoint
+    TextExtractor.read_url = endpoint + "vision/v3.2/read/analyze"
+    TextExtractor.ocr_cache = OcrCache(cache_dir=None)
+    TextExtractor.poller = ReadPoller('mock-key', min_interval=0.02)
+    if read_all:
+        TextExtractor.upload_body = lambda file: file.read()
+
+    # Traced around the app itself, leaving out the development server's own buffers
+    peaks = []
+
+    def traced_app(environ, start_response):
+        tracemalloc.start()
+        try:
+            return list(TextExtractor.app(environ, start_response))
+        finally:
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    server = make_server('127.0.0.1', port, traced_app)
+    print('ready', flush=True)
+    # Lazy imports and thread pools are set up by the first request; only the second is reported
+    server.handle_request()
+    server.handle_request()
+    print(peaks[-1], flush=True)
+
+
+def post_upload(port, f):
+    """POST a file to /word-level with a Content-Length, streaming the multipart body from disk"""
+    boundary = 'bench-upload-boundary'
+    with tempfile.TemporaryFile() as body:
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="page.jpg"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        shutil.copyfileobj(f, body, 1024 * 1024)
+        body.write(f'\r\n--{boundary}--\r\n'.encode())
+        body.seek(0)
+        return requests.post(f'http://127.0.0.1:{port}/word-level', data=body,
+                             headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+
+
+def measure(path, endpoint, read_all):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen([sys.executable, __file__, '--serve', str(port), endpoint] +
+                               (['--read-all'] if read_all else []),
+                               stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    assert process.stdout.readline().strip() == 'ready'
+    post_upload(port, io.BytesIO(b'warm-up'))
+    with open(path, 'rb') as f:
+        response = post_upload(port, f)
+    peak = int(process.stdout.readline())
+    process.wait()
+    return response.status_code, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory per upload, read-all vs streamed')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 40], help='Upload sizes in MB')
+    parser.add_argument('--serve', nargs=2, metavar=('PORT', 'ENDPOINT'), help=argparse.SUPPRESS)
+    parser.add_argument('--read-all', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve_one(int(args.serve[0]), args.serve[1], args.read_all)
+
+    mock = MockAzureServer(('127.0.0.1', 0), latency=0.05)
+    threading.Thread(target=mock.serve_forever, daemon=True).start()
+
+    print(f"{'size MB':>8}{'read-all MB':>13}{'streamed MB':>13}")
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as upload:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(int(size)):
+                upload.write(chunk)
+            upload.write(chunk[:int((size % 1) * len(chunk))])
+            upload.flush()
+
+            peaks = []
+            for read_all in (True, False):
+                status, peak = measure(upload.name, mock.endpoint, read_all)
+                assert status == 200, status
+                peaks.append(peak / 1024 ** 2)
+        print(f"{size:>8.1f}{peaks[0]:>13.1f}{peaks[1]:>13.1f}")
+    mock.shutdown()
+
+
+if __name__ == '__main__':
+    main()
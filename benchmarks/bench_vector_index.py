@@ -0,0 +1,74 @@
+"""
+Benchmark: recall@k and query latency of the IVF VectorIndex against exact
+search, for a range of nprobe values.
+
+By default the bank is synthetic: 384-dim unit vectors drawn around a few
+hundred topic centres, which is how rubric and answer embeddings cluster by
+subject. Pass --embeddings file.npy to use real embeddings instead.
+
+    python benchmarks/bench_vector_index.py --size 50000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VectorIndex import VectorIndex, normalize_rows  # noqa: E402
+
+
+def synthetic_bank(size, dim, topics, spread, rng):
+    centres = normalize_rows(rng.standard_normal((topics, dim)))
+    topic = rng.integers(0, topics, size)
+    return normalize_rows(centres[topic] + spread * rng.standard_normal((size, dim)) / np.sqrt(dim))
+
+
+def timed_search(index, queries, k, **kwargs):
+    start = time.perf_counter()
+    results = index.search(queries, k, **kwargs)
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--topics', type=int, default=300)
+    parser.add_argument('--spread', type=float, default=2.0, help='Noise around each topic centre')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--embeddings', help='.npy file of embeddings to index instead of synthetic data')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        bank = normalize_rows(np.load(args.embeddings))
+    else:
+        bank = synthetic_bank(args.size + args.queries, args.dim, args.topics, args.spread, rng)
+    queries, bank = bank[:args.queries], bank[args.queries:]
+
+    index = VectorIndex()
+    start = time.perf_counter()
+    index.add([str(i) for i in range(len(bank))], bank)
+    if not index.trained:
+        index.train()
+    build = time.perf_counter() - start
+    print(f"{len(bank)} vectors, {index.stats()['lists']} lists, built in {build:.2f}s")
+
+    exact, exact_ms = timed_search(index, queries, args.k, exact=True)
+    truth = [{vector_id for vector_id, _, _ in result} for result in exact]
+    print(f"{'nprobe':>8}{'recall@' + str(args.k):>11}{'ms/query':>10}{'speedup':>9}")
+    print(f"{'exact':>8}{1.0:>11.3f}{exact_ms:>10.3f}{1.0:>8.1f}x")
+    for nprobe in args.nprobe:
+        results, ms = timed_search(index, queries, args.k, nprobe=nprobe)
+        recall = np.mean([len(truth[i] & {vector_id for vector_id, _, _ in result}) / args.k
+                          for i, result in enumerate(results)])
+        print(f"{nprobe:>8}{recall:>11.3f}{ms:>10.3f}{exact_ms / ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Load test: latency percentiles and throughput of the HTTP endpoints.
+
+Starts a local MockAzure server (Read and Form Recognizer) and each app in
+its own process, pointed at it through AZURE_READ_ENDPOINT and
+FORM_RECOGNIZER_ENDPOINT and run from a scratch directory, so caches and
+uploads stay out of the checkout. Each target is then driven by
+--concurrency clients for --duration seconds, and p50/p95/p99 latency,
+requests per second and failed requests are reported.
+
+Uploads and texts are made unique per request, so every request reaches
+the (mock) Azure service or the encoder; pass --cached to send the same
+body every time and measure the cache path instead. Latency and failures
+of the Azure stand-in are set with --latency, --jitter, --throttle-rate
+and --error-rate.
+
+    python benchmarks/load_test.py --concurrency 8 --duration 20
+    python benchmarks/load_test.py --targets word-level upload --latency 0.5 --throttle-rate 0.1
+    python benchmarks/load_test.py --targets generate-embeddings --embeddings-url http://127.0.0.1:5000
+
+/generate-embeddings needs the sentence-transformers model; if the
+Embeddings app cannot start here, that target is skipped.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from MockAzure import MockAzureServer, load_word_data  # noqa: E402
+
+# Seconds an app process gets to import and load its model
+STARTUP_TIMEOUT = 120
+
+RUBRIC = {
+    'definition': 'Global warming is the long-term rise in the average temperature of the Earth',
+    'causes': ['Burning fossil fuels releases carbon dioxide', 'Deforestation removes carbon sinks'],
+    'effects': ['Sea levels rise as ice melts', 'Extreme weather events become more frequent'],
+}
+
+
+def serve(module_name, port):
+    """App process: import the app (warming the model, for Embeddings) and serve it on `port`"""
+    from werkzeug.serving import make_server
+
+    module = __import__(module_name)
+    if hasattr(module, 'warm_up'):
+        module.warm_up()
+    server = make_server('127.0.0.1', port, module.app, threaded=True)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def drain(stream):
+    for _ in stream:
+        pass
+
+
+def start_app(module_name, workdir, env):
+    """Start an app process; returns (process, base URL), or (None, reason) if it does not come up"""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', module_name, str(port)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=workdir,
+                               env=dict(os.environ, **env))
+    ready = []
+    reader = threading.Thread(target=lambda: ready.append(process.stdout.readline().strip()), daemon=True)
+    reader.start()
+    reader.join(STARTUP_TIMEOUT)
+    if ready != ['ready']:
+        process.kill()
+        error = process.stderr.read().strip().splitlines()
+        return None, error[-1] if error else 'did not start'
+    # Keep draining output so a chatty app never blocks on a full pipe
+    for stream in (process.stdout, process.stderr):
+        threading.Thread(target=drain, args=(stream,), daemon=True).start()
+    return process, f'http://127.0.0.1:{port}'
+
+
+def unique_suffix(cached):
+    return '' if cached else f' {uuid.uuid4().hex}'
+
+
+def html_ok(response):
+    """The layout app reports failures in its page with status 200"""
+    return response.status_code == 200 and 'class="status error"' not in response.text
+
+
+def json_ok(response):
+    return response.status_code == 200
+
+
+class Workload:
+    """The request bodies sent to every target"""
+
+    def __init__(self, image_path, cached):
+        with open(image_path, 'rb') as f:
+            self.image = f.read()
+        self.image_name = os.path.basename(image_path)
+        self.ocr_json = json.dumps({'word_data': load_word_data()})
+        self.cached = cached
+
+    def image_body(self):
+        # Bytes after the end of the image keep it decodable and change its hash
+        return self.image + unique_suffix(self.cached).encode()
+
+    def extract_text(self, session, url):
+        return session.post(url + '/extract-text', files={'image': (self.image_name, self.image_body())})
+
+    def word_level(self, session, url):
+        return session.post(url + '/word-level', files={'image': (self.image_name, self.image_body())})
+
+    def upload(self, session, url):
+        return session.post(url + '/upload', files={'document': (self.image_name, self.image_body())})
+
+    def process_json(self, session, url):
+        return session.post(url + '/process_json', data={'ocrJson': self.ocr_json})
+
+    def generate_embeddings(self, session, url):
+        suffix = unique_suffix(self.cached)
+        body = {'definition': RUBRIC['definition'] + suffix,
+                'causes': [text + suffix for text in RUBRIC['causes']],
+                'effects': [text + suffix for text in RUBRIC['effects']]}
+        return session.post(url + '/generate-embeddings', json=body)
+
+
+# target: (app module, Workload method, success check)
+TARGETS = {
+    'extract-text': ('TextExtractor', 'extract_text', json_ok),
+    'word-level': ('TextExtractor', 'word_level', json_ok),
+    'upload': ('TextLayoutParser', 'upload', html_ok),
+    'process-json': ('TextLayoutParser', 'process_json', html_ok),
+    'generate-embeddings': ('Embeddings', 'generate_embeddings', json_ok),
+}
+
+
+def drive(send, ok, url, concurrency, duration):
+    """
+    Run `concurrency` clients against `url` for `duration` seconds after one
+    unrecorded warm-up request each. Returns (latencies of successful
+    requests, failed request count, wall seconds).
+    """
+    latencies, failures = [], [0]
+    lock = threading.Lock()
+    started = threading.Barrier(concurrency + 1)
+    stop = threading.Event()
+
+    def client():
+        session = requests.Session()
+        try:
+            send(session, url)
+        except requests.RequestException:
+            pass
+        started.wait()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                succeeded = ok(send(session, url))
+            except requests.RequestException:
+                succeeded = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if succeeded:
+                    latencies.append(elapsed)
+                else:
+                    failures[0] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, failures[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency percentiles and throughput of the HTTP endpoints')
+    parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument('--concurrency', type=int, default=8, help='Clients sending requests back to back')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds each target is driven')
+    parser.add_argument('--cached', action='store_true', help='Send identical bodies, exercising the caches')
+    parser.add_argument('--image', default=None, help='Page image to upload (default: the first in uploads/)')
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds a mock Azure operation runs')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Mock latency varies by +/- this much')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of mock requests answered 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests answered 500')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--extractor-url', help='Use a running TextExtractor instead of starting one')
+    parser.add_argument('--layout-url', help='Use a running TextLayoutParser instead of starting one')
+    parser.add_argument('--embeddings-url', help='Use a running Embeddings service instead of starting one')
+    parser.add_argument('--serve', nargs=2, metavar=('MODULE', 'PORT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve[0], int(args.serve[1]))
+
+    image = args.image or sorted(p for p in glob.glob(os.path.join(ROOT, 'uploads', '*'))
+                                 if p.lower().endswith(('.jpg', '.jpeg', '.png')))[0]
+    workload = Workload(image, args.cached)
+    mock = MockAzureServer(('127.0.0.1', 0), latency=args.latency, jitter=args.jitter,
+                           throttle_rate=args.throttle_rate, error_rate=args.error_rate, seed=args.seed).start()
+    env = {'AZURE_READ_ENDPOINT': mock.endpoint, 'AZURE_READ_KEY': 'mock-key',
+           'FORM_RECOGNIZER_ENDPOINT': mock.endpoint, 'FORM_RECOGNIZER_KEY': 'mock-key'}
+    urls = {'TextExtractor': args.extractor_url, 'TextLayoutParser': args.layout_url,
+            'Embeddings': args.embeddings_url}
+
+    workdir = tempfile.mkdtemp(prefix='load-test-')
+    processes = []
+    print(f"mock Azure: {args.latency:.2f}s +/- {args.jitter:.2f}s, {args.throttle_rate:.0%} 429, "
+          f"{args.error_rate:.0%} 500; {args.concurrency} clients x {args.duration:.0f}s per target"
+          f"{', cached bodies' if args.cached else ''}\n")
+    print(f"{'target':<21}{'requests':>9}{'failed':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'429s':>6}{'500s':>6}")
+    try:
+        for target in args.targets:
+            module_name, method, ok = TARGETS[target]
+            if urls[module_name] is None:
+                process, url = start_app(module_name, workdir, env)
+                if process is None:
+                    print(f"{target:<21}skipped: {module_name} did not start ({url})")
+                    urls[module_name] = False
+                    continue
+                processes.append(process)
+                urls[module_name] = url
+            elif urls[module_name] is False:
+                print(f"{target:<21}skipped: {module_name} did not start")
+                continue
+
+            before = mock.stats()
+            latencies, failures, wall = drive(getattr(workload, method), ok, urls[module_name].rstrip('/'),
+                                              args.concurrency, args.duration)
+            after = mock.stats()
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (float('nan'),) * 3
+            print(f"{target:<21}{len(latencies) + failures:>9}{failures:>8}{len(latencies) / wall:>8.1f}"
+                  f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{after['throttled'] - before['throttled']:>6}"
+                  f"{after['errors'] - before['errors']:>6}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        mock.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Regression harness: OCR preprocessing must not change the extracted word_data.
+
+Every image in uploads/ goes through TextExtractor's /word-level twice, as
+uploaded and with `preprocess=1`, and the two word_data lists must agree: the
+same words in the same order, with boxes overlapping by at least --min-iou.
+The bytes saved per page are reported.
+
+Against the local MockAzure server (the default) each image is registered
+with ground-truth words (Sample.json scaled onto the image) and the prepared
+upload with the same words mapped into its pixels, so the run checks the
+upload path and the coordinate round-trip of deskew, downscale and crop.
+Pass --endpoint and --key to run against a real Read endpoint instead, which
+also checks that OCR reads the preprocessed image the same way.
+
+    python benchmarks/preprocess_regression.py
+    python benchmarks/preprocess_regression.py --endpoint https://<name>.cognitiveservices.azure.com/ --key <key>
+"""
+import argparse
+import difflib
+import glob
+import io
+import json
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import TextExtractor  # noqa: E402
+from Geometry import pairwise_iou  # noqa: E402
+from MockAzure import MockAzureServer, load_word_data  # noqa: E402
+from OcrCache import OcrCache  # noqa: E402
+from Preprocess import prepare_image  # noqa: E402
+from ReadPoller import ReadPoller  # noqa: E402
+
+UPLOADS_DIR = os.path.join(ROOT, 'uploads')
+
+
+def truth_for(image_size, sample_words):
+    """Sample.json words scaled onto an image of `image_size`, as word_data"""
+    sample_width = max(w['boundingBox'][2] for w in sample_words)
+    sample_height = max(w['boundingBox'][3] for w in sample_words)
+    scale = min(image_size[0] / sample_width, image_size[1] / sample_height)
+    return [dict(word, boundingBox=[round(v * scale, 1) for v in word['boundingBox']]) for word in sample_words]
+
+
+def to_prepared_words(prepared, words):
+    """The same words with their boxes mapped into the prepared image as 8-point polygons"""
+    mapped = []
+    for word in words:
+        x0, y0, x1, y1 = word['boundingBox']
+        corners = prepared.to_prepared([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+        mapped.append(dict(word, boundingBox=[round(float(v), 1) for v in corners.ravel()]))
+    return mapped
+
+
+def word_level(client, image_data, name, preprocess):
+    response = client.post('/word-level', query_string={'preprocess': '1' if preprocess else '0'},
+                           data={'image': (io.BytesIO(image_data), name)}, content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f"/word-level returned {response.status_code}: {response.get_data(as_text=True)}")
+    stats = response.headers.get('X-Preprocess-Stats')
+    return response.get_json()['word_data'], json.loads(stats) if stats else None
+
+
+def compare(reference, candidate):
+    """(text similarity, matched words, mean IoU, min IoU) of two word_data lists"""
+    texts_a = [w['text'] for w in reference]
+    texts_b = [w['text'] for w in candidate]
+    matcher = difflib.SequenceMatcher(a=texts_a, b=texts_b, autojunk=False)
+    pairs = [(block.a + k, block.b + k) for block in matcher.get_matching_blocks() for k in range(block.size)]
+    if not pairs:
+        return matcher.ratio(), 0, 0.0, 0.0
+    boxes_a = np.array([reference[i]['boundingBox'] for i, _ in pairs], dtype=float)
+    boxes_b = np.array([candidate[j]['boundingBox'] for _, j in pairs], dtype=float)
+    ious = np.array([pairwise_iou(a[None], b[None])[0, 0] for a, b in zip(boxes_a, boxes_b)])
+    return matcher.ratio(), len(pairs), float(ious.mean()), float(ious.min())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that OCR preprocessing preserves word_data')
+    parser.add_argument('--uploads', default=UPLOADS_DIR, help='Directory of page images')
+    parser.add_argument('--endpoint', help='Real Azure endpoint (default: local MockAzure)')
+    parser.add_argument('--key', help='Subscription key for --endpoint')
+    parser.add_argument('--min-text-ratio', type=float, default=None,
+                        help='Minimum word sequence similarity (default 1.0 mock, 0.95 real)')
+    parser.add_argument('--min-iou', type=float, default=None,
+                        help='Minimum mean box IoU of matched words (default 0.9 mock, 0.8 real)')
+    args = parser.parse_args()
+
+    paths = sorted(p for p in glob.glob(os.path.join(args.uploads, '*'))
+                   if p.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')))
+    if not paths:
+        sys.exit(f"No images in {args.uploads}")
+
+    server = None
+    if args.endpoint:
+        endpoint = args.endpoint if args.endpoint.endswith('/') else args.endpoint + '/'
+        TextExtractor.poller = ReadPoller(args.key, timeout=TextExtractor.READ_TIMEOUT)
+        min_text_ratio = args.min_text_ratio if args.min_text_ratio is not None else 0.95
+        min_iou = args.min_iou if args.min_iou is not None else 0.8
+    else:
+        server = MockAzureServer(('127.0.0.1', 0), latency=0.05).start()
+        endpoint = server.endpoint
+        TextExtractor.poller = ReadPoller('mock-key', min_interval=0.02, timeout=TextExtractor.READ_TIMEOUT)
+        min_text_ratio = args.min_text_ratio if args.min_text_ratio is not None else 1.0
+        min_iou = args.min_iou if args.min_iou is not None else 0.9
+        sample_words = load_word_data()
+
+    TextExtractor.endpoint = endpoint
+    TextExtractor.read_url = endpoint + "vision/v3.2/read/analyze"
+    client = TextExtractor.app.test_client()
+
+    print(f"{'image':<44}{'bytes':>9}{'sent':>8}{'saved':>7}{'deskew':>8}{'scale':>7}"
+          f"{'words':>7}{'text':>6}{'IoU':>6}{'min':>6}")
+    failures = 0
+    total_original = total_sent = 0
+    for path in paths:
+        name = os.path.basename(path)
+        with open(path, 'rb') as f:
+            image_data = f.read()
+        # A fresh memory-only cache, so identical uploads still go to the Read endpoint
+        TextExtractor.ocr_cache = OcrCache(cache_dir=None)
+
+        if server is not None:
+            size = Image.open(io.BytesIO(image_data)).size
+            truth = truth_for(size, sample_words)
+            server.register_image(image_data, truth, size)
+            prepared = prepare_image(image_data)
+            if prepared is not None:
+                server.register_image(prepared.data, to_prepared_words(prepared, truth), prepared.size)
+
+        reference, _ = word_level(client, image_data, name, preprocess=False)
+        candidate, stats = word_level(client, image_data, name, preprocess=True)
+        stats = stats or {'original_bytes': len(image_data), 'bytes': len(image_data),
+                          'deskew_degrees': 0.0, 'scale': 1.0}
+        text_ratio, matched, mean_iou, min_iou_seen = compare(reference, candidate)
+
+        total_original += stats['original_bytes']
+        total_sent += stats['bytes']
+        ok = text_ratio >= min_text_ratio and mean_iou >= min_iou
+        failures += not ok
+        print(f"{name[-43:]:<44}{stats['original_bytes']:>9}{stats['bytes']:>8}"
+              f"{1 - stats['bytes'] / stats['original_bytes']:>7.0%}{stats['deskew_degrees']:>8.2f}"
+              f"{stats['scale']:>7.2f}{matched:>7}{text_ratio:>6.2f}{mean_iou:>6.2f}{min_iou_seen:>6.2f}"
+              f"{'' if ok else '  FAIL'}")
+
+    print(f"\n{len(paths)} pages: {total_original} -> {total_sent} bytes "
+          f"({1 - total_sent / total_original:.0%} saved, {(total_original - total_sent) / len(paths):.0f} per page)")
+    if server is not None:
+        server.shutdown()
+    TextExtractor.poller.stop()
+    if failures:
+        sys.exit(f"{failures} page(s) extracted different word_data with preprocessing")
+
+
+if __name__ == '__main__':
+    main()
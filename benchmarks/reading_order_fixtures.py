@@ -0,0 +1,78 @@
+"""
+Reading-order accuracy fixtures built from Sample.json-style word data.
+
+Each fixture is a flat word_data list plus the expected grouping: `lines`
+(word ids of each Azure line, in order) and, for multi-column pages, the
+`columns` each word belongs to. Fixtures are derived from Sample.json so they
+stay in the real output shape of /word-level.
+"""
+import json
+import math
+import os
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Sample.json')
+
+
+def load_sample():
+    with open(SAMPLE_PATH) as f:
+        return json.load(f)['word_data']
+
+
+def azure_lines(word_data):
+    """Word ids of each Azure line, taken from consecutive runs of line_text"""
+    lines = []
+    previous = None
+    for word in word_data:
+        if word['line_text'] != previous:
+            lines.append([])
+            previous = word['line_text']
+        lines[-1].append(word['id'])
+    return lines
+
+
+def renumber(word_data):
+    return [dict(word, id=i) for i, word in enumerate(word_data)]
+
+
+def rotate(word_data, degrees):
+    """Rotate every box about the page centre and take the axis-aligned bounds, like a skewed scan"""
+    angle = math.radians(degrees)
+    cx = (min(w['boundingBox'][0] for w in word_data) + max(w['boundingBox'][2] for w in word_data)) / 2
+    cy = (min(w['boundingBox'][1] for w in word_data) + max(w['boundingBox'][3] for w in word_data)) / 2
+    rotated = []
+    for word in word_data:
+        x0, y0, x1, y1 = word['boundingBox']
+        corners = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+        xs, ys = [], []
+        for x, y in corners:
+            xs.append(cx + (x - cx) * math.cos(angle) - (y - cy) * math.sin(angle))
+            ys.append(cy + (x - cx) * math.sin(angle) + (y - cy) * math.cos(angle))
+        rotated.append(dict(word, boundingBox=[round(min(xs)), round(min(ys)), round(max(xs)), round(max(ys))]))
+    return rotated
+
+
+def two_columns(word_data, gutter=400):
+    """Place a second copy of the page to the right, as on a two-column answer sheet"""
+    width = max(w['boundingBox'][2] for w in word_data)
+    right = [dict(w, boundingBox=[w['boundingBox'][0] + width + gutter, w['boundingBox'][1],
+                                  w['boundingBox'][2] + width + gutter, w['boundingBox'][3]])
+             for w in word_data]
+    return renumber(word_data + right), [0] * len(word_data) + [1] * len(right)
+
+
+def fixtures():
+    """Return {name: {'word_data', 'lines', 'columns'}} for every fixture"""
+    sample = load_sample()
+    double, columns = two_columns(sample)
+    skewed_double, _ = two_columns(rotate(sample, 3))
+    cases = {
+        'sample': (sample, None),
+        'skewed_3deg': (rotate(sample, 3), None),
+        'skewed_-4deg': (rotate(sample, -4), None),
+        'two_column': (double, columns),
+        'two_column_skewed': (skewed_double, columns),
+    }
+    return {
+        name: {'word_data': word_data, 'lines': azure_lines(word_data), 'columns': cols}
+        for name, (word_data, cols) in cases.items()
+    }
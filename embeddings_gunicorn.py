@@ -0,0 +1,31 @@
+"""
+Gunicorn settings for the embedding service.
+
+    gunicorn -c embeddings_gunicorn.py Embeddings:app
+
+The app is imported and the model weights loaded once in the master, then
+workers are forked from it and share those pages copy-on-write instead of
+each loading their own copy. Each worker runs one warm-up encode after the
+fork, so torch's thread pools are created in the worker that uses them.
+"""
+import gc
+import os
+
+bind = os.environ.get('EMBEDDINGS_BIND', '127.0.0.1:5000')
+workers = int(os.environ.get('EMBEDDINGS_WORKERS', '2'))
+threads = int(os.environ.get('EMBEDDINGS_THREADS', '8'))
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    import Embeddings
+    Embeddings.get_model()
+    # Move everything allocated so far out of the collector's reach, so
+    # collections in the workers do not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import Embeddings
+    Embeddings.warm_up()
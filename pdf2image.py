@@ -1,15 +1,15 @@
 # PDF to Enhanced Images Converter
 # This notebook converts PDF pages to individual images with clarity enhancements
 
-# Install required packages
-!pip install pdf2image Pillow numpy matplotlib
+# Install required packages (pdftoppm comes from poppler-utils)
+!apt-get install -y poppler-utils
+!pip install pypdf Pillow numpy matplotlib
 
 # Import necessary libraries
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-from pdf2image import convert_from_path
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 from google.colab import files
 import io
 import zipfile
@@ -29,85 +29,9 @@ def upload_pdf():
     print(f"Successfully uploaded: {pdf_path}")
     return pdf_path
 
-# Function to preprocess an image
-def enhance_image(image, contrast_factor=1.5, sharpness_factor=1.5, brightness_factor=1.2):
-    """
-    Enhance image clarity by adjusting contrast, sharpness, and brightness
-    
-    Parameters:
-    - image: PIL Image object
-    - contrast_factor: float, contrast enhancement factor
-    - sharpness_factor: float, sharpness enhancement factor
-    - brightness_factor: float, brightness enhancement factor
-    
-    Returns:
-    - Enhanced PIL Image object
-    """
-    # Convert to grayscale if needed (optional)
-    # image = image.convert('L')
-    
-    # Apply a slight Gaussian blur to reduce noise (optional)
-    image = image.filter(ImageFilter.GaussianBlur(radius=0.5))
-    
-    # Increase brightness
-    enhancer = ImageEnhance.Brightness(image)
-    image = enhancer.enhance(brightness_factor)
-    
-    # Increase contrast
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(contrast_factor)
-    
-    # Increase sharpness
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(sharpness_factor)
-    
-    return image
-
-# Function to convert PDF to images with enhancements
-def convert_pdf_to_enhanced_images(pdf_path, dpi=300, 
-                                 contrast=1.5, sharpness=1.5, brightness=1.2,
-                                 output_format='PNG'):
-    """
-    Convert PDF pages to enhanced images
-    
-    Parameters:
-    - pdf_path: string, path to the PDF file
-    - dpi: int, DPI for rendering PDF pages
-    - contrast: float, contrast enhancement factor
-    - sharpness: float, sharpness enhancement factor  
-    - brightness: float, brightness enhancement factor
-    - output_format: string, format for output images (PNG, JPEG, etc.)
-    
-    Returns:
-    - List of paths to the generated image files
-    """
-    # Create output directory
-    output_dir = 'enhanced_images'
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Convert PDF to images
-    print(f"Converting PDF to images with DPI={dpi}...")
-    images = convert_from_path(pdf_path, dpi=dpi)
-    
-    # Process each page
-    image_paths = []
-    for i, image in enumerate(images):
-        # Enhance image clarity
-        enhanced_image = enhance_image(
-            image, 
-            contrast_factor=contrast,
-            sharpness_factor=sharpness,
-            brightness_factor=brightness
-        )
-        
-        # Save the enhanced image
-        output_path = os.path.join(output_dir, f'page_{i+1}.{output_format.lower()}')
-        enhanced_image.save(output_path, format=output_format)
-        image_paths.append(output_path)
-        
-        print(f"Processed page {i+1}/{len(images)}")
-    
-    return image_paths
+# Page rendering and enhancement run in parallel worker processes, one page
+# at a time (see PdfPipeline.py, which must sit next to this notebook)
+from PdfPipeline import enhance_image, convert_pdf_to_enhanced_images
 
 # Function to display sample images
 def display_sample_images(image_paths, num_samples=3):
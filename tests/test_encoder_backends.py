@@ -0,0 +1,48 @@
+"""
+Parity of the encoder backends with torch on a small set of rubric and
+answer texts. Skipped where torch (or ONNX Runtime, for onnx) is not
+installed; the first run downloads all-MiniLM-L6-v2.
+"""
+import numpy as np
+import pytest
+
+from EncoderBackends import MAX_DRIFT, cosine_drift, create_encoder
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+TEXTS = [
+    "Resources are everything available in our environment that can satisfy our needs.",
+    "Deforestation",
+    "Soil erosion",
+    "Conservation of resources is necessary for sustainable development.",
+    "Cutting down trees for farming leaves the soil loose so rain washes it away",
+    "We must use resources carefully so they last for future generations",
+]
+
+BACKEND_MODULES = {'int8': ['torch'], 'onnx': ['torch', 'onnxruntime']}
+
+
+@pytest.fixture(scope='module')
+def reference():
+    pytest.importorskip('torch')
+    pytest.importorskip('sentence_transformers')
+    return create_encoder('torch', MODEL_NAME, threads=1).encode(TEXTS)
+
+
+def test_torch_embeddings_are_normalized(reference):
+    assert reference.shape == (len(TEXTS), 384)
+    assert reference.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(reference, axis=1), 1, atol=1e-5)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKEND_MODULES))
+def test_backend_matches_torch(backend, reference):
+    for module in BACKEND_MODULES[backend]:
+        pytest.importorskip(module)
+    embeddings = create_encoder(backend, MODEL_NAME, threads=1).encode(TEXTS)
+
+    assert embeddings.shape == reference.shape
+    assert cosine_drift(reference, embeddings).max() <= MAX_DRIFT[backend]
+    # Drift must never change which rubric text an answer matches best
+    assert (embeddings[4:] @ embeddings[:4].T).argmax(axis=1).tolist() == \
+        (reference[4:] @ reference[:4].T).argmax(axis=1).tolist()
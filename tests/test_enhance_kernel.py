@@ -0,0 +1,41 @@
+"""
+The fused enhancement kernel against the PIL chain it replaces, on a
+synthetic scan-like page: paper gradient, noise and dark strokes.
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+from EnhanceKernel import MAX_MEAN_DIFF, MAX_P99_DIFF, FusedEnhancer
+from PdfPipeline import enhance_image_pil
+
+
+def synthetic_page(mode, width=320, height=240, seed=0):
+    rng = np.random.default_rng(seed)
+    paper = np.linspace(200, 240, width)[None, :, None] + rng.normal(0, 6, (height, width, 3))
+    for _ in range(40):
+        x, y = rng.integers(0, width - 40), rng.integers(0, height - 8)
+        paper[y:y + rng.integers(2, 8), x:x + rng.integers(5, 40)] = rng.integers(10, 80, 3)
+    return Image.fromarray(np.clip(paper, 0, 255).astype(np.uint8), 'RGB').convert(mode)
+
+
+def level_diff(a, b):
+    return np.abs(np.asarray(a, np.int16) - np.asarray(b, np.int16))
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+# A small strip size splits the page, so strip seams are covered too
+@pytest.mark.parametrize('strip_bytes', [1 << 18, 1 << 12])
+def test_fused_matches_pil(mode, strip_bytes):
+    page = synthetic_page(mode)
+    fused = FusedEnhancer(strip_bytes=strip_bytes)(page)
+
+    assert fused.mode == page.mode and fused.size == page.size
+    diff = level_diff(enhance_image_pil(page), fused)
+    assert diff.mean() <= MAX_MEAN_DIFF
+    assert np.percentile(diff, 99) <= MAX_P99_DIFF
+
+
+def test_rejects_other_modes():
+    with pytest.raises(ValueError):
+        FusedEnhancer()(synthetic_page('RGB').convert('CMYK'))